@@ -7,13 +7,40 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-import altair as alt
-import seaborn as sns
-import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix, roc_curve, auc
+import logging
+import os
 import warnings
+from functools import lru_cache
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from campaign_cube import append_to_cube, build_cube
+from campaign_moments import build_moments, correlation_frame, fold_moments
+from cross_filters import FilterSelection, build_index, table_filters
+from data_cache import (COMPACT_MODE, OPTIONAL_TABLES, TABLE_FILES, memory_report, present_tables, source_path,
+                        table_version)
+from data_refresh import REFRESH_THREAD_NAME, DataRefresher, with_table
+from data_registry import LazyTables, load_report, page_tables
+from data_sources import BACKEND, FilteredSource, Query, make_source, run_frame_query
+from customer_stats import (box_stats, density_bins, fine_histogram, ols_from_stats, rebin,
+                            regression_stats, sample_window)
+from downsampling import decimate
+from figure_cache import FigureCache
+from funnel import CONVERSION_WINDOWS, FUNNEL_STAGES, funnel_counts, funnel_partials
+from geo_shapes import (BOUNDARY_FILE, SIMPLIFY_TOLERANCES, boundary_version, level_for_zoom, level_geojson,
+                        load_geometry, view_bounds, zoom_for_bounds)
+from lead_scoring import (BOOTSTRAP_LEVEL, THRESHOLD_STEP, average_precision, bootstrap_resamples, counts_at,
+                          metrics_at, pr_points, resample_intervals, roc_auc, roc_points, score_curve, threshold_grid)
+from profiling import PROFILE_ENABLED, RunProfile, read_metrics, section_percentiles
+from product_rollup import (REQUIRED_COLUMNS, build_rollup, hierarchy_frame, level_totals, node_labels, node_measures,
+                            rollup_frame, top_k)
+from queries import (campaign_type_spend, channel_metric, cumulative_conversions, date_extent, distinct_values,
+                     has_matches, kpi_totals, product_cells, regional_quarterly, revenue_trend)
+from startup import deferred, import_report
+
+# Heavier modules only some pages use are imported on first use (NOVAMART_DEFER_IMPORTS)
+px = deferred('plotly.express')
+plotly_subplots = deferred('plotly.subplots')
+attribution = deferred('attribution')
 
 warnings.filterwarnings('ignore')
 
@@ -41,35 +68,319 @@ st.markdown("""
 # DATA LOADING AND CACHING
 # ============================================================================
 
-@st.cache_data
-def load_data():
-    """Load all CSV files from the dataset"""
-    data = {}
-    files = {
-        'campaign_performance': 'campaign_performance.csv',
-        'customer_data': 'customer_data.csv',
-        'product_sales': 'product_sales.csv',
-        'lead_scoring': 'lead_scoring_results.csv',
-        'feature_importance': 'feature_importance.csv',
-        'learning_curve': 'learning_curve.csv',
-        'geographic': 'geographic_data.csv',
-        'channel_attribution': 'channel_attribution.csv',
-        'funnel': 'funnel_data.csv',
-        'customer_journey': 'customer_journey.csv',
-        'correlation_matrix': 'correlation_matrix.csv'
+# Derived aggregates kept up to date incrementally for append-only tables
+TABLE_AGGREGATES = {
+    'campaign_performance': {
+        'cube': (build_cube, append_to_cube),
+        'moments': (build_moments, fold_moments)
     }
-    
-    for key, filename in files.items():
-        try:
-            data[key] = pd.read_csv(filename)
-        except FileNotFoundError:
-            st.warning(f"File {filename} not found. Some visualizations may be unavailable.")
-            data[key] = pd.DataFrame()
-    
-    return data
+}
+
+@st.cache_resource(show_spinner=False)
+def data_refresher():
+    """
+    Process-wide owner of the loaded tables, shared by all sessions. Its thread
+    reloads changed files every NOVAMART_REFRESH_SECONDS and publishes them,
+    derived caches already warm, as the next data snapshot.
+    """
+    # Warmers run cached builders on the refresher thread, which has no session to report to
+    logging.getLogger(get_script_run_ctx.__module__).addFilter(
+        lambda record: record.threadName != REFRESH_THREAD_NAME)
+    refresher = DataRefresher(TABLE_AGGREGATES)
+    refresher.start()
+    return refresher
+
+refresher = data_refresher()
+
+# A session reads the snapshot it started on until it chooses to load newer data
+if 'data_snapshot' not in st.session_state:
+    st.session_state.data_snapshot = refresher.snapshot
+
+def table_entry(key):
+    """A table as of this session's snapshot; a table the session has not used yet joins it at its latest version"""
+    snapshot = st.session_state.data_snapshot
+    entry = snapshot.tables.get(key)
+    if entry is None:
+        entry = refresher.entry(key)
+        st.session_state.data_snapshot = with_table(snapshot, key, entry)
+    return entry
+
+def data_version(key):
+    """Version of a table in this session's snapshot, used to key its derived caches"""
+    return table_entry(key).version
+
+def get_table(key):
+    """
+    Table loader behind `data`. Frames are shared read-only by every session
+    on the same snapshot, never copied.
+    """
+    entry = table_entry(key)
+    if entry.version is None and key not in OPTIONAL_TABLES:
+        st.warning(f"File {TABLE_FILES[key]} not found. Some visualizations may be unavailable.")
+    return entry.frame
+
+def campaign_state():
+    """IngestState of the campaign table in this session's snapshot; None when there is no campaign data"""
+    data['campaign_performance']  # times the first load into the load report
+    return table_entry('campaign_performance').state
+
+def campaign_cube():
+    """Campaign rollup cube; also served when the raw rows were streamed, not kept"""
+    state = campaign_state()
+    return state.derived['cube'] if state is not None else pd.DataFrame()
+
+# Row indexes are rebuilt per table version; a few old versions may linger
+# while sessions that started on them finish
+INDEX_CACHE_ENTRIES = 16
+
+@st.cache_resource(show_spinner=False, max_entries=INDEX_CACHE_ENTRIES)
+def table_index(key, version, _frame):
+    """Bitmap and sorted-date row index over one version of a table, shared by all sessions"""
+    return build_index(key, _frame)
+
+def campaign_index():
+    """Row index over the campaign cube, taken from the same store state as the cube it indexes"""
+    state = campaign_state()
+    if state is None:
+        return None
+    return table_index('campaign_performance', state.version, state.derived['cube'])
+
+def product_index():
+    return table_index('product_sales', data_version('product_sales'), data['product_sales'])
+
+def campaign_correlation(filters):
+    """
+    Campaign metric correlations under the given global filters, merged from
+    the per-partition accumulators kept current with the campaign store;
+    None when there is no campaign data
+    """
+    state = campaign_state()
+    if state is None or not len(state.derived['moments'].keys):
+        return None
+    moments = state.derived['moments']
+    rows, _ = table_index('campaign_moments', state.version, moments.keys).select(filters or {})
+    return correlation_frame(moments, rows)
+
+# Tables are loaded lazily: each page declares what it reads with @page_tables
+data = LazyTables(get_table, TABLE_FILES)
+
+@st.cache_resource(show_spinner=False)
+def sql_source():
+    """Embedded SQL engine shared by all sessions (NOVAMART_BACKEND=sqlite|duckdb)"""
+    return make_source(None)
+
+# Page aggregates go through one data source: pandas over the in-memory frames
+# (the campaign cube for campaign_performance) or the embedded SQL engine.
+# Pages query `source`, which adds the global sidebar filters to base_source.
+base_source = sql_source() if BACKEND != 'pandas' else make_source({
+    'campaign_performance': campaign_cube,
+    'product_sales': lambda: data['product_sales']
+}, indexes={
+    'campaign_performance': campaign_index,
+    'product_sales': product_index
+})
+
+# Filter combinations whose customer summaries and filtered frames are kept
+FILTERED_CACHE_ENTRIES = 8
+
+@st.cache_resource(show_spinner=False, max_entries=FILTERED_CACHE_ENTRIES)
+def customer_summaries(version, filters, _df_customer):
+    """
+    Precomputed customer chart statistics, built once per customer_data version
+    and global filter selection: per-year age counts, fine satisfaction counts
+    and per-segment LTV box stats
+    """
+    summaries = {}
+    if 'age' in _df_customer.columns:
+        summaries['age'] = fine_histogram(_df_customer['age'], 1)
+    if 'satisfaction_score' in _df_customer.columns:
+        summaries['satisfaction'] = fine_histogram(_df_customer['satisfaction_score'], 0.01)
+        summaries['satisfaction_box'] = box_stats(_df_customer, 'satisfaction_score', max_outliers=0)
+    if 'customer_segment' in _df_customer.columns and 'lifetime_value' in _df_customer.columns:
+        summaries['ltv_box'] = box_stats(_df_customer, 'lifetime_value', by='customer_segment')
+    return summaries
+
+def lead_scores(df_leads):
+    """
+    (outcomes, scores) of the scored leads, by predicted_probability or by
+    predicted_class when only that exists; None when the table has neither
+    """
+    if 'actual_converted' not in df_leads.columns:
+        return None
+    score_col = next((col for col in ('predicted_probability', 'predicted_class') if col in df_leads.columns), None)
+    if score_col is None:
+        return None
+    return df_leads['actual_converted'], df_leads[score_col]
+
+@st.cache_resource(show_spinner=False)
+def lead_score_curve(version, _df_leads):
+    """
+    Sorted cumulative TP/FP counts of the lead scores, built once per
+    lead_scoring version; every threshold-dependent metric is looked up in it
+    """
+    scored = lead_scores(_df_leads)
+    return score_curve(*scored) if scored is not None else None
+
+@st.cache_resource(show_spinner="Bootstrapping confidence intervals...")
+def lead_bootstrap(version, _df_leads):
+    """
+    Seeded bootstrap resamples per lead_scoring version, shared by all
+    sessions; intervals at any slider threshold are read from their counts
+    """
+    return bootstrap_resamples(*lead_scores(_df_leads), threshold_grid(THRESHOLD_STEP))
+
+@st.cache_resource(show_spinner="Sessionizing funnel events...")
+def funnel_event_partials(version, _df_events):
+    """Per-day funnel partial counts, sessionized once per funnel_events version; every funnel query re-sums them"""
+    return funnel_partials(_df_events)
+
+# Columns the raw funnel event export needs to be sessionized
+FUNNEL_EVENT_COLUMNS = {'user_id', 'timestamp', 'stage'}
+
+@st.cache_resource(show_spinner=False)
+def journey_attribution(version, _df_journey):
+    """Every attribution model computed from the journey paths, once per customer_journey version"""
+    return attribution.attribution_table(attribution.journey_paths(_df_journey))
+
+# Products drawn individually in the treemap/sunburst; the rest of each subcategory is one Other node
+HIERARCHY_PRODUCTS = int(os.environ.get('NOVAMART_HIERARCHY_PRODUCTS', '100'))
+
+PRODUCT_MEASURES = {'Sales': 'sales', 'Units Sold': 'units_sold', 'Profit': 'profit', 'Return Rate': 'return_rate'}
+
+@st.cache_resource(show_spinner=False)
+def product_rollup(version, _source):
+    """
+    Category -> subcategory -> product rollup per region x quarter, built once
+    per product_sales version from the cells the (unfiltered) source sums up
+    """
+    return build_rollup(product_cells(_source, _source.columns('product_sales')))
+
+def warm_product_rollup(entry):
+    """Product rollup of a new product_sales version, when it has the hierarchy columns"""
+    if set(REQUIRED_COLUMNS) <= set(entry.frame.columns):
+        product_rollup(entry.version, make_source({'product_sales': lambda: entry.frame}, backend='pandas'))
 
-# Load data
-data = load_data()
+MAP_METRICS = {'Revenue': 'total_revenue', 'Customers': 'total_customers',
+               'Market Penetration': 'market_penetration', 'YoY Growth': 'yoy_growth'}
+
+@st.cache_resource(show_spinner="Simplifying state boundaries...")
+def state_geometry(version):
+    """Encoded multi-resolution state boundaries, loaded once per boundary file version"""
+    return load_geometry()
+
+@st.cache_resource(show_spinner=False, max_entries=len(SIMPLIFY_TOLERANCES))
+def state_geojson(version, level):
+    """One detail level of the state boundaries as GeoJSON, decoded once per level"""
+    return level_geojson(state_geometry(version), level)
+
+def state_map_figure(df_geo, metrics, version, level, bubbles, bounds=None):
+    """
+    Choropleth of the states (when a boundary file exists) with optional
+    customer bubbles, framed on `bounds` when given. The metric menu restyles
+    colours in the browser, so the geometry ships once with the figure and
+    switching metrics never reruns.
+    """
+    fig = go.Figure()
+    labels = list(metrics)
+    if level is not None:
+        fig.add_trace(go.Choropleth(
+            geojson=state_geojson(version, level),
+            locations=df_geo['state'],
+            z=df_geo[metrics[labels[0]]],
+            colorscale='Viridis',
+            colorbar=dict(title=labels[0]),
+            marker_line_color='white',
+            marker_line_width=0.5,
+            hovertemplate=f"<b>%{{location}}</b><br>{labels[0]}: %{{z:,.2f}}<extra></extra>"
+        ))
+    if bubbles:
+        customers = df_geo['total_customers'] if 'total_customers' in df_geo.columns else None
+        marker = dict(size=customers, sizemode='area', sizemin=4,
+                      sizeref=2 * customers.max() / 40 ** 2 if customers is not None else None,
+                      line=dict(width=1, color='white'))
+        if level is None:
+            marker.update(color=df_geo[metrics[labels[0]]], colorscale='Viridis', colorbar=dict(title=labels[0]))
+        else:
+            marker.update(color='rgba(255, 127, 14, 0.6)')
+        fig.add_trace(go.Scattergeo(
+            lon=df_geo['longitude'], lat=df_geo['latitude'], text=df_geo['state'], customdata=customers,
+            mode='markers', marker=marker, name="Customers",
+            hovertemplate="<b>%{text}</b><br>Customers: %{customdata:,.0f}<extra></extra>"
+        ))
+
+    # Each menu entry recolours trace 0: the choropleth, or the bubbles when there is no geometry
+    buttons = []
+    for label, col in metrics.items():
+        if level is not None:
+            style = {'z': [df_geo[col]], 'colorbar.title.text': label,
+                     'hovertemplate': f"<b>%{{location}}</b><br>{label}: %{{z:,.2f}}<extra></extra>"}
+        else:
+            style = {'marker.color': [df_geo[col]], 'marker.colorbar.title.text': label}
+        buttons.append(dict(label=label, method='restyle', args=[style, [0]]))
+    fig.update_layout(
+        updatemenus=[dict(buttons=buttons, direction='down', x=0, xanchor='left', y=1.1, yanchor='top')],
+        height=600, margin=dict(t=60, l=0, r=0, b=0), showlegend=False
+    )
+    # Without a boundary file the states sit on the built-in base map
+    fig.update_geos(visible=level is None, showcountries=True, projection_type='mercator')
+    if bounds is None:
+        fig.update_geos(fitbounds='locations')
+    else:
+        fig.update_geos(lonaxis_range=[bounds[0], bounds[2]], lataxis_range=[bounds[1], bounds[3]])
+    return fig
+
+def warm_campaign_indexes(entry):
+    """Row indexes over the cube and the moment partitions of a new campaign store state"""
+    if entry.state is not None:
+        table_index('campaign_performance', entry.state.version, entry.state.derived['cube'])
+        moments = entry.state.derived['moments']
+        if len(moments.keys):
+            table_index('campaign_moments', entry.state.version, moments.keys)
+
+def warm_funnel_partials(entry):
+    """Funnel partial counts of a new funnel_events version; the refresher skips a missing export"""
+    if FUNNEL_EVENT_COLUMNS <= set(entry.frame.columns):
+        funnel_event_partials(entry.version, entry.frame)
+
+# Derived caches the refresher builds for a new table version before publishing
+# it, so sessions moving to the new snapshot find them ready
+refresher.warmers = {
+    'campaign_performance': [warm_campaign_indexes],
+    'product_sales': [lambda entry: table_index('product_sales', entry.version, entry.frame), warm_product_rollup],
+    'customer_data': [lambda entry: customer_summaries(entry.version, None, entry.frame)],
+    'lead_scoring': [lambda entry: lead_score_curve(entry.version, entry.frame)],
+    'funnel_events': [warm_funnel_partials],
+    'customer_journey': [lambda entry: journey_attribution(entry.version, entry.frame)]
+}
+
+# Above this many customers the income/LTV scatter switches to a binned density view
+SCATTER_POINT_LIMIT = int(os.environ.get('NOVAMART_SCATTER_POINT_LIMIT', '20000'))
+HOVER_SAMPLE_SIZE = 2000
+
+def date_zoom(container, extent, key):
+    """Date-range slider over a (first, last) date extent; the window is re-decimated at full chart resolution"""
+    first, last = extent
+    if pd.isna(first) or pd.isna(last) or first == last:
+        return None
+    start, end = first.date(), last.date()
+    return container.slider("Zoom Date Range", min_value=start, max_value=end,
+                            value=(start, end), key=key)
+
+@st.cache_resource(show_spinner=False)
+def figure_cache():
+    """Serialized figures shared by all sessions (NOVAMART_FIGURE_CACHE_MB budget)"""
+    return FigureCache()
+
+def cached_figure(section, build, *widgets):
+    """
+    The section's figure as a spec dict, built by build() only when this page's
+    data versions and the given widget values have not been rendered before
+    """
+    versions = tuple((data_version(key), global_filters.get(key)) for key in PAGES[page].required_tables)
+    key = FigureCache.make_key(page, section.name, versions, widgets)
+    spec, hit = figure_cache().get_or_build(key, build)
+    section.cache_hit = hit if section.cache_hit is None else section.cache_hit and hit
+    return spec
 
 # ============================================================================
 # SIDEBAR NAVIGATION
@@ -85,39 +396,127 @@ page = st.sidebar.radio(
      "ML Model Evaluation"]
 )
 
+def load_latest_snapshot():
+    """Move this session to the latest snapshot; an unfiltered date range widens to the new data's extent"""
+    picked = st.session_state.get("global_date_range")
+    if picked is not None and tuple(picked) == st.session_state.get("global_date_extent"):
+        del st.session_state["global_date_range"]
+    st.session_state.data_snapshot = refresher.snapshot
+
+if refresher.snapshot.version > st.session_state.data_snapshot.version:
+    st.sidebar.info(f"New data available (snapshot {refresher.snapshot.version}, "
+                    f"published {refresher.snapshot.published_at:%H:%M:%S}).")
+    st.sidebar.button("Load latest data", on_click=load_latest_snapshot, key="load_latest_snapshot")
+
+# ============================================================================
+# GLOBAL FILTERS
+# ============================================================================
+
+@st.cache_data(show_spinner=False)
+def filter_options(versions):
+    """Choices for the global filters, recomputed only when a source file changes"""
+    options = {'date': (pd.NaT, pd.NaT), 'region': set(), 'channel': [], 'segment': []}
+    if base_source.has_rows('campaign_performance'):
+        columns = base_source.columns('campaign_performance')
+        if 'date' in columns:
+            options['date'] = date_extent(base_source)
+        if 'region' in columns:
+            options['region'].update(distinct_values(base_source, 'campaign_performance', 'region'))
+        if 'channel' in columns:
+            options['channel'] = distinct_values(base_source, 'campaign_performance', 'channel')
+    customers = data['customer_data']
+    if 'region' in customers.columns:
+        options['region'].update(customers['region'].dropna().unique())
+    if 'customer_segment' in customers.columns:
+        options['segment'] = sorted(customers['customer_segment'].dropna().unique())
+    options['region'] = sorted(options['region'])
+    return options
+
+def global_filter_bar():
+    """
+    Sidebar filters applied to every page. An empty multiselect or the full
+    date extent means no filter, so the unfiltered view shares its caches
+    with every session that never touches the filters.
+    """
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Filters")
+    options = filter_options(tuple(data_version(key) for key in ('campaign_performance', 'customer_data')))
+    
+    date_range = None
+    first, last = options['date']
+    if pd.notna(first) and pd.notna(last):
+        extent = (first.date(), last.date())
+        st.session_state.global_date_extent = extent
+        picked = st.sidebar.date_input("Date Range", value=extent, min_value=extent[0], max_value=extent[1],
+                                       key="global_date_range")
+        # A half-picked range (one date so far) leaves the filter off
+        if isinstance(picked, (tuple, list)) and len(picked) == 2 and tuple(picked) != extent:
+            date_range = tuple(picked)
+    
+    regions = st.sidebar.multiselect("Region", options['region'], placeholder="All regions", key="global_region")
+    channels = st.sidebar.multiselect("Channel", options['channel'], placeholder="All channels",
+                                      key="global_channel")
+    segments = st.sidebar.multiselect("Customer Segment", options['segment'], placeholder="All segments",
+                                      key="global_segment")
+    st.sidebar.caption("Channel filters campaigns and funnel events, segment filters customers; "
+                       "product sales match every quarter the date range touches.")
+    return FilterSelection(date_range, regions, channels, segments)
+
+# {table: {column: value}} for the current selection; tables left unfiltered are absent
+global_filters = table_filters(global_filter_bar())
+source = FilteredSource(base_source, global_filters)
+
+@st.cache_resource(show_spinner=False, max_entries=FILTERED_CACHE_ENTRIES)
+def filtered_frame(key, version, filters):
+    """Rows of one table version passing the given filters, selected through its row index"""
+    df = data[key]
+    filters = {col: value for col, value in filters.items() if col in df.columns}
+    index = table_index(key, version, df)
+    return run_frame_query(df, Query(key, columns=list(df.columns), filters=filters), index)
+
+def filtered_table(key):
+    """`data[key]` restricted by the global filters; the shared frame itself when none apply"""
+    filters = global_filters.get(key)
+    if not filters or data[key].empty:
+        return data[key]
+    return filtered_frame(key, data_version(key), filters)
+
+# Every chart section is timed into `perf`; the panel adds figure sizes (NOVAMART_PROFILE=1 turns it on by default)
+show_performance = st.sidebar.checkbox("Show Performance Panel", value=PROFILE_ENABLED)
+perf = RunProfile(page, detailed=show_performance)
+
 # ============================================================================
 # PAGE 1: EXECUTIVE OVERVIEW
 # ============================================================================
 
+@page_tables('campaign_performance')
 def page_executive_overview():
     st.title("📈 Executive Overview")
     st.markdown("Key metrics and trends at a glance")
     
-    if not data['campaign_performance'].empty:
-        df_campaign = data['campaign_performance'].copy()
-        
-        # Convert date column if exists
-        if 'date' in df_campaign.columns:
-            df_campaign['date'] = pd.to_datetime(df_campaign['date'], errors='coerce')
+    if source.has_rows('campaign_performance'):
+        if not has_matches(source, 'campaign_performance'):
+            st.info("No campaigns match the current filters.")
+            return
+        campaign_columns = source.columns('campaign_performance')
         
         # KPI Cards
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            total_revenue = df_campaign['revenue'].sum() if 'revenue' in df_campaign.columns else 0
-            st.metric("Total Revenue", f"₹{total_revenue:,.0f}")
-        
-        with col2:
-            total_conversions = df_campaign['conversions'].sum() if 'conversions' in df_campaign.columns else 0
-            st.metric("Total Conversions", f"{total_conversions:,.0f}")
-        
-        with col3:
-            avg_roas = df_campaign['roas'].mean() if 'roas' in df_campaign.columns else 0
-            st.metric("Avg ROAS", f"{avg_roas:.2f}x")
-        
-        with col4:
-            total_spend = df_campaign['spend'].sum() if 'spend' in df_campaign.columns else 0
-            st.metric("Total Spend", f"₹{total_spend:,.0f}")
+        with perf.section("KPI Cards") as section:
+            totals = kpi_totals(source)
+            section.phase('render')
+            col1, col2, col3, col4 = st.columns(4)
+            
+            with col1:
+                st.metric("Total Revenue", f"₹{totals['revenue']:,.0f}")
+            
+            with col2:
+                st.metric("Total Conversions", f"{totals['conversions']:,.0f}")
+            
+            with col3:
+                st.metric("Avg ROAS", f"{totals['roas']:.2f}x")
+            
+            with col4:
+                st.metric("Total Spend", f"₹{totals['spend']:,.0f}")
         
         st.markdown("---")
         
@@ -128,27 +527,26 @@ def page_executive_overview():
         with col2:
             aggregation = st.selectbox("Aggregation Level", ["Daily", "Weekly", "Monthly"])
         
-        try:
-            if 'date' in df_campaign.columns:
-                df_trend = df_campaign.copy()
-                df_trend['date'] = pd.to_datetime(df_trend['date'], errors='coerce')
-                df_trend = df_trend.dropna(subset=['date'])
-                
-                if aggregation == "Daily":
-                    trend_data = df_trend.groupby('date')['revenue'].sum().reset_index()
-                elif aggregation == "Weekly":
-                    trend_data = df_trend.set_index('date').resample('W')['revenue'].sum().reset_index()
-                else:  # Monthly
-                    trend_data = df_trend.set_index('date').resample('M')['revenue'].sum().reset_index()
-                
-                fig = px.line(trend_data, x='date', y='revenue', 
-                             title=f"{aggregation} Revenue Trend",
-                             labels={'revenue': 'Revenue (₹)', 'date': 'Date'},
-                             markers=True)
-                fig.update_layout(hovermode='x unified', height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating trend chart: {e}")
+        with perf.section("Revenue Trend Over Time") as section:
+            try:
+                if 'date' in campaign_columns:
+                    zoom = date_zoom(col2, date_extent(source), key="trend_zoom")
+                    
+                    def build():
+                        trend_data = revenue_trend(source, aggregation)
+                        trend_data = decimate(trend_data, 'date', 'revenue', x_range=zoom)
+                        section.rows(len(trend_data))
+                        section.phase('figure')
+                        fig = px.line(trend_data, x='date', y='revenue', 
+                                     title=f"{aggregation} Revenue Trend",
+                                     labels={'revenue': 'Revenue (₹)', 'date': 'Date'},
+                                     markers=True)
+                        fig.update_layout(hovermode='x unified', height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, aggregation, zoom))
+            except Exception as e:
+                st.error(f"Error creating trend chart: {e}")
         
         st.markdown("---")
         
@@ -159,127 +557,146 @@ def page_executive_overview():
         with col2:
             metric_type = st.selectbox("Metric", ["Revenue", "Conversions", "ROAS"], key="channel_metric")
         
-        try:
-            if 'channel' in df_campaign.columns:
-                if metric_type == "Revenue":
-                    channel_perf = df_campaign.groupby('channel')['revenue'].sum().sort_values(ascending=True)
-                elif metric_type == "Conversions":
-                    channel_perf = df_campaign.groupby('channel')['conversions'].sum().sort_values(ascending=True)
-                else:  # ROAS
-                    channel_perf = df_campaign.groupby('channel')['roas'].mean().sort_values(ascending=True)
-                
-                fig = px.bar(x=channel_perf.values, y=channel_perf.index,
-                            title=f"Total {metric_type} by Channel",
-                            labels={'x': metric_type, 'y': 'Channel'},
-                            color=channel_perf.values,
-                            color_continuous_scale='Blues',
-                            orientation='h')
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating channel chart: {e}")
+        with perf.section("Channel Performance Comparison") as section:
+            try:
+                if 'channel' in campaign_columns:
+                    def build():
+                        channel_perf = channel_metric(source, metric_type)
+                        section.rows(len(channel_perf))
+                        section.phase('figure')
+                        fig = px.bar(x=channel_perf.values, y=channel_perf.index,
+                                    title=f"Total {metric_type} by Channel",
+                                    labels={'x': metric_type, 'y': 'Channel'},
+                                    color=channel_perf.values,
+                                    color_continuous_scale='Blues',
+                                    orientation='h')
+                        fig.update_layout(height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, metric_type))
+            except Exception as e:
+                st.error(f"Error creating channel chart: {e}")
 
 # ============================================================================
 # PAGE 2: CAMPAIGN ANALYTICS
 # ============================================================================
 
+@page_tables('campaign_performance')
 def page_campaign_analytics():
     st.title("📊 Campaign Analytics")
     
-    if not data['campaign_performance'].empty:
-        df_campaign = data['campaign_performance'].copy()
-        
-        if 'date' in df_campaign.columns:
-            df_campaign['date'] = pd.to_datetime(df_campaign['date'], errors='coerce')
+    if source.has_rows('campaign_performance'):
+        if not has_matches(source, 'campaign_performance'):
+            st.info("No campaigns match the current filters.")
+            return
+        campaign_columns = source.columns('campaign_performance')
         
         # Grouped Bar Chart - Regional Performance
         st.subheader("Regional Performance by Quarter")
         
-        try:
-            if 'region' in df_campaign.columns and 'date' in df_campaign.columns:
-                df_campaign['quarter'] = df_campaign['date'].dt.to_period('Q').astype(str)
-                df_campaign['year'] = df_campaign['date'].dt.year
-                
-                year_options = sorted(df_campaign['year'].unique())
-                selected_year = st.selectbox("Select Year", year_options, key="year_select")
-                
-                regional_data = df_campaign[df_campaign['year'] == selected_year].groupby(
-                    ['quarter', 'region'])['revenue'].sum().reset_index()
-                
-                fig = px.bar(regional_data, x='quarter', y='revenue', color='region',
-                            title=f"Regional Revenue Performance - {selected_year}",
-                            labels={'revenue': 'Revenue (₹)', 'quarter': 'Quarter'},
-                            barmode='group')
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating regional chart: {e}")
+        with perf.section("Regional Performance by Quarter") as section:
+            try:
+                if 'region' in campaign_columns and 'date' in campaign_columns:
+                    year_options = distinct_values(source, 'campaign_performance', 'year')
+                    selected_year = st.selectbox("Select Year", year_options, key="year_select")
+                    
+                    def build():
+                        regional_data = regional_quarterly(source, selected_year)
+                        section.rows(len(regional_data))
+                        section.phase('figure')
+                        fig = px.bar(regional_data, x='quarter', y='revenue', color='region',
+                                    title=f"Regional Revenue Performance - {selected_year}",
+                                    labels={'revenue': 'Revenue (₹)', 'quarter': 'Quarter'},
+                                    barmode='group')
+                        fig.update_layout(height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, selected_year))
+            except Exception as e:
+                st.error(f"Error creating regional chart: {e}")
         
         st.markdown("---")
         
         # Stacked Bar Chart - Campaign Type Contribution
         st.subheader("Campaign Type Contribution Over Time")
         
-        try:
-            if 'campaign_type' in df_campaign.columns and 'date' in df_campaign.columns:
-                df_campaign['month'] = df_campaign['date'].dt.to_period('M').astype(str)
-                
-                stacked_data = df_campaign.groupby(['month', 'campaign_type'])['spend'].sum().reset_index()
-                
-                view_type = st.radio("View Type", ["Absolute Values", "100% Stacked"], horizontal=True)
-                
-                fig = px.bar(stacked_data, x='month', y='spend', color='campaign_type',
-                            title="Campaign Type Spend Distribution",
-                            labels={'spend': 'Spend (₹)', 'month': 'Month'},
-                            barmode='stack')
-                
-                if view_type == "100% Stacked":
-                    fig.update_yaxes(tickformat=".0%")
-                    fig.update_traces(hovertemplate='<b>%{x}</b><br>Campaign: %{fullData.name}<br>Spend: ₹%{y:,.0f}<extra></extra>')
-                
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating stacked chart: {e}")
+        with perf.section("Campaign Type Contribution Over Time") as section:
+            try:
+                if 'campaign_type' in campaign_columns and 'date' in campaign_columns:
+                    view_type = st.radio("View Type", ["Absolute Values", "100% Stacked"], horizontal=True)
+                    
+                    def build():
+                        stacked_data = campaign_type_spend(source)
+                        section.rows(len(stacked_data))
+                        section.phase('figure')
+                        fig = px.bar(stacked_data, x='month', y='spend', color='campaign_type',
+                                    title="Campaign Type Spend Distribution",
+                                    labels={'spend': 'Spend (₹)', 'month': 'Month'},
+                                    barmode='stack')
+                        
+                        if view_type == "100% Stacked":
+                            fig.update_yaxes(tickformat=".0%")
+                            fig.update_traces(hovertemplate='<b>%{x}</b><br>Campaign: %{fullData.name}<br>Spend: ₹%{y:,.0f}<extra></extra>')
+                        
+                        fig.update_layout(height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, view_type))
+            except Exception as e:
+                st.error(f"Error creating stacked chart: {e}")
         
         st.markdown("---")
         
         # Cumulative Conversions Area Chart
         st.subheader("Cumulative Conversions Over Time")
         
-        try:
-            if 'channel' in df_campaign.columns and 'date' in df_campaign.columns:
-                if 'region' in df_campaign.columns:
-                    regions = st.multiselect("Filter by Region", 
-                                           df_campaign['region'].unique(),
-                                           default=df_campaign['region'].unique()[:2])
-                    df_filtered = df_campaign[df_campaign['region'].isin(regions)]
-                else:
-                    df_filtered = df_campaign
-                
-                cumulative_data = df_filtered.sort_values('date').groupby(
-                    ['date', 'channel'])['conversions'].sum().reset_index()
-                cumulative_data['cumulative_conversions'] = cumulative_data.groupby(
-                    'channel')['conversions'].cumsum()
-                
-                fig = px.area(cumulative_data, x='date', y='cumulative_conversions',
-                             color='channel',
-                             title="Cumulative Conversions by Channel",
-                             labels={'cumulative_conversions': 'Cumulative Conversions', 'date': 'Date'})
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating cumulative chart: {e}")
+        with perf.section("Cumulative Conversions Over Time") as section:
+            try:
+                if 'channel' in campaign_columns and 'date' in campaign_columns:
+                    regions = None
+                    if 'region' in campaign_columns:
+                        region_options = distinct_values(source, 'campaign_performance', 'region')
+                        regions = st.multiselect("Filter by Region", 
+                                               region_options,
+                                               default=region_options[:2])
+                    
+                    if regions is not None and not regions:
+                        st.info("Select at least one region.")
+                    else:
+                        zoom = date_zoom(st, date_extent(source), key="cumulative_zoom")
+                    
+                        def build():
+                            cumulative_data = cumulative_conversions(source, regions)
+                            cumulative_data = decimate(cumulative_data, 'date', 'cumulative_conversions',
+                                                       by='channel', x_range=zoom)
+                            section.rows(len(cumulative_data))
+                            section.phase('figure')
+                            fig = px.area(cumulative_data, x='date', y='cumulative_conversions',
+                                         color='channel',
+                                         title="Cumulative Conversions by Channel",
+                                         labels={'cumulative_conversions': 'Cumulative Conversions', 'date': 'Date'})
+                            fig.update_layout(height=400)
+                            return fig
+                    
+                        section.chart(cached_figure(section, build, regions, zoom))
+            except Exception as e:
+                st.error(f"Error creating cumulative chart: {e}")
 
 # ============================================================================
 # PAGE 3: CUSTOMER INSIGHTS
 # ============================================================================
 
+@page_tables('customer_data')
 def page_customer_insights():
     st.title("👥 Customer Insights")
     
     if not data['customer_data'].empty:
-        df_customer = data['customer_data'].copy()
+        df_customer = filtered_table('customer_data')
+        if df_customer.empty:
+            st.info("No customers match the current filters.")
+            return
+        summaries = customer_summaries(data_version('customer_data'), global_filters.get('customer_data'),
+                                       df_customer)
         
         # Age Distribution Histogram
         st.subheader("Customer Age Distribution")
@@ -288,130 +705,309 @@ def page_customer_insights():
         with col2:
             bin_size = st.slider("Bin Size", min_value=1, max_value=10, value=5)
         
-        try:
-            if 'age' in df_customer.columns:
-                fig = px.histogram(df_customer, x='age', nbins=bin_size,
-                                  title="Customer Age Distribution",
-                                  labels={'age': 'Age', 'count': 'Number of Customers'},
-                                  color_discrete_sequence=['steelblue'])
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating histogram: {e}")
+        with perf.section("Customer Age Distribution") as section:
+            try:
+                if 'age' in summaries:
+                    def build():
+                        # The slider sets the bin width in years; counts are re-aggregated from per-year counts
+                        left_edges, width, counts = rebin(summaries['age'], width=bin_size)
+                        section.rows(len(df_customer))
+                        section.phase('figure')
+                        fig = go.Figure(go.Bar(x=left_edges + width / 2, y=counts, width=width,
+                                               marker_color='steelblue',
+                                               hovertemplate='Age %{customdata}<br>Customers: %{y:,}<extra></extra>',
+                                               customdata=[f"{lo:.0f}-{lo + width - 1:.0f}" for lo in left_edges]))
+                        fig.update_layout(title="Customer Age Distribution", xaxis_title='Age',
+                                          yaxis_title='Number of Customers', bargap=0.02, height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, bin_size))
+            except Exception as e:
+                st.error(f"Error creating histogram: {e}")
         
         st.markdown("---")
         
         # Box Plot - LTV by Segment
         st.subheader("Lifetime Value by Customer Segment")
         
-        try:
-            if 'customer_segment' in df_customer.columns and 'lifetime_value' in df_customer.columns:
-                fig = px.box(df_customer, x='customer_segment', y='lifetime_value',
-                            title="LTV Distribution by Segment",
-                            labels={'lifetime_value': 'Lifetime Value (₹)', 'customer_segment': 'Customer Segment'},
-                            points="outliers")
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating box plot: {e}")
+        with perf.section("Lifetime Value by Customer Segment") as section:
+            try:
+                if 'ltv_box' in summaries:
+                    def build():
+                        box, outliers = summaries['ltv_box']
+                        segments = [str(segment) for segment in box.index]
+                        section.rows(len(df_customer))
+                        section.phase('figure')
+                        fig = go.Figure(go.Box(
+                            x=segments, q1=box['q1'], median=box['median'], q3=box['q3'],
+                            lowerfence=box['lower_fence'], upperfence=box['upper_fence'],
+                            name='Lifetime Value', marker_color='#636EFA', boxpoints=False
+                        ))
+                        fig.add_trace(go.Scatter(
+                            x=outliers['customer_segment'].astype(str), y=outliers['lifetime_value'],
+                            mode='markers', name='Outliers (sampled)',
+                            marker=dict(color='#636EFA', size=4, opacity=0.6)
+                        ))
+                        fig.update_layout(title="LTV Distribution by Segment", xaxis_title='Customer Segment',
+                                          yaxis_title='Lifetime Value (₹)', showlegend=False, height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build))
+            except Exception as e:
+                st.error(f"Error creating box plot: {e}")
         
         st.markdown("---")
         
         # Scatter Plot - Income vs LTV
         st.subheader("Income vs Lifetime Value Analysis")
         
-        try:
-            if 'income' in df_customer.columns and 'lifetime_value' in df_customer.columns:
-                color_col = 'customer_segment' if 'customer_segment' in df_customer.columns else None
-                
-                fig = px.scatter(df_customer, x='income', y='lifetime_value',
-                               color=color_col,
-                               title="Income vs Lifetime Value",
-                               labels={'income': 'Income (₹)', 'lifetime_value': 'Lifetime Value (₹)'},
-                               trendline="ols" if st.checkbox("Show Trend Line") else None,
-                               hover_data=df_customer.columns.tolist()[:5])
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating scatter plot: {e}")
+        with perf.section("Income vs Lifetime Value Analysis") as section:
+            try:
+                if 'income' in df_customer.columns and 'lifetime_value' in df_customer.columns:
+                    color_col = 'customer_segment' if 'customer_segment' in df_customer.columns else None
+                    segments = sorted(df_customer[color_col].dropna().unique()) if color_col else []
+                    segment_colors = dict(zip(segments, px.colors.qualitative.Plotly * 3))
+                    labels = {'income': 'Income (₹)', 'lifetime_value': 'Lifetime Value (₹)'}
+                    hover_cols = df_customer.columns.tolist()[:5]
+                    show_trend = st.checkbox("Show Trend Line")
+                    use_density = len(df_customer) > SCATTER_POINT_LIMIT
+                    density_view = None
+                    
+                    if use_density:
+                        # Too many points for the browser: bin server-side, sample points only when zoomed
+                        st.caption(f"{len(df_customer):,} customers exceed the {SCATTER_POINT_LIMIT:,}-point scatter limit; "
+                                   "showing binned density. Narrow the ranges to inspect individual customers.")
+                        income_full = (float(df_customer['income'].min()), float(df_customer['income'].max()))
+                        ltv_full = (float(df_customer['lifetime_value'].min()), float(df_customer['lifetime_value'].max()))
+                        col1, col2, col3 = st.columns(3)
+                        income_range = col1.slider("Income Range", *income_full, value=income_full, key="density_income")
+                        ltv_range = col2.slider("LTV Range", *ltv_full, value=ltv_full, key="density_ltv")
+                        density_segment = col3.selectbox("Density Segment", ["All Segments"] + segments)
+                        density_view = (income_range, ltv_range, density_segment)
+                    
+                    def build():
+                        section.rows(len(df_customer))
+                        if not use_density:
+                            section.phase('figure')
+                            fig = px.scatter(df_customer, x='income', y='lifetime_value',
+                                           color=color_col,
+                                           color_discrete_map=segment_colors,
+                                           labels=labels,
+                                           hover_data=hover_cols)
+                        else:
+                            x_edges, y_edges, counts = density_bins(df_customer, 'income', 'lifetime_value', by=color_col,
+                                                                    x_range=income_range, y_range=ltv_range)
+                            z = sum(counts.values()) if density_segment == "All Segments" else counts[density_segment]
+                            section.phase('figure')
+                            fig = go.Figure(go.Heatmap(
+                                x=(x_edges[:-1] + x_edges[1:]) / 2,
+                                y=(y_edges[:-1] + y_edges[1:]) / 2,
+                                z=np.where(z.T > 0, z.T, np.nan),
+                                colorscale='Blues',
+                                colorbar=dict(title='Customers'),
+                                hovertemplate='Income: %{x:,.0f}<br>LTV: %{y:,.0f}<br>Customers: %{z}<extra></extra>'
+                            ))
+                            fig.update_layout(xaxis_title=labels['income'], yaxis_title=labels['lifetime_value'])
+                            
+                            if income_range != income_full or ltv_range != ltv_full:
+                                sample = sample_window(df_customer, 'income', 'lifetime_value',
+                                                       income_range, ltv_range, HOVER_SAMPLE_SIZE)
+                                for segment, group in (sample.groupby(color_col, observed=True) if color_col else [("Customers", sample)]):
+                                    fig.add_trace(go.Scatter(
+                                        x=group['income'], y=group['lifetime_value'], mode='markers', name=str(segment),
+                                        marker=dict(size=5, color=segment_colors.get(segment)),
+                                        customdata=group[hover_cols],
+                                        hovertemplate='<br>'.join(f"{col}: %{{customdata[{i}]}}" for i, col in enumerate(hover_cols))
+                                                      + '<extra></extra>'
+                                    ))
+                        
+                        if show_trend:
+                            fits = ols_from_stats(regression_stats(df_customer, 'income', 'lifetime_value', by=color_col))
+                            for segment, fit in fits.iterrows():
+                                line_x = np.array([fit['x_min'], fit['x_max']])
+                                fig.add_trace(go.Scatter(x=line_x, y=fit['intercept'] + fit['slope'] * line_x,
+                                                         mode='lines', name=f"{segment} trend (R²={fit['r2']:.2f})",
+                                                         line=dict(color=segment_colors.get(segment), width=2)))
+                        
+                        fig.update_layout(title="Income vs Lifetime Value", height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, show_trend, density_view))
+            except Exception as e:
+                st.error(f"Error creating scatter plot: {e}")
         
         st.markdown("---")
         
         # Satisfaction Score Distribution (Violin Plot)
         st.subheader("Satisfaction Score Distribution")
         
-        try:
-            if 'satisfaction_score' in df_customer.columns:
-                fig = px.histogram(df_customer, x='satisfaction_score', 
-                                  marginal="rug", nbins=20,
-                                  title="Satisfaction Score Distribution",
-                                  labels={'satisfaction_score': 'Satisfaction Score', 'count': 'Count'},
-                                  color_discrete_sequence=['mediumaquamarine'])
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating distribution chart: {e}")
+        with perf.section("Satisfaction Score Distribution") as section:
+            try:
+                if 'satisfaction' in summaries:
+                    def build():
+                        # A box of precomputed quartiles stands in for the per-customer rug marginal
+                        left_edges, width, counts = rebin(summaries['satisfaction'], bins=20)
+                        box, _ = summaries['satisfaction_box']
+                        section.rows(len(df_customer))
+                        section.phase('figure')
+                        fig = plotly_subplots.make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8],
+                                            vertical_spacing=0.03)
+                        fig.add_trace(go.Box(x=[box['median'].iloc[0]], q1=box['q1'], median=box['median'], q3=box['q3'],
+                                             lowerfence=box['lower_fence'], upperfence=box['upper_fence'],
+                                             orientation='h', boxpoints=False, marker_color='mediumaquamarine',
+                                             name='', hoverinfo='skip'), row=1, col=1)
+                        fig.add_trace(go.Bar(x=left_edges + width / 2, y=counts, width=width,
+                                             marker_color='mediumaquamarine', name='Count'), row=2, col=1)
+                        fig.update_yaxes(showticklabels=False, row=1, col=1)
+                        fig.update_xaxes(title_text='Satisfaction Score', row=2, col=1)
+                        fig.update_yaxes(title_text='Count', row=2, col=1)
+                        fig.update_layout(title="Satisfaction Score Distribution", showlegend=False,
+                                          bargap=0.02, height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build))
+            except Exception as e:
+                st.error(f"Error creating distribution chart: {e}")
 
 # ============================================================================
 # PAGE 4: PRODUCT PERFORMANCE
 # ============================================================================
 
+@page_tables('product_sales')
 def page_product_performance():
     st.title("🛍️ Product Performance")
     
-    if not data['product_sales'].empty:
-        df_product = data['product_sales'].copy()
-        
-        # Top Products by Sales
-        st.subheader("Top 15 Products by Sales")
-        
+    if not source.has_rows('product_sales') or not set(REQUIRED_COLUMNS) <= set(source.columns('product_sales')):
+        return
+    
+    # Every chart on this page reads the precomputed rollup under the global region/quarter filters
+    rollup = product_rollup(data_version('product_sales'), base_source)
+    product_filters = global_filters.get('product_sales')
+    measures = {label: col for label, col in PRODUCT_MEASURES.items() if col in node_measures(rollup)}
+    
+    # Product Hierarchy
+    st.subheader("Product Hierarchy")
+    
+    with perf.section("Product Hierarchy") as section:
         try:
-            if 'product_name' in df_product.columns and 'sales' in df_product.columns:
-                top_products = df_product.nlargest(15, 'sales')[['product_name', 'sales', 'category']].reset_index(drop=True)
-                
+            col1, col2 = st.columns(2)
+            with col1:
+                chart_type = st.radio("Chart Type", ["Treemap", "Sunburst"], horizontal=True, key="hierarchy_chart")
+            with col2:
+                sizes = [label for label in measures if measures[label] in ('sales', 'units_sold')]
+                size_label = st.selectbox("Size By", sizes, key="hierarchy_size")
+            
+            def build():
+                size = measures[size_label]
+                nodes = hierarchy_frame(rollup, size, product_filters, HIERARCHY_PRODUCTS)
+                section.rows(len(nodes))
+                section.phase('figure')
+                trace = go.Treemap if chart_type == "Treemap" else go.Sunburst
+                marker = {}
+                hover = f"<b>%{{label}}</b><br>{size_label}: %{{value:,.0f}}"
+                if 'return_rate' in nodes.columns:
+                    marker = dict(colors=nodes['return_rate'], colorscale='RdYlGn_r',
+                                  colorbar=dict(title="Return Rate (%)"))
+                    hover += "<br>Return Rate: %{color:.2f}%"
+                fig = go.Figure(trace(
+                    ids=nodes['id'],
+                    labels=nodes['label'],
+                    parents=nodes['parent'],
+                    values=nodes[size],
+                    branchvalues='total',
+                    marker=marker,
+                    hovertemplate=hover + "<extra></extra>"
+                ))
+                fig.update_layout(title=f"{size_label} by Category, Subcategory and Product", height=600,
+                                  margin=dict(t=50, l=10, r=10, b=10))
+                return fig
+            
+            section.chart(cached_figure(section, build, chart_type, size_label))
+            st.caption(f"Shows the {HIERARCHY_PRODUCTS} largest products; the rest of each subcategory "
+                       "is grouped under Other. Colour is the unit-weighted return rate.")
+        except Exception as e:
+            st.error(f"Error creating product hierarchy chart: {e}")
+    
+    st.markdown("---")
+    
+    # Top Products
+    st.subheader("Top Products")
+    
+    with perf.section("Top Products") as section:
+        try:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                top_n = st.slider("Number of Products", 5, 50, 15, step=5, key="top_products_n")
+            with col2:
+                rank_label = st.selectbox("Rank By", list(measures), key="top_products_measure")
+            with col3:
+                categories = st.multiselect("Category", rollup.nodes[0]['category'].astype(str).tolist(),
+                                            placeholder="All categories", key="top_products_category")
+            
+            def build():
+                rank = measures[rank_label]
+                top = top_k(rollup, top_n, rank, filters=product_filters, categories=categories)
+                # One bar per product even where names repeat across subcategories
+                top['label'] = node_labels(top)
+                section.rows(len(top))
+                section.phase('figure')
                 fig = px.bar(
-                    top_products,
-                    x='sales',
-                    y='product_name',
+                    top,
+                    x=rank,
+                    y='label',
                     color='category',
                     orientation='h',
-                    title="Top 15 Products by Sales Revenue",
-                    labels={'sales': 'Sales (₹)', 'product_name': 'Product'},
-                    height=500
+                    title=f"Top {top_n} Products by {rank_label}",
+                    labels={rank: rank_label, 'label': 'Product'},
+                    hover_data=['subcategory'] + [col for col in measures.values() if col != rank],
+                    height=max(400, 28 * len(top))
                 )
-                fig.update_layout(showlegend=True)
-                st.plotly_chart(fig, use_container_width=True)
+                fig.update_layout(showlegend=True, yaxis=dict(categoryorder='array',
+                                                              categoryarray=top['label'][::-1]))
+                return fig
+            
+            section.chart(cached_figure(section, build, top_n, rank_label, tuple(categories)))
         except Exception as e:
             st.error(f"Error creating top products chart: {e}")
-        
-        st.markdown("---")
-        
-        # Category Performance
-        st.subheader("Performance by Category")
-        
+    
+    st.markdown("---")
+    
+    # Category Performance
+    st.subheader("Performance by Category")
+    
+    with perf.section("Performance by Category") as section:
         try:
-            if 'category' in df_product.columns and 'sales' in df_product.columns:
-                category_perf = df_product.groupby('category').agg({
-                    'sales': 'sum',
-                    'units_sold': 'sum' if 'units_sold' in df_product.columns else 'count',
-                    'profit': 'sum' if 'profit' in df_product.columns else 'mean'
-                }).reset_index().sort_values('sales', ascending=False)
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    fig1 = px.bar(category_perf, x='category', y='sales',
-                                 title="Total Sales by Category",
-                                 color='sales',
-                                 color_continuous_scale='Blues')
-                    st.plotly_chart(fig1, use_container_width=True)
-                
+            # Both charts share one lookup, run at most once and only on a cache miss
+            @lru_cache(maxsize=None)
+            def category_perf():
+                result = rollup_frame(rollup, 0, level_totals(rollup, 0, product_filters))
+                section.rows(len(result))
+                return result.sort_values('sales', ascending=False)
+            
+            def build_sales():
+                sales = category_perf()
+                section.phase('figure')
+                return px.bar(sales, x='category', y='sales',
+                             title="Total Sales by Category",
+                             color='sales',
+                             color_continuous_scale='Blues')
+            
+            def build_profit():
+                profit = category_perf()
+                section.phase('figure')
+                return px.bar(profit, x='category', y='profit',
+                             title="Total Profit by Category",
+                             color='profit',
+                             color_continuous_scale='Greens')
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                section.chart(cached_figure(section, build_sales, 'sales'))
+            
+            if 'profit' in rollup.measures:
                 with col2:
-                    fig2 = px.bar(category_perf, x='category', y='profit',
-                                 title="Total Profit by Category",
-                                 color='profit',
-                                 color_continuous_scale='Greens')
-                    st.plotly_chart(fig2, use_container_width=True)
+                    section.chart(cached_figure(section, build_profit, 'profit'))
         except Exception as e:
             st.error(f"Error creating category charts: {e}")
 
@@ -419,11 +1015,48 @@ def page_product_performance():
 # PAGE 5: GEOGRAPHIC ANALYSIS
 # ============================================================================
 
+@page_tables('geographic')
 def page_geographic_analysis():
     st.title("🗺️ Geographic Analysis")
     
     if not data['geographic'].empty:
-        df_geo = data['geographic'].copy()
+        df_geo = filtered_table('geographic')
+        
+        # State Map
+        st.subheader("State Map")
+        
+        with perf.section("State Map") as section:
+            try:
+                map_metrics = {label: col for label, col in MAP_METRICS.items() if col in df_geo.columns}
+                if map_metrics and {'state', 'latitude', 'longitude'} <= set(df_geo.columns):
+                    version = boundary_version()
+                    geometry = state_geometry(version) if version else None
+                    # The map opens framed on the states shown (the global region filter narrows it),
+                    # drawn at the detail that view needs; browser zoom does not reach the server
+                    level = bounds = None
+                    if geometry is not None:
+                        bounds = view_bounds(geometry, df_geo['state'])
+                        level = level_for_zoom(geometry, zoom_for_bounds(bounds))
+                    show_bubbles = st.checkbox("Show customer bubbles", value=True, key="map_bubbles")
+                    
+                    def build():
+                        section.rows(len(df_geo))
+                        section.phase('figure')
+                        return state_map_figure(df_geo, map_metrics, version, level, show_bubbles or geometry is None,
+                                                bounds)
+                    
+                    section.chart(cached_figure(section, build, version, level, show_bubbles))
+                    if geometry is None:
+                        st.caption(f"No state boundary file at {BOUNDARY_FILE.name} (NOVAMART_BOUNDARY_FILE); "
+                                   "showing state locations only.")
+                    else:
+                        st.caption(f"Pick the metric in the map's menu; boundaries simplified to "
+                                   f"{geometry.levels[level].tolerance:g}° for the states shown. Filter to a "
+                                   "region for finer borders; zooming the map itself keeps this detail.")
+            except Exception as e:
+                st.error(f"Error creating state map: {e}")
+        
+        st.markdown("---")
         
         st.subheader("State-wise Performance Metrics")
         
@@ -432,212 +1065,359 @@ def page_geographic_analysis():
             metric = st.selectbox("Select Metric", 
                                  ["Revenue", "Customers", "Market Penetration"] if 'revenue' in df_geo.columns else df_geo.select_dtypes(include=[np.number]).columns.tolist()[:3])
         
-        try:
-            metric_col = None
-            for col in df_geo.columns:
-                if metric.lower() in col.lower():
-                    metric_col = col
-                    break
+        with perf.section("State-wise Performance Metrics") as section:
+            try:
+                metric_col = None
+                for col in df_geo.columns:
+                    if metric.lower() in col.lower():
+                        metric_col = col
+                        break
             
-            if metric_col:
-                df_sorted = df_geo.sort_values(metric_col, ascending=True)
-                
-                fig = px.bar(df_sorted, x=metric_col, y='state' if 'state' in df_sorted.columns else df_sorted.columns[0],
-                            title=f"{metric} by State",
-                            color=metric_col,
-                            color_continuous_scale='Viridis',
-                            orientation='h')
-                fig.update_layout(height=500)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating geographic chart: {e}")
+                if metric_col:
+                    def build():
+                        df_sorted = df_geo.sort_values(metric_col, ascending=True)
+                        section.rows(len(df_sorted))
+                        section.phase('figure')
+                        fig = px.bar(df_sorted, x=metric_col, y='state' if 'state' in df_sorted.columns else df_sorted.columns[0],
+                                    title=f"{metric} by State",
+                                    color=metric_col,
+                                    color_continuous_scale='Viridis',
+                                    orientation='h')
+                        fig.update_layout(height=500)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, metric_col))
+            except Exception as e:
+                st.error(f"Error creating geographic chart: {e}")
         
         st.markdown("---")
         
         # State Performance Table
         st.subheader("State-wise Details")
-        try:
-            st.dataframe(df_geo.head(10), use_container_width=True)
-        except Exception as e:
-            st.error(f"Error displaying table: {e}")
+        with perf.section("State-wise Details") as section:
+            try:
+                section.rows(len(df_geo))
+                st.dataframe(df_geo.head(10), use_container_width=True)
+            except Exception as e:
+                st.error(f"Error displaying table: {e}")
 
 # ============================================================================
 # PAGE 6: ATTRIBUTION & FUNNEL
 # ============================================================================
 
+# The raw event log is optional: it is read (and keys the figures) only while its export exists
+@page_tables('funnel', *present_tables('funnel_events'), 'customer_journey', 'channel_attribution',
+             'campaign_performance', 'correlation_matrix')
 def page_attribution_funnel():
     st.title("🔗 Attribution & Funnel Analysis")
     
     # Funnel Chart
-    if not data['funnel'].empty:
+    df_events = data['funnel_events'] if source_path('funnel_events').exists() else pd.DataFrame()
+    if not df_events.empty or not data['funnel'].empty:
         st.subheader("Marketing Funnel")
         
-        try:
-            df_funnel = data['funnel'].copy()
-            
-            if 'stage' in df_funnel.columns and 'visitors' in df_funnel.columns:
-                # Sort by the order of funnel stages
-                stage_order = ['Awareness', 'Interest', 'Consideration', 'Evaluation', 'Purchase']
-                if 'stage' in df_funnel.columns:
-                    df_funnel['stage'] = pd.Categorical(df_funnel['stage'], categories=stage_order, ordered=True)
-                    df_funnel = df_funnel.sort_values('stage')
+        with perf.section("Marketing Funnel") as section:
+            try:
+                breakdown, widgets = None, ()
+                if FUNNEL_EVENT_COLUMNS <= set(df_events.columns):
+                    # Built from the raw event log: window and breakdown only re-sum the cached partial counts
+                    partials = funnel_event_partials(data_version('funnel_events'), df_events)
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        window_label = st.selectbox("Conversion Window", list(CONVERSION_WINDOWS), index=2,
+                                                    key="funnel_window")
+                    with col2:
+                        breakdown = st.selectbox("Break Down By", [None] + partials.breakdowns, key="funnel_breakdown",
+                                                 format_func=lambda col: 'None' if col is None else col.title())
+                    df_funnel = funnel_counts(partials, CONVERSION_WINDOWS[window_label], breakdown,
+                                              global_filters.get('funnel_events'))
+                    widgets = (window_label, breakdown)
+                    st.caption(f"Sessionized from {len(df_events):,} events; attempts reaching each stage within "
+                               f"{window_label.lower()} of entering the funnel")
+                else:
+                    # No event log: fall back to the pre-aggregated stage counts
+                    # Shallow copy: the shared frame is untouched, only the columns written below are copied
+                    df_funnel = data['funnel'].copy(deep=False)
+                    if 'stage' in df_funnel.columns:
+                        stage_order = FUNNEL_STAGES + [s for s in df_funnel['stage'].unique() if s not in FUNNEL_STAGES]
+                        df_funnel['stage'] = pd.Categorical(df_funnel['stage'], categories=stage_order, ordered=True)
+                        df_funnel = df_funnel.sort_values('stage')
                 
-                # Calculate conversion rates
-                df_funnel['conversion_rate'] = (df_funnel['visitors'] / df_funnel['visitors'].max() * 100).round(2)
+                has_stages = 'stage' in df_funnel.columns and 'visitors' in df_funnel.columns
+                if has_stages and not df_funnel['visitors'].any():
+                    st.info("No funnel events match the selected filters.")
+                elif has_stages:
+                    # Stage totals across the breakdown groups
+                    totals = df_funnel.groupby('stage', observed=True)['visitors'].sum()
                 
-                fig = go.Figure(go.Funnel(
-                    y=df_funnel['stage'],
-                    x=df_funnel['visitors'],
-                    textposition="inside",
-                    textinfo="value+percent previous",
-                    marker=dict(color=['#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A'])
-                ))
-                fig.update_layout(title="Marketing Conversion Funnel", height=400)
-                st.plotly_chart(fig, use_container_width=True)
+                    def build():
+                        section.rows(len(df_funnel))
+                        section.phase('figure')
+                        groups = df_funnel.groupby(breakdown, observed=True, sort=False) if breakdown else [(None, df_funnel)]
+                        fig = go.Figure([go.Funnel(
+                            name=str(group) if breakdown else None,
+                            y=rows['stage'],
+                            x=rows['visitors'],
+                            textposition="inside",
+                            textinfo="value+percent previous" if not breakdown else "value",
+                            marker=None if breakdown else dict(color=px.colors.qualitative.Plotly[:len(rows)])
+                        ) for group, rows in groups])
+                        fig.update_layout(title="Marketing Conversion Funnel", height=400 if not breakdown else 500)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, *widgets))
                 
-                # Funnel metrics
-                st.subheader("Funnel Conversion Rates")
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Total Visitors", f"{df_funnel['visitors'].sum():,}")
-                with col2:
-                    conversion = (df_funnel['visitors'].iloc[-1] / df_funnel['visitors'].iloc[0] * 100)
-                    st.metric("Overall Conversion Rate", f"{conversion:.2f}%")
-                with col3:
-                    st.metric("Final Conversions", f"{df_funnel['visitors'].iloc[-1]:,}")
-        except Exception as e:
-            st.error(f"Error creating funnel: {e}")
+                    # Funnel metrics
+                    df_funnel = totals.reset_index()
+                    st.subheader("Funnel Conversion Rates")
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("Total Visitors", f"{df_funnel['visitors'].iloc[0]:,}")
+                    with col2:
+                        conversion = (df_funnel['visitors'].iloc[-1] / df_funnel['visitors'].iloc[0] * 100)
+                        st.metric("Overall Conversion Rate", f"{conversion:.2f}%")
+                    with col3:
+                        st.metric("Final Conversions", f"{df_funnel['visitors'].iloc[-1]:,}")
+            except Exception as e:
+                st.error(f"Error creating funnel: {e}")
     
     st.markdown("---")
     
     # Attribution Model Comparison
-    if not data['channel_attribution'].empty:
+    df_journey = data['customer_journey']
+    if attribution.touchpoint_columns(df_journey) or not data['channel_attribution'].empty:
         st.subheader("Channel Attribution Comparison")
         
-        try:
-            df_attr = data['channel_attribution'].copy()
+        with perf.section("Channel Attribution Comparison") as section:
+            try:
+                if attribution.touchpoint_columns(df_journey):
+                    df_attr = journey_attribution(data_version('customer_journey'), df_journey)
+                    st.caption(f"Computed from {len(df_journey):,} journey paths "
+                               f"({df_attr['conversions'].sum():,.0f} conversions)")
+                else:
+                    # No journey paths to attribute: fall back to the exported percentages
+                    df_attr = data['channel_attribution']
             
-            if 'channel' in df_attr.columns:
-                attribution_models = [col for col in df_attr.columns if col != 'channel']
-                selected_model = st.selectbox("Select Attribution Model", attribution_models[:3])
-                
-                attr_data = df_attr.sort_values(selected_model, ascending=False)
-                
-                fig = go.Figure(data=[go.Pie(
-                    labels=attr_data['channel'],
-                    values=attr_data[selected_model],
-                    hole=0.3,
-                    textposition="inside"
-                )])
-                fig.update_layout(title=f"Channel Attribution - {selected_model} Model", height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating attribution chart: {e}")
+                if 'channel' in df_attr.columns:
+                    attribution_models = [col for col in df_attr.columns if col in attribution.ATTRIBUTION_MODELS]
+                    selected_model = st.selectbox("Select Attribution Model", attribution_models,
+                                                  format_func=lambda model: model.replace('_', ' ').title())
+                    if selected_model == 'markov':
+                        st.caption(f"Credit in proportion to each channel's removal effect: the share of conversions "
+                                   f"an order-{attribution.MARKOV_ORDER} Markov chain of the journeys loses without it")
+                    
+                    def build():
+                        attr_data = df_attr.sort_values(selected_model, ascending=False)
+                        section.rows(len(attr_data))
+                        section.phase('figure')
+                        fig = go.Figure(data=[go.Pie(
+                            labels=attr_data['channel'],
+                            values=attr_data[selected_model],
+                            hole=0.3,
+                            textposition="inside"
+                        )])
+                        fig.update_layout(title=f"Channel Attribution - {selected_model.replace('_', ' ').title()} Model",
+                                          height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, selected_model))
+            except Exception as e:
+                st.error(f"Error creating attribution chart: {e}")
     
     st.markdown("---")
     
     # Correlation Matrix Heatmap
-    if not data['correlation_matrix'].empty:
+    df_live_corr = campaign_correlation(global_filters.get('campaign_performance'))
+    if df_live_corr is not None or not data['correlation_matrix'].empty:
         st.subheader("Marketing Metrics Correlation")
         
-        try:
-            df_corr = data['correlation_matrix'].copy()
-            
-            # Handle the index as a column (first column is metric names)
-            if df_corr.columns[0] == '' or df_corr.index.name is None:
-                df_corr = df_corr.set_index(df_corr.columns[0]) if df_corr.columns[0] == '' else df_corr
-            
-            # Convert to numeric, handling any non-numeric values
-            df_corr_numeric = df_corr.apply(pd.to_numeric, errors='coerce')
-            
-            # Remove any rows/columns that are all NaN
-            df_corr_numeric = df_corr_numeric.dropna(how='all').dropna(axis=1, how='all')
+        with perf.section("Marketing Metrics Correlation") as section:
+            try:
+                if df_live_corr is not None:
+                    # Live from the campaign data, for the rows the global filters select
+                    df_corr_numeric = df_live_corr.dropna(how='all').dropna(axis=1, how='all')
+                    if df_corr_numeric.empty:
+                        st.info("Too few campaign rows match the selected filters to correlate.")
+                    else:
+                        st.caption("Computed from campaign_performance under the sidebar filters")
+                else:
+                    df_corr = data['correlation_matrix']
+                
+                    # Handle the index as a column (first column is metric names)
+                    if df_corr.columns[0] == '' or df_corr.index.name is None:
+                        df_corr = df_corr.set_index(df_corr.columns[0]) if df_corr.columns[0] == '' else df_corr
+                
+                    # Convert to numeric, handling any non-numeric values
+                    df_corr_numeric = df_corr.apply(pd.to_numeric, errors='coerce')
+                
+                    # Remove any rows/columns that are all NaN
+                    df_corr_numeric = df_corr_numeric.dropna(how='all').dropna(axis=1, how='all')
             
-            if not df_corr_numeric.empty:
-                fig = go.Figure(data=go.Heatmap(
-                    z=df_corr_numeric.values,
-                    x=df_corr_numeric.columns,
-                    y=df_corr_numeric.index,
-                    colorscale='RdBu',
-                    zmid=0,
-                    text=df_corr_numeric.values.round(2),
-                    texttemplate='%{text}',
-                    textfont={"size": 10}
-                ))
-                fig.update_layout(title="Correlation Matrix - Marketing Metrics", height=500, width=600)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating correlation heatmap: {e}")
+                if not df_corr_numeric.empty:
+                    def build():
+                        section.rows(len(df_corr_numeric))
+                        section.phase('figure')
+                        fig = go.Figure(data=go.Heatmap(
+                            z=df_corr_numeric.values,
+                            x=df_corr_numeric.columns,
+                            y=df_corr_numeric.index,
+                            colorscale='RdBu',
+                            zmid=0,
+                            text=df_corr_numeric.values.round(2),
+                            texttemplate='%{text}',
+                            textfont={"size": 10}
+                        ))
+                        fig.update_layout(title="Correlation Matrix - Marketing Metrics", height=500, width=600)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build))
+            except Exception as e:
+                st.error(f"Error creating correlation heatmap: {e}")
 
 # ============================================================================
 # PAGE 7: ML MODEL EVALUATION
 # ============================================================================
 
+@page_tables('lead_scoring', 'feature_importance', 'learning_curve')
 def page_ml_evaluation():
     st.title("🤖 ML Model Evaluation")
     
     if not data['lead_scoring'].empty:
-        df_leads = data['lead_scoring'].copy()
+        df_leads = data['lead_scoring']
+        curve = lead_score_curve(data_version('lead_scoring'), df_leads)
         
         # Confusion Matrix
         st.subheader("Confusion Matrix - Lead Scoring Model")
         
-        try:
-            if 'actual_converted' in df_leads.columns and 'predicted_class' in df_leads.columns:
-                cm = confusion_matrix(df_leads['actual_converted'], df_leads['predicted_class'])
-                
-                fig = go.Figure(data=go.Heatmap(
-                    z=cm,
-                    x=['Not Converted', 'Converted'],
-                    y=['Not Converted', 'Converted'],
-                    text=cm,
-                    texttemplate='%{text}',
-                    colorscale='Blues',
-                    showscale=True
-                ))
-                fig.update_layout(title="Confusion Matrix", height=400)
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Calculate metrics
-                tn, fp, fn, tp = cm.ravel()
-                accuracy = (tp + tn) / (tp + tn + fp + fn)
-                precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-                recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-                f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-                
-                col1, col2, col3, col4 = st.columns(4)
-                col1.metric("Accuracy", f"{accuracy:.3f}")
-                col2.metric("Precision", f"{precision:.3f}")
-                col3.metric("Recall", f"{recall:.3f}")
-                col4.metric("F1-Score", f"{f1:.3f}")
-        except Exception as e:
-            st.error(f"Error creating confusion matrix: {e}")
+        col1, col2 = st.columns([3, 1])
+        with col2:
+            threshold = st.slider("Decision Threshold", min_value=0.0, max_value=1.0, value=0.5,
+                                  step=THRESHOLD_STEP, key="lead_threshold",
+                                  help="Leads scored at or above this probability are predicted to convert")
+            show_intervals = st.checkbox(f"Show {BOOTSTRAP_LEVEL:.0%} bootstrap intervals", value=True,
+                                         key="lead_intervals")
+        
+        intervals = None
+        if curve is not None and show_intervals:
+            intervals = resample_intervals(lead_bootstrap(data_version('lead_scoring'), df_leads), threshold)
+        
+        def interval_caption(container, metric):
+            if intervals is not None:
+                low, high = intervals.loc[metric, ['low', 'high']]
+                container.caption(f"{BOOTSTRAP_LEVEL:.0%} CI {low:.3f} – {high:.3f}")
+        
+        with perf.section("Confusion Matrix - Lead Scoring Model") as section:
+            try:
+                if curve is not None:
+                    metrics = metrics_at(curve, threshold)
+                    cm = np.array([[metrics['tn'], metrics['fp']], [metrics['fn'], metrics['tp']]])
+                    
+                    def build():
+                        section.rows(len(df_leads))
+                        section.phase('figure')
+                        fig = go.Figure(data=go.Heatmap(
+                            z=cm,
+                            x=['Not Converted', 'Converted'],
+                            y=['Not Converted', 'Converted'],
+                            text=cm,
+                            texttemplate='%{text}',
+                            colorscale='Blues',
+                            showscale=True
+                        ))
+                        fig.update_layout(title=f"Confusion Matrix at Threshold {threshold:.2f}", height=400)
+                        return fig
+                    
+                    with col1:
+                        section.chart(cached_figure(section, build, threshold))
+                    
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("Accuracy", f"{metrics['accuracy']:.3f}")
+                    col2.metric("Precision", f"{metrics['precision']:.3f}")
+                    col3.metric("Recall", f"{metrics['recall']:.3f}")
+                    col4.metric("F1-Score", f"{metrics['f1']:.3f}")
+                    for col, metric in zip((col1, col2, col3, col4), ('accuracy', 'precision', 'recall', 'f1')):
+                        interval_caption(col, metric)
+                    
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("Leads Flagged", f"{metrics['flagged']:.1%}")
+                    col2.metric("Gain", f"{metrics['gain']:.1%}",
+                                help="Share of all converters among the flagged leads")
+                    col3.metric("Lift", f"{metrics['lift']:.2f}x",
+                                help="Conversion rate of flagged leads over the overall conversion rate")
+            except Exception as e:
+                st.error(f"Error creating confusion matrix: {e}")
         
         st.markdown("---")
         
         # ROC Curve
         st.subheader("ROC Curve - Model Performance")
         
-        try:
-            if 'predicted_probability' in df_leads.columns and 'actual_converted' in df_leads.columns:
-                fpr, tpr, thresholds = roc_curve(df_leads['actual_converted'], 
-                                                 df_leads['predicted_probability'])
-                roc_auc = auc(fpr, tpr)
-                
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(x=fpr, y=tpr, mode='lines',
-                                        name=f'ROC (AUC = {roc_auc:.3f})',
-                                        line=dict(color='#636EFA', width=2)))
-                fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode='lines',
-                                        name='Random Classifier',
-                                        line=dict(color='red', width=2, dash='dash')))
-                fig.update_layout(title="ROC Curve",
-                                 xaxis_title="False Positive Rate",
-                                 yaxis_title="True Positive Rate",
-                                 height=400)
-                st.plotly_chart(fig, use_container_width=True)
-        except Exception as e:
-            st.error(f"Error creating ROC curve: {e}")
+        with perf.section("ROC Curve - Model Performance") as section:
+            try:
+                if curve is not None:
+                    def build():
+                        roc = decimate(roc_points(curve), 'fpr', 'tpr')
+                        tn, fp, fn, tp = counts_at(curve, threshold)
+                        auc_label = f'AUC = {roc_auc(curve):.3f}'
+                        if intervals is not None:
+                            auc_label += (f", {BOOTSTRAP_LEVEL:.0%} CI {intervals.loc['auc', 'low']:.3f}"
+                                          f"–{intervals.loc['auc', 'high']:.3f}")
+                        section.rows(len(df_leads))
+                        section.phase('figure')
+                        fig = go.Figure()
+                        fig.add_trace(go.Scatter(x=roc['fpr'], y=roc['tpr'], mode='lines',
+                                                name=f'ROC ({auc_label})',
+                                                line=dict(color='#636EFA', width=2)))
+                        fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode='lines',
+                                                name='Random Classifier',
+                                                line=dict(color='red', width=2, dash='dash')))
+                        fig.add_trace(go.Scatter(x=[fp / max(fp + tn, 1)], y=[tp / max(tp + fn, 1)], mode='markers',
+                                                name=f'Threshold {threshold:.2f}',
+                                                marker=dict(color='black', size=10)))
+                        fig.update_layout(title="ROC Curve",
+                                         xaxis_title="False Positive Rate",
+                                         yaxis_title="True Positive Rate",
+                                         height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, threshold, show_intervals))
+                    interval_caption(st, 'auc')
+            except Exception as e:
+                st.error(f"Error creating ROC curve: {e}")
+        
+        st.markdown("---")
+        
+        # Precision-Recall Curve
+        st.subheader("Precision-Recall Curve")
+        
+        with perf.section("Precision-Recall Curve") as section:
+            try:
+                if curve is not None:
+                    def build():
+                        pr = decimate(pr_points(curve), 'recall', 'precision')
+                        at_threshold = metrics_at(curve, threshold)
+                        base_rate = curve.positives / max(curve.positives + curve.negatives, 1)
+                        section.rows(len(df_leads))
+                        section.phase('figure')
+                        fig = go.Figure()
+                        fig.add_trace(go.Scatter(x=pr['recall'], y=pr['precision'], mode='lines',
+                                                name=f'PR (AP = {average_precision(curve):.3f})',
+                                                line=dict(color='#00CC96', width=2)))
+                        fig.add_trace(go.Scatter(x=[0, 1], y=[base_rate, base_rate], mode='lines',
+                                                name='Random Classifier',
+                                                line=dict(color='red', width=2, dash='dash')))
+                        fig.add_trace(go.Scatter(x=[at_threshold['recall']], y=[at_threshold['precision']],
+                                                mode='markers', name=f'Threshold {threshold:.2f}',
+                                                marker=dict(color='black', size=10)))
+                        fig.update_layout(title="Precision-Recall Curve",
+                                         xaxis_title="Recall",
+                                         yaxis_title="Precision",
+                                         height=400)
+                        return fig
+                    
+                    section.chart(cached_figure(section, build, threshold))
+            except Exception as e:
+                st.error(f"Error creating precision-recall curve: {e}")
         
         st.markdown("---")
         
@@ -645,22 +1425,27 @@ def page_ml_evaluation():
         if not data['feature_importance'].empty:
             st.subheader("Feature Importance Analysis")
             
-            try:
-                df_importance = data['feature_importance'].copy()
+            with perf.section("Feature Importance Analysis") as section:
+                try:
+                    df_importance = data['feature_importance']
                 
-                if 'feature' in df_importance.columns and 'importance' in df_importance.columns:
-                    df_importance = df_importance.sort_values('importance', ascending=True)
-                    
-                    fig = px.bar(df_importance, x='importance', y='feature',
-                                title="Feature Importance in Lead Scoring Model",
-                                labels={'importance': 'Importance Score', 'feature': 'Feature'},
-                                color='importance',
-                                color_continuous_scale='Blues',
-                                orientation='h')
-                    fig.update_layout(height=400)
-                    st.plotly_chart(fig, use_container_width=True)
-            except Exception as e:
-                st.error(f"Error creating feature importance: {e}")
+                    if 'feature' in df_importance.columns and 'importance' in df_importance.columns:
+                        def build():
+                            sorted_importance = df_importance.sort_values('importance', ascending=True)
+                            section.rows(len(sorted_importance))
+                            section.phase('figure')
+                            fig = px.bar(sorted_importance, x='importance', y='feature',
+                                        title="Feature Importance in Lead Scoring Model",
+                                        labels={'importance': 'Importance Score', 'feature': 'Feature'},
+                                        color='importance',
+                                        color_continuous_scale='Blues',
+                                        orientation='h')
+                            fig.update_layout(height=400)
+                            return fig
+                        
+                        section.chart(cached_figure(section, build))
+                except Exception as e:
+                    st.error(f"Error creating feature importance: {e}")
         
         st.markdown("---")
         
@@ -668,53 +1453,103 @@ def page_ml_evaluation():
         if not data['learning_curve'].empty:
             st.subheader("Learning Curve - Model Diagnostics")
             
-            try:
-                df_learning = data['learning_curve'].copy()
+            with perf.section("Learning Curve - Model Diagnostics") as section:
+                try:
+                    df_learning = data['learning_curve']
                 
-                if 'training_size' in df_learning.columns:
-                    fig = go.Figure()
-                    
-                    if 'train_score' in df_learning.columns:
-                        fig.add_trace(go.Scatter(x=df_learning['training_size'],
-                                               y=df_learning['train_score'],
-                                               mode='lines+markers',
-                                               name='Training Score',
-                                               line=dict(color='#636EFA')))
-                    
-                    if 'val_score' in df_learning.columns:
-                        fig.add_trace(go.Scatter(x=df_learning['training_size'],
-                                               y=df_learning['val_score'],
-                                               mode='lines+markers',
-                                               name='Validation Score',
-                                               line=dict(color='#EF553B')))
-                    
-                    fig.update_layout(title="Learning Curve",
-                                     xaxis_title="Training Set Size",
-                                     yaxis_title="Score",
-                                     height=400)
-                    st.plotly_chart(fig, use_container_width=True)
-            except Exception as e:
-                st.error(f"Error creating learning curve: {e}")
+                    if 'training_size' in df_learning.columns:
+                        def build():
+                            section.rows(len(df_learning))
+                            section.phase('figure')
+                            fig = go.Figure()
+                    
+                            if 'train_score' in df_learning.columns:
+                                fig.add_trace(go.Scatter(x=df_learning['training_size'],
+                                                       y=df_learning['train_score'],
+                                                       mode='lines+markers',
+                                                       name='Training Score',
+                                                       line=dict(color='#636EFA')))
+                    
+                            if 'val_score' in df_learning.columns:
+                                fig.add_trace(go.Scatter(x=df_learning['training_size'],
+                                                       y=df_learning['val_score'],
+                                                       mode='lines+markers',
+                                                       name='Validation Score',
+                                                       line=dict(color='#EF553B')))
+                    
+                            fig.update_layout(title="Learning Curve",
+                                             xaxis_title="Training Set Size",
+                                             yaxis_title="Score",
+                                             height=400)
+                            return fig
+                        
+                        section.chart(cached_figure(section, build))
+                except Exception as e:
+                    st.error(f"Error creating learning curve: {e}")
 
 # ============================================================================
 # MAIN APP ROUTER
 # ============================================================================
 
+PAGES = {
+    "Executive Overview": page_executive_overview,
+    "Campaign Analytics": page_campaign_analytics,
+    "Customer Insights": page_customer_insights,
+    "Product Performance": page_product_performance,
+    "Geographic Analysis": page_geographic_analysis,
+    "Attribution & Funnel": page_attribution_funnel,
+    "ML Model Evaluation": page_ml_evaluation
+}
+
+@st.cache_data(show_spinner=False)
+def table_memory_report(versions):
+    """Plain vs compact bytes per table, recomputed only when a source file changes"""
+    return memory_report(TABLE_FILES)
+
+def render_load_report():
+    """Sidebar report of which tables this process has loaded and how long each took"""
+    with st.sidebar.expander("Data Load Report"):
+        report = load_report()
+        st.caption(f"Loaded this run: {', '.join(data.loaded()) or 'none'}")
+        st.dataframe(report.round(2), use_container_width=True, hide_index=True)
+        snapshot = st.session_state.data_snapshot
+        st.caption(f"Data snapshot {snapshot.version} of {refresher.snapshot.version}; "
+                   + (f"files checked every {refresher.interval:g} s (NOVAMART_REFRESH_SECONDS)"
+                      if refresher.interval > 0 else "background refresh off (NOVAMART_REFRESH_SECONDS=0)"))
+        refreshes = refresher.refresh_report()
+        if not refreshes.empty:
+            st.dataframe(refreshes.round(1), use_container_width=True, hide_index=True)
+        imports = import_report()
+        if not imports.empty:
+            st.caption("Timed imports in this process (deferred to first use, or done by the prewarm launcher)")
+            st.dataframe(imports.round(1), use_container_width=True, hide_index=True)
+        if st.checkbox("Compare plain vs compact memory", key="memory_report"):
+            st.caption(f"Compact mode is {'on' if COMPACT_MODE else 'off'} (NOVAMART_COMPACT)")
+            versions = tuple(table_version(key) for key in TABLE_FILES)
+            st.dataframe(table_memory_report(versions).round(2), use_container_width=True, hide_index=True)
+
+def render_performance_panel():
+    """Sidebar breakdown of this run's sections plus p50/p95 per section from the metrics log"""
+    with st.sidebar.expander("Performance", expanded=True):
+        st.caption("This run (ms)")
+        st.dataframe(perf.frame().drop(columns=['timestamp', 'page'], errors='ignore'),
+                     use_container_width=True, hide_index=True)
+        stats = figure_cache().stats()
+        st.caption(f"Figure cache: {stats['entries']} figures, {stats['size_mb']:.1f} MB, "
+                   f"{stats['hits']} hits / {stats['misses']} misses")
+        st.caption("All logged runs of this page")
+        st.dataframe(section_percentiles(read_metrics(), page=page).round(1),
+                     use_container_width=True, hide_index=True)
+
 def main():
-    if page == "Executive Overview":
-        page_executive_overview()
-    elif page == "Campaign Analytics":
-        page_campaign_analytics()
-    elif page == "Customer Insights":
-        page_customer_insights()
-    elif page == "Product Performance":
-        page_product_performance()
-    elif page == "Geographic Analysis":
-        page_geographic_analysis()
-    elif page == "Attribution & Funnel":
-        page_attribution_funnel()
-    elif page == "ML Model Evaluation":
-        page_ml_evaluation()
+    page_func = PAGES[page]
+    with perf.section("Load Tables"):
+        data.prefetch([key for key in page_func.required_tables if not source.serves(key)])
+    page_func()
+    perf.flush()
+    render_load_report()
+    if show_performance:
+        render_performance_panel()
     
     # Footer
     st.markdown("---")
@@ -0,0 +1,287 @@
+"""
+Attribution Engine - NovaMart
+Derives the rule-based attribution models (first touch, last touch, linear,
+time decay, position based) from journey paths in the customer_journey format
+(touchpoint_1..N ending in a conversion or exit state, plus customer_count).
+Paths are held as one padded matrix of channel codes, so every model is a
+handful of array operations however many distinct journeys there are.
+The data-driven Markov model fits a sparse transition matrix to the same
+paths and credits channels by their removal effect.
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Terminal touchpoints: a path ending in a conversion state converted, any
+# other path (ending in an exit state or simply cut off) did not
+CONVERSION_STATES = {'Purchase', 'Conversion', 'Converted'}
+EXIT_STATES = {'Exit', 'Drop', 'Null'}
+
+ATTRIBUTION_MODELS = ['first_touch', 'last_touch', 'linear', 'time_decay', 'position_based', 'markov']
+
+# Time decay without timestamps: a touch's weight halves for every this many
+# touches it sits before the conversion
+TIME_DECAY_HALF_LIFE = 1.0
+
+# Position based (U-shaped): share of credit for the first and for the last
+# touch; the remainder is split over the touches in between
+POSITION_ENDS_SHARE = 0.4
+
+# One journey per row: codes[i, j] is the j-th channel touch of path i (-1
+# past its end), lengths[i] its touch count, weights[i] the customers taking it
+JourneyPaths = namedtuple('JourneyPaths', ['codes', 'lengths', 'weights', 'converted', 'channels'])
+
+
+def touchpoint_columns(df):
+    """touchpoint_1..N columns of a journey frame, in step order"""
+    columns = [col for col in df.columns if col.startswith('touchpoint_') and col[len('touchpoint_'):].isdigit()]
+    return sorted(columns, key=lambda col: int(col[len('touchpoint_'):]))
+
+
+def _shared_codes(columns, n_rows):
+    """
+    Factorize each column on its own (fast on categorical or string
+    columns) and map the per-column codes onto one shared label list.
+    Returns a (rows x columns) code matrix, -1 for missing, and the labels.
+    """
+    codes = np.full((n_rows, len(columns)), -1, dtype=np.int64)
+    shared = {}
+    for j, column in enumerate(columns):
+        column_codes, labels = pd.factorize(column)
+        mapping = np.array([shared.setdefault(label, len(shared)) for label in labels], dtype=np.int64)
+        present = column_codes >= 0
+        codes[present, j] = mapping[column_codes[present]]
+    return codes, list(shared)
+
+
+def journey_paths(df, count_col='customer_count'):
+    """
+    Encode a journey frame as JourneyPaths. The terminal state is dropped
+    from each path and decides whether it converted; empty steps are
+    squeezed out so touches are left-aligned.
+    """
+    steps = touchpoint_columns(df)
+    n_paths, n_steps = len(df), len(steps)
+    codes, uniques = _shared_codes([df[col] for col in steps], n_paths)
+
+    # Left-align each row's non-empty steps, keeping their order
+    order = np.argsort(codes < 0, axis=1, kind='stable')
+    codes = np.take_along_axis(codes, order, axis=1)
+    n_filled = (codes >= 0).sum(axis=1)
+
+    terminal_codes = np.array([i for i, label in enumerate(uniques)
+                               if label in CONVERSION_STATES or label in EXIT_STATES], dtype=np.int64)
+    conversion_codes = np.array([i for i, label in enumerate(uniques) if label in CONVERSION_STATES], dtype=np.int64)
+    last = codes[np.arange(n_paths), np.maximum(n_filled - 1, 0)] if n_steps else np.full(n_paths, -1)
+    has_terminal = (n_filled > 0) & np.isin(last, terminal_codes)
+    converted = has_terminal & np.isin(last, conversion_codes)
+    lengths = n_filled - has_terminal
+
+    # Terminal steps are not channels: drop them from the codes and the labels
+    is_channel = ~np.isin(np.arange(len(uniques)), terminal_codes)
+    remap = np.where(is_channel, np.cumsum(is_channel) - 1, -1)
+    within = np.arange(n_steps)[None, :] < lengths[:, None]
+    codes = np.where(within, remap[np.maximum(codes, 0)], -1)
+
+    weights = df[count_col].to_numpy(np.float64) if count_col in df.columns else np.ones(n_paths)
+    channels = [label for label, keep in zip(uniques, is_channel) if keep]
+    return JourneyPaths(codes, lengths, weights, converted, channels)
+
+
+# ============================================================================
+# RULE-BASED MODELS
+# ============================================================================
+
+def position_credit(lengths, width, model):
+    """
+    Share of a conversion credited to each touch position: a (paths x width)
+    matrix whose rows sum to 1 over the first lengths[i] positions
+    """
+    position = np.arange(width)[None, :]
+    k = lengths[:, None]
+    within = position < k
+
+    if model == 'first_touch':
+        credit = (position == 0) & within
+    elif model == 'last_touch':
+        credit = position == k - 1
+    elif model == 'linear':
+        credit = within / np.maximum(k, 1)
+    elif model == 'time_decay':
+        decay = np.where(within, 0.5 ** ((k - 1 - position) / TIME_DECAY_HALF_LIFE), 0.0)
+        credit = decay / np.maximum(decay.sum(axis=1, keepdims=True), 1e-300)
+    elif model == 'position_based':
+        middle = np.where(k > 2, (1 - 2 * POSITION_ENDS_SHARE) / np.maximum(k - 2, 1), 0.0)
+        ends = np.where(k > 2, POSITION_ENDS_SHARE, np.where(k == 2, 0.5, 1.0))
+        credit = np.where((position == 0) | (position == k - 1), ends, middle) * within
+    else:
+        raise ValueError(f"Unknown attribution model: {model}")
+    return credit.astype(np.float64)
+
+
+def attribute(paths, model):
+    """Conversions credited to each channel by one model, as an array aligned with paths.channels"""
+    if model == 'markov':
+        effects = removal_effects(markov_chain(paths))
+        total_effect = effects.sum()
+        converted = paths.weights[paths.converted].sum()
+        return effects / total_effect * converted if total_effect > 0 else np.zeros(len(paths.channels))
+
+    converting = paths.converted & (paths.lengths > 0)
+    codes, lengths = paths.codes[converting], paths.lengths[converting]
+    credit = position_credit(lengths, codes.shape[1], model) * paths.weights[converting][:, None]
+    touched = codes >= 0
+    return np.bincount(codes[touched], weights=credit[touched], minlength=len(paths.channels))
+
+
+def attribution_table(paths, models=ATTRIBUTION_MODELS):
+    """
+    Share of conversions (percent) each channel receives under every model,
+    in the layout of channel_attribution.csv, plus the credited conversions
+    under the linear model
+    """
+    table = pd.DataFrame({'channel': paths.channels})
+    for model in models:
+        credited = attribute(paths, model)
+        total = credited.sum()
+        table[model] = credited / total * 100 if total else 0.0
+    table['conversions'] = attribute(paths, 'linear')
+    return table.sort_values(models[0], ascending=False).reset_index(drop=True)
+
+
+# ============================================================================
+# MARKOV CHAIN REMOVAL EFFECT
+# ============================================================================
+
+# States remember the last MARKOV_ORDER channels (NOVAMART_MARKOV_ORDER)
+MARKOV_ORDER = int(os.environ.get('NOVAMART_MARKOV_ORDER', '1'))
+MARKOV_TOLERANCE = 1e-10
+MARKOV_MAX_ITERATIONS = 10_000
+
+# Key spaces up to this size are compacted with a lookup table instead of a sort
+MARKOV_DENSE_KEYS = 1 << 24
+
+# Cap on states x removal columns solved at once, which bounds the solve's memory
+MARKOV_BATCH_ELEMENTS = 1 << 22
+
+# transitions: sparse (states x states) probabilities between transient
+# states, state 0 being the journey start; conversion: probability of
+# converting straight from each state; state_channels: sparse (states x
+# channels) incidence of the channels each state remembers
+MarkovChain = namedtuple('MarkovChain', ['transitions', 'conversion', 'state_channels', 'order'])
+
+
+def _compact(keys, key_space):
+    """(distinct keys in ascending order, position of each key among them)"""
+    if key_space <= MARKOV_DENSE_KEYS:
+        present = np.zeros(key_space, dtype=bool)
+        present[keys] = True
+        distinct = np.flatnonzero(present)
+        lookup = np.cumsum(present) - 1
+        return distinct, lookup[keys]
+    distinct, inverse = np.unique(keys, return_inverse=True)
+    return distinct, inverse.ravel()
+
+
+def markov_chain(paths, order=MARKOV_ORDER):
+    """
+    Fit an order-k Markov chain to the journey paths. A state is the tuple of
+    the last k channels (shorter at the start of a path), packed into one
+    integer key; transitions are aggregated per (from, to) key pair before the
+    sparse matrix is built.
+    """
+    n_paths, width = paths.codes.shape
+    base = len(paths.channels) + 1
+    within = np.arange(width)[None, :] < paths.lengths[:, None]
+
+    # Key digit j is 1 + the channel j steps back, 0 before the path started
+    keys = np.zeros((n_paths, width), dtype=np.int64)
+    digits = np.where(within, paths.codes + 1, 0)
+    for j in range(order):
+        keys[:, j:] += digits[:, :width - j] * base ** j
+
+    state_keys, inverse = _compact(keys[within], base ** order)
+    states = np.zeros((n_paths, width), dtype=np.int64)
+    states[within] = 1 + inverse
+    n_states = 1 + len(state_keys)
+
+    # Start -> first touch, then each touch -> the next one
+    has_touch = paths.lengths > 0
+    steps = within[:, 1:]
+    sources = np.concatenate([np.zeros(has_touch.sum(), dtype=np.int64), states[:, :-1][steps]])
+    targets = np.concatenate([states[has_touch, 0], states[:, 1:][steps]])
+    weights = np.concatenate([paths.weights[has_touch], np.broadcast_to(paths.weights[:, None], steps.shape)[steps]])
+    pairs, pair_ids = _compact(sources * n_states + targets, n_states * n_states)
+    pair_weights = np.bincount(pair_ids, weights=weights, minlength=len(pairs))
+    counts = sparse.csr_matrix((pair_weights, (pairs // n_states, pairs % n_states)), shape=(n_states, n_states))
+
+    # The last state (the start for touchless paths) exits to conversion or null
+    last = np.where(has_touch, states[np.arange(n_paths), np.maximum(paths.lengths - 1, 0)], 0)
+    converted = np.bincount(last, weights=paths.weights * paths.converted, minlength=n_states)
+    dropped = np.bincount(last, weights=paths.weights * ~paths.converted, minlength=n_states)
+
+    totals = np.asarray(counts.sum(axis=1)).ravel() + converted + dropped
+    scale = np.divide(1.0, totals, out=np.zeros(n_states), where=totals > 0)
+    transitions = sparse.diags(scale) @ counts
+
+    # Channels each state remembers, decoded from its key's digits
+    rows, cols = [], []
+    for j in range(order):
+        digit = state_keys // base ** j % base
+        present = digit > 0
+        rows.append(1 + np.flatnonzero(present))
+        cols.append(digit[present] - 1)
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    state_channels = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_states, len(paths.channels)))
+    state_channels.data[:] = 1.0
+    return MarkovChain(transitions.tocsr(), converted * scale, state_channels, order)
+
+
+def _absorption(transitions, conversion, keep, tolerance, max_iterations):
+    """
+    Solve x = keep * (Q x + r) for every column of keep by fixed-point
+    (Jacobi) iteration, one sparse matrix product per step. Rows zeroed in
+    keep are removed states, absorbed into null; Q is substochastic with
+    every state able to reach an exit, so the iteration converges.
+    """
+    x = np.zeros_like(keep)
+    for _ in range(max_iterations):
+        updated = keep * (transitions @ x + conversion)
+        converged = np.abs(updated - x).max(initial=0.0) < tolerance
+        x = updated
+        if converged:
+            break
+    return x
+
+
+def conversion_probabilities(chain, tolerance=MARKOV_TOLERANCE, max_iterations=MARKOV_MAX_ITERATIONS):
+    """
+    Probability of converting from the start with every state present, and
+    with each channel removed (the states remembering it lead to null).
+    The removals are solved together as columns of one system, in batches.
+    Returns (baseline, array aligned with the chain's channels).
+    """
+    n_states, n_channels = chain.state_channels.shape
+    conversion = chain.conversion[:, None]
+    removes = chain.state_channels.tocsc()
+    baseline = _absorption(chain.transitions, conversion, np.ones((n_states, 1)), tolerance, max_iterations)[0, 0]
+
+    removed = np.empty(n_channels)
+    batch = max(1, MARKOV_BATCH_ELEMENTS // max(n_states, 1))
+    for first in range(0, n_channels, batch):
+        last = min(first + batch, n_channels)
+        keep = 1.0 - (removes[:, first:last].toarray() > 0)
+        removed[first:last] = _absorption(chain.transitions, conversion, keep, tolerance, max_iterations)[0]
+    return baseline, removed
+
+
+def removal_effects(chain):
+    """Share of the start's conversion probability lost when each channel is removed"""
+    baseline, removed = conversion_probabilities(chain)
+    if baseline <= 0:
+        return np.zeros_like(removed)
+    return np.clip(1 - removed / baseline, 0.0, None)
@@ -0,0 +1,620 @@
+#!/usr/bin/env python
+"""
+NovaMart Analytics Dashboard Benchmark
+Generates schema-faithful synthetic datasets at a chosen scale and times data
+loading plus every aggregation and figure-building step of the 7 pages,
+headlessly. Results are written as JSON so runs can be compared across commits.
+
+Usage:
+    python benchmark.py run --scales 1 100 1000
+    python benchmark.py compare benchmark_results/old.json benchmark_results/new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+BENCH_DATA_DIR = SCRIPT_DIR / 'bench_data'
+RESULTS_DIR = SCRIPT_DIR / 'benchmark_results'
+
+PAGES = ["Executive Overview", "Campaign Analytics", "Customer Insights",
+         "Product Performance", "Geographic Analysis", "Attribution & Funnel",
+         "ML Model Evaluation"]
+
+# Tables that grow with scale: each 1x sample is replicated `scale` times with
+# fresh IDs and lognormal noise on the measure columns
+SCALED_TABLES = {
+    'campaign_performance.csv': {
+        'ids': ['campaign_id'],
+        'measures': ['impressions', 'clicks', 'conversions', 'spend', 'revenue']
+    },
+    'customer_data.csv': {
+        'ids': ['customer_id'],
+        'measures': ['income', 'lifetime_value', 'total_purchases', 'avg_order_value']
+    },
+    'product_sales.csv': {
+        'ids': ['product_id', 'product_name'],
+        'measures': ['sales', 'units_sold', 'profit']
+    },
+    'lead_scoring_results.csv': {
+        'ids': ['lead_id'],
+        'measures': []
+    },
+    'customer_journey.csv': {
+        'ids': [],
+        'measures': ['customer_count']
+    },
+    'funnel_events.csv': {
+        'ids': ['user_id'],
+        'measures': []
+    }
+}
+
+
+# ============================================================================
+# SYNTHETIC DATA GENERATION
+# ============================================================================
+
+def _replica(sample, spec, k, rng):
+    """The k-th copy of a 1x sample; copy 0 is the sample itself"""
+    df = sample.copy()
+    if k == 0:
+        return df
+
+    for col in spec['ids']:
+        df[col] = df[col].astype(str) + f"_{k}"
+    for col in spec['measures']:
+        noisy = df[col] * rng.lognormal(0.0, 0.15, len(df))
+        df[col] = noisy.round().astype(df[col].dtype) if pd.api.types.is_integer_dtype(df[col]) else noisy.round(2)
+    if 'predicted_probability' in df.columns:
+        df['predicted_probability'] = (df['predicted_probability'] + rng.normal(0, 0.05, len(df))).clip(0, 1).round(4)
+        df['predicted_class'] = (df['predicted_probability'] >= 0.5).astype(int)
+    return df
+
+
+FUNNEL_STAGES = ['Awareness', 'Interest', 'Consideration', 'Intent', 'Evaluation', 'Purchase']
+FUNNEL_ADVANCE = [0.45, 0.49, 0.55, 0.5, 0.53]
+FUNNEL_CHANNELS = {'Google Ads': 20, 'Facebook': 18, 'Instagram': 14, 'Email': 10, 'Organic Search': 14,
+                   'Referral': 8, 'LinkedIn': 6, 'Direct': 10}
+FUNNEL_REGIONS = ['North', 'South', 'East', 'West', 'Central']
+
+
+def sample_funnel_events(users=3000, seed=2024):
+    """
+    Synthetic 1x event log (user_id, timestamp, stage, channel, region) for
+    the event-level funnel, which has no bundled export: each user makes one
+    to three attempts over 2023-2024, advancing through the stages with
+    lognormal gaps and occasionally repeating a stage
+    """
+    rng = np.random.default_rng(seed)
+    channels = list(FUNNEL_CHANNELS)
+    weights = np.array(list(FUNNEL_CHANNELS.values()), dtype=float)
+    weights /= weights.sum()
+    first, last = pd.Timestamp('2023-01-01').value, pd.Timestamp('2024-12-31').value
+    day = 86400 * 10**9
+
+    rows = []
+    for u in range(users):
+        user, region = f"USR_{10000 + u}", rng.choice(FUNNEL_REGIONS)
+        attempts = rng.choice([1, 1, 1, 2, 2, 3])
+        start = rng.integers(first, last - 60 * day)
+        for _ in range(attempts):
+            channel, t = rng.choice(channels, p=weights), start
+            rows.append((user, t, FUNNEL_STAGES[0], channel, region))
+            for k in range(1, len(FUNNEL_STAGES)):
+                if rng.random() > FUNNEL_ADVANCE[k - 1]:
+                    break
+                # Median of about 3 hours between stages, with a tail into days and weeks
+                t += int(rng.lognormal(np.log(3 * 3600), 1.8) * 1e9)
+                if rng.random() < 0.15:
+                    rows.append((user, t - int(rng.integers(60, 3600) * 1e9), FUNNEL_STAGES[k - 1], channel, region))
+                rows.append((user, t, FUNNEL_STAGES[k], channel, region))
+            start = t + int(rng.uniform(2, 40) * day)
+
+    df = pd.DataFrame(rows, columns=['user_id', 'timestamp', 'stage', 'channel', 'region'])
+    df = df[df['timestamp'] < pd.Timestamp('2025-01-01').value]
+    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.floor('s').dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df.sort_values(['timestamp', 'user_id'], kind='stable').reset_index(drop=True)
+
+
+# Boundary file the app looks for next to the CSVs
+BOUNDARY_SAMPLE = 'india_states.geojson'
+BOUNDARY_ORIGIN = (68.0, 8.0)
+BOUNDARY_CELL = 6.0
+BOUNDARY_EDGE_POINTS = 400
+
+
+def _boundary_edge(start, end, seed):
+    """Wavy border from corner `start` to corner `end`, identical (reversed) for the neighbour walking it back"""
+    a, b = min(start, end), max(start, end)
+    rng = np.random.default_rng([seed, *a, *b])
+    p, q = np.array(a, dtype=float), np.array(b, dtype=float)
+    t = np.linspace(0, 1, BOUNDARY_EDGE_POINTS)
+    normal = np.array([p[1] - q[1], q[0] - p[0]])
+    # A broad bend plus fine ripple, so every tolerance removes something
+    wave = np.sin(t * np.pi) * (0.05 * np.sin(t * np.pi * rng.integers(2, 6)) + 0.004 * np.sin(t * rng.uniform(80, 120)))
+    points = BOUNDARY_CELL * (p + np.outer(t, q - p) + np.outer(wave, normal)) + BOUNDARY_ORIGIN
+    points = points.round(5)
+    return points if (start, end) == (a, b) else points[::-1]
+
+
+def sample_state_boundaries(seed=7):
+    """
+    Synthetic boundary GeoJSON for the states in geographic_data.csv, which
+    ship without one: a grid of cells laid out north to south and west to
+    east by each state's coordinates, with wavy shared borders and an
+    offshore island on the south-western one. It exercises the boundary
+    simplification, its cache and the choropleth; the shapes are not real.
+    """
+    geo = pd.read_csv(SCRIPT_DIR / 'geographic_data.csv', usecols=['state', 'latitude', 'longitude'])
+    cols = int(np.ceil(np.sqrt(len(geo))))
+    rows = -(-len(geo) // cols)
+    geo = geo.sort_values('latitude', ascending=False, kind='stable').reset_index(drop=True)
+    geo['row'] = rows - 1 - geo.index // cols
+    geo = geo.sort_values(['row', 'longitude'], kind='stable')
+    geo['col'] = geo.groupby('row').cumcount()
+
+    features = []
+    for state, row, col in zip(geo['state'], geo['row'], geo['col']):
+        corners = [(col, row), (col + 1, row), (col + 1, row + 1), (col, row + 1)]
+        ring = np.concatenate([_boundary_edge(corners[k], corners[(k + 1) % 4], seed)[:-1] for k in range(4)])
+        polygons = [[np.vstack([ring, ring[:1]]).tolist()]]
+        if row == 0 and col == 0:
+            angle = np.linspace(0, 2 * np.pi, 60, endpoint=False)
+            island = (np.column_stack([np.cos(angle), np.sin(angle)]) * 0.4
+                      + (BOUNDARY_ORIGIN[0] - 1.0, BOUNDARY_ORIGIN[1] + 1.0)).round(5)
+            polygons.append([np.vstack([island, island[:1]]).tolist()])
+        features.append({'type': 'Feature', 'properties': {'ST_NM': state},
+                         'geometry': {'type': 'MultiPolygon', 'coordinates': polygons}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+# Samples generated when the app directory has no such export
+GENERATED_SAMPLES = {
+    'funnel_events.csv': sample_funnel_events
+}
+
+
+def _samples():
+    """{csv name: callable returning its 1x sample}: the bundled CSVs plus generated ones they lack"""
+    samples = {csv.name: (lambda csv=csv: pd.read_csv(csv)) for csv in sorted(SCRIPT_DIR.glob('*.csv'))}
+    for name, make in GENERATED_SAMPLES.items():
+        samples.setdefault(name, make)
+    return samples
+
+
+def generate(scale, out_dir, seed=42):
+    """
+    Write a dataset `scale` times the bundled sample into out_dir.
+    Replicas are appended one at a time, so memory stays at one 1x copy.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    for name, make in _samples().items():
+        if name not in SCALED_TABLES:
+            shutil.copy(SCRIPT_DIR / name, out_dir / name)
+            continue
+        sample = make()
+        target = out_dir / name
+        for k in range(scale):
+            _replica(sample, SCALED_TABLES[name], k, rng).to_csv(
+                target, mode='w' if k == 0 else 'a', header=(k == 0), index=False)
+
+    # Boundaries do not scale; a real file next to the app wins over the sample
+    if (SCRIPT_DIR / BOUNDARY_SAMPLE).exists():
+        shutil.copy(SCRIPT_DIR / BOUNDARY_SAMPLE, out_dir / BOUNDARY_SAMPLE)
+    else:
+        with open(out_dir / BOUNDARY_SAMPLE, 'w') as fh:
+            json.dump(sample_state_boundaries(), fh)
+
+    (out_dir / 'SCALE').write_text(str(scale))
+    return out_dir
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def _proc_status_kb(field):
+    with open('/proc/self/status') as fh:
+        for line in fh:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return None
+
+
+def _reset_peak_rss():
+    """Reset the kernel's resident-set high-water mark (Linux); False where unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+        return _proc_status_kb('VmHWM') is not None
+    except OSError:
+        return False
+
+
+class Recorder:
+    """
+    Collects wall time and peak memory per step. On Linux the peak is the
+    resident-set high-water mark above the step's starting RSS, which also
+    covers NumPy/Arrow native buffers; elsewhere it falls back to tracemalloc.
+    """
+
+    def __init__(self):
+        self.results = []
+        self.use_rss = _reset_peak_rss()
+
+    def measure(self, group, step, func, *args, **kwargs):
+        if self.use_rss:
+            _reset_peak_rss()
+            baseline = _proc_status_kb('VmRSS')
+        else:
+            tracemalloc.start()
+        start = time.perf_counter()
+        error = None
+        try:
+            value = func(*args, **kwargs)
+        except Exception as e:
+            value, error = None, f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - start
+        if self.use_rss:
+            peak = (_proc_status_kb('VmHWM') - baseline) * 1024
+        else:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        record = {'group': group, 'step': step, 'seconds': round(seconds, 6), 'peak_mb': round(peak / 1e6, 3)}
+        if error:
+            record['error'] = error
+        self.results.append(record)
+        print(f"  {group:22s} {step:34s} {seconds * 1000:10.1f} ms {peak / 1e6:9.1f} MB{'  ' + error if error else ''}")
+        return value
+
+
+def _figure_json(fig):
+    """Serialize a figure the way st.plotly_chart does, returning its size in bytes"""
+    return len(fig.to_json())
+
+
+def run_steps(rec):
+    """Time the data and figure pipeline of every page without Streamlit"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    import queries
+    from attribution import attribution_table, journey_paths, markov_chain, removal_effects
+    from campaign_cube import append_to_cube, build_cube
+    from campaign_moments import build_moments, correlation_frame, fold_moments
+    from cross_filters import FilterSelection, build_index, table_filters
+    from customer_stats import (box_stats, density_bins, fine_histogram, ols_from_stats, rebin,
+                                regression_stats)
+    from data_cache import SNAPSHOT_DIR, TABLE_FILES, load_table
+    from data_refresh import DataRefresher
+    from data_sources import FilteredSource, PandasSource, Query, run_frame_query
+    from downsampling import decimate
+    from funnel import CONVERSION_WINDOWS, funnel_counts, funnel_partials
+    from geo_shapes import GEOMETRY_CACHE, level_for_zoom, level_geojson, load_geometry, view_bounds, zoom_for_bounds
+    from incremental_ingest import AppendOnlyTable
+    from lead_scoring import (bootstrap_resamples, metrics_at, pr_points, resample_intervals, roc_auc, roc_points,
+                              score_curve)
+    from product_rollup import build_rollup, hierarchy_frame, level_totals, rollup_frame, top_k
+
+    # Table loads, still grouped as 'load_data' so older results compare: cold parses
+    # the CSVs and writes snapshots, warm reads snapshots
+    shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+    rec.measure('load_data', 'cold (parse + snapshot)', lambda: {key: load_table(key) for key in TABLE_FILES})
+    tables = rec.measure('load_data', 'warm (snapshot)', lambda: {key: load_table(key) for key in TABLE_FILES})
+
+    # A background refresh cycle in which no file changed only stats the sources
+    refresher = DataRefresher()
+    for key in TABLE_FILES:
+        refresher.entry(key)
+    rec.measure('load_data', 'refresh check (unchanged)', refresher.refresh)
+    del refresher
+
+    store = AppendOnlyTable('campaign_performance', {'cube': (build_cube, append_to_cube)})
+    rec.measure('Executive Overview', 'build campaign cube', store.refresh)
+    source = PandasSource({'campaign_performance': lambda: store.derived['cube'],
+                           'product_sales': lambda: tables['product_sales']})
+
+    # Global filters: build the row indexes, then answer one combined selection
+    # through bitmap intersection and, for reference, through column masks
+    group = 'Global Filters'
+    cube = store.derived['cube']
+    cube_index = rec.measure(group, 'index campaign cube', build_index, 'campaign_performance', cube)
+    customer_index = rec.measure(group, 'index customers', build_index, 'customer_data', tables['customer_data'])
+    first, last = cube['date'].min(), cube['date'].max()
+    selection = table_filters(FilterSelection((first + (last - first) / 4, last - (last - first) / 4),
+                                              ['North', 'East'], ['Email', 'Facebook'], ['Premium']))
+    customer_query = Query('customer_data', columns=list(tables['customer_data'].columns),
+                           filters=selection['customer_data'])
+    rec.measure(group, 'customers bitmap filter', run_frame_query, tables['customer_data'], customer_query,
+                customer_index)
+    rec.measure(group, 'customers mask filter', run_frame_query, tables['customer_data'], customer_query)
+    filtered = FilteredSource(PandasSource({'campaign_performance': lambda: cube},
+                                           {'campaign_performance': lambda: cube_index}), selection)
+    rec.measure(group, 'kpi totals filtered', queries.kpi_totals, filtered)
+    rec.measure(group, 'revenue trend daily filtered', queries.revenue_trend, filtered, 'Daily')
+
+    # Page 1: Executive Overview
+    page = PAGES[0]
+    rec.measure(page, 'kpi totals', queries.kpi_totals, source)
+    for aggregation in ["Daily", "Weekly", "Monthly"]:
+        trend = rec.measure(page, f'revenue trend {aggregation.lower()}', queries.revenue_trend, source, aggregation)
+    trend = rec.measure(page, 'decimate trend', decimate, trend, 'date', 'revenue')
+    rec.measure(page, 'trend figure', lambda: _figure_json(px.line(trend, x='date', y='revenue', markers=True)))
+    for metric in ["Revenue", "Conversions", "ROAS"]:
+        channel_perf = rec.measure(page, f'channel {metric.lower()}', queries.channel_metric, source, metric)
+    rec.measure(page, 'channel figure', lambda: _figure_json(
+        px.bar(x=channel_perf.values, y=channel_perf.index, color=channel_perf.values, orientation='h')))
+
+    # Page 2: Campaign Analytics
+    page = PAGES[1]
+    years = rec.measure(page, 'year options', queries.distinct_values, source, 'campaign_performance', 'year')
+    regional = rec.measure(page, 'regional quarterly', queries.regional_quarterly, source, years[-1])
+    rec.measure(page, 'regional figure', lambda: _figure_json(
+        px.bar(regional, x='quarter', y='revenue', color='region', barmode='group')))
+    stacked = rec.measure(page, 'campaign type spend', queries.campaign_type_spend, source)
+    rec.measure(page, 'stacked figure', lambda: _figure_json(
+        px.bar(stacked, x='month', y='spend', color='campaign_type', barmode='stack')))
+    regions = queries.distinct_values(source, 'campaign_performance', 'region')[:2]
+    cumulative = rec.measure(page, 'cumulative conversions', queries.cumulative_conversions, source, regions)
+    cumulative = rec.measure(page, 'decimate cumulative', decimate, cumulative, 'date',
+                             'cumulative_conversions', by='channel')
+    rec.measure(page, 'cumulative figure', lambda: _figure_json(
+        px.area(cumulative, x='date', y='cumulative_conversions', color='channel')))
+
+    # Page 3: Customer Insights
+    page = PAGES[2]
+    customers = tables['customer_data']
+    age = rec.measure(page, 'age fine histogram', fine_histogram, customers['age'], 1)
+    rec.measure(page, 'age rebin', rebin, age, width=5)
+    box, outliers = rec.measure(page, 'ltv box stats', box_stats, customers, 'lifetime_value', by='customer_segment')
+    rec.measure(page, 'ltv box figure', lambda: _figure_json(go.Figure(go.Box(
+        x=box.index.astype(str), q1=box['q1'], median=box['median'], q3=box['q3'],
+        lowerfence=box['lower_fence'], upperfence=box['upper_fence']))))
+    rec.measure(page, 'income/ltv density', density_bins, customers, 'income', 'lifetime_value', by='customer_segment')
+    rec.measure(page, 'income/ltv trend fit', lambda: ols_from_stats(
+        regression_stats(customers, 'income', 'lifetime_value', by='customer_segment')))
+    satisfaction = rec.measure(page, 'satisfaction fine histogram', fine_histogram, customers['satisfaction_score'], 0.01)
+    rec.measure(page, 'satisfaction rebin', rebin, satisfaction, bins=20)
+
+    # Page 4: Product Performance
+    page = PAGES[3]
+    cells = rec.measure(page, 'product cells query', queries.product_cells, source,
+                        source.columns('product_sales'))
+    rollup = rec.measure(page, 'build product rollup', build_rollup, cells)
+    regions = list(rollup.regions[:2])
+    nodes = rec.measure(page, 'hierarchy nodes', hierarchy_frame, rollup, 'sales')
+    rec.measure(page, 'treemap figure', lambda: _figure_json(go.Figure(go.Treemap(
+        ids=nodes['id'], labels=nodes['label'], parents=nodes['parent'], values=nodes['sales'],
+        branchvalues='total', marker=dict(colors=nodes['return_rate'])))))
+    top = rec.measure(page, 'top 15 products', top_k, rollup, 15)
+    rec.measure(page, 'top 15 products filtered', top_k, rollup, 15, 'profit',
+                filters={'region': regions, 'quarter': list(rollup.quarters[-4:])})
+    rec.measure(page, 'top products figure', lambda: _figure_json(
+        px.bar(top, x='sales', y='product_name', color='category', orientation='h')))
+    categories = rec.measure(page, 'category performance', lambda: rollup_frame(
+        rollup, 0, level_totals(rollup, 0, {'region': regions})))
+    rec.measure(page, 'category figures', lambda: _figure_json(px.bar(categories, x='category', y='sales'))
+                + _figure_json(px.bar(categories, x='category', y='profit')))
+
+    # Page 5: Geographic Analysis
+    page = PAGES[4]
+    geo = tables['geographic']
+    rec.measure(page, 'state bar figure', lambda: _figure_json(
+        px.bar(geo.sort_values(geo.columns[4]), x=geo.columns[4], y='state', orientation='h')))
+    GEOMETRY_CACHE.unlink(missing_ok=True)
+    geometry = rec.measure(page, 'state geometry (simplify + cache)', load_geometry)
+    if geometry is not None:
+        def warm():
+            cached = load_geometry()
+            if cached.names != geometry.names or not all(np.array_equal(a, b) for built, read in zip(
+                    geometry.levels, cached.levels) for a, b in zip(built, read)):
+                raise RuntimeError("cached state geometry differs from the built one")
+            return cached
+        rec.measure(page, 'state geometry (cached)', warm)
+        level = level_for_zoom(geometry, zoom_for_bounds(view_bounds(geometry, geo['state'])))
+        shapes = rec.measure(page, 'state geojson', level_geojson, geometry, level)
+        rec.measure(page, 'choropleth figure', lambda: _figure_json(go.Figure(go.Choropleth(
+            geojson=shapes, locations=geo['state'], z=geo[geo.columns[4]]))))
+
+    # Page 6: Attribution & Funnel
+    page = PAGES[5]
+    partials = rec.measure(page, 'sessionize funnel events', funnel_partials, tables['funnel_events'])
+    rec.measure(page, 'funnel counts per window', lambda: [funnel_counts(partials, window)
+                                                           for window in CONVERSION_WINDOWS.values()])
+    funnel = rec.measure(page, 'funnel counts by channel', funnel_counts, partials, CONVERSION_WINDOWS['7 days'], 'channel')
+    rec.measure(page, 'funnel figure', lambda: _figure_json(go.Figure([
+        go.Funnel(name=str(group), y=rows['stage'], x=rows['visitors'])
+        for group, rows in funnel.groupby('channel', observed=True)])))
+    paths = rec.measure(page, 'encode journey paths', journey_paths, tables['customer_journey'])
+    chain = rec.measure(page, 'markov transition matrix', markov_chain, paths)
+    rec.measure(page, 'markov removal effects', removal_effects, chain)
+    attribution = rec.measure(page, 'attribution models', attribution_table, paths)
+    rec.measure(page, 'attribution figure', lambda: _figure_json(go.Figure(go.Pie(
+        labels=attribution['channel'], values=attribution['linear'], hole=0.3))))
+    campaigns = tables['campaign_performance']
+    split = len(campaigns) * 9 // 10
+    moments = rec.measure(page, 'build metric moments', build_moments, campaigns.iloc[:split])
+    moments = rec.measure(page, 'fold metric moments (10% append)', fold_moments, moments, campaigns.iloc[split:])
+    moments_index = rec.measure(page, 'index metric moments', build_index, 'campaign_moments', moments.keys)
+    rec.measure(page, 'correlation all rows', correlation_frame, moments)
+    corr = rec.measure(page, 'correlation filtered', lambda: correlation_frame(
+        moments, moments_index.select(selection['campaign_performance'])[0]))
+    rec.measure(page, 'correlation figure', lambda: _figure_json(go.Figure(go.Heatmap(
+        z=corr.values, text=corr.values.round(2), texttemplate='%{text}'))))
+
+    # Page 7: ML Model Evaluation
+    page = PAGES[6]
+    leads = tables['lead_scoring']
+    curve = rec.measure(page, 'score curve (sort + cumsum)', score_curve, leads['actual_converted'],
+                        leads['predicted_probability'])
+    rec.measure(page, 'metrics at 101 thresholds', lambda: [metrics_at(curve, t) for t in np.linspace(0, 1, 101)])
+    rec.measure(page, 'auc', roc_auc, curve)
+    resamples = rec.measure(page, 'bootstrap resamples (1000)', bootstrap_resamples, leads['actual_converted'],
+                            leads['predicted_probability'])
+    rec.measure(page, 'intervals at 101 thresholds',
+                lambda: [resample_intervals(resamples, t) for t in np.linspace(0, 1, 101)])
+    roc = rec.measure(page, 'decimate roc', lambda: decimate(roc_points(curve), 'fpr', 'tpr'))
+    rec.measure(page, 'roc figure', lambda: _figure_json(go.Figure(go.Scatter(x=roc['fpr'], y=roc['tpr'], mode='lines'))))
+    pr = rec.measure(page, 'decimate pr', lambda: decimate(pr_points(curve), 'recall', 'precision'))
+    rec.measure(page, 'pr figure', lambda: _figure_json(
+        go.Figure(go.Scatter(x=pr['recall'], y=pr['precision'], mode='lines'))))
+
+
+def run_pages(rec):
+    """Render every page end to end in Streamlit's headless test runner"""
+    from streamlit.testing.v1 import AppTest
+
+    for page in PAGES:
+        def render():
+            at = AppTest.from_file(str(SCRIPT_DIR / 'app.py'), default_timeout=3600)
+            at.run()
+            at.sidebar.radio[0].set_value(page)
+            at.run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].value)
+            return at
+        rec.measure('pages', page, render)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(scale, data_dir, output, pages=True):
+    """Run all steps against data_dir; must run in a fresh process with NOVAMART_DATA_DIR set"""
+    from profiling import METRICS_LOG
+
+    rec = Recorder()
+    print(f"Scale {scale}x from {data_dir}")
+    run_steps(rec)
+    if pages:
+        METRICS_LOG.unlink(missing_ok=True)
+        run_pages(rec)
+
+    rows = {name: sum(1 for _ in open(Path(data_dir) / name)) - 1 for name in SCALED_TABLES}
+    report = {
+        'commit': _git_commit(),
+        'timestamp': pd.Timestamp.now().isoformat(),
+        'scale': scale,
+        'rows': rows,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'memory_metric': 'rss_delta' if rec.use_rss else 'tracemalloc',
+        'steps': rec.results,
+        # Per-section breakdown the app's own profiler logged during the page runs
+        'sections': ([json.loads(line) for line in open(METRICS_LOG)]
+                     if pages and METRICS_LOG.exists() else [])
+    }
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {output}")
+
+
+# ============================================================================
+# COMPARISON
+# ============================================================================
+
+def compare(old_path, new_path, threshold=0.10):
+    """Print per-step latency/memory changes between two result files; returns regression count"""
+    with open(old_path) as fh:
+        old = {(r['group'], r['step']): r for r in json.load(fh)['steps']}
+    with open(new_path) as fh:
+        new = json.load(fh)['steps']
+
+    regressions = 0
+    print(f"{'group':22s} {'step':34s} {'old ms':>10s} {'new ms':>10s} {'change':>8s} {'peak MB':>9s}")
+    for record in new:
+        before = old.get((record['group'], record['step']))
+        if before is None:
+            continue
+        change = (record['seconds'] - before['seconds']) / before['seconds'] if before['seconds'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{record['group']:22s} {record['step']:34s} {before['seconds'] * 1000:10.1f} "
+              f"{record['seconds'] * 1000:10.1f} {change:+8.0%} {record['peak_mb']:9.1f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NovaMart dashboard benchmark")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help="write a synthetic dataset")
+    gen.add_argument('--scale', type=int, default=1)
+    gen.add_argument('--out', type=Path)
+
+    run = sub.add_parser('run', help="generate (if needed) and benchmark one or more scales")
+    run.add_argument('--scales', type=int, nargs='+', default=[1])
+    run.add_argument('--no-pages', action='store_true', help="skip the end-to-end page renders")
+    run.add_argument('--output-dir', type=Path, default=RESULTS_DIR)
+
+    cmp_parser = sub.add_parser('compare', help="compare two result files")
+    cmp_parser.add_argument('old')
+    cmp_parser.add_argument('new')
+    cmp_parser.add_argument('--threshold', type=float, default=0.10)
+
+    meas = sub.add_parser('measure', help=argparse.SUPPRESS)
+    meas.add_argument('--scale', type=int, required=True)
+    meas.add_argument('--output', type=Path, required=True)
+    meas.add_argument('--no-pages', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        out = generate(args.scale, args.out or BENCH_DATA_DIR / f"{args.scale}x")
+        print(f"Wrote {args.scale}x dataset to {out}")
+    elif args.command == 'run':
+        for scale in args.scales:
+            data_dir = BENCH_DATA_DIR / f"{scale}x"
+            # Regenerate datasets written before a bundled or generated file was added
+            missing = [name for name in [*_samples(), BOUNDARY_SAMPLE] if not (data_dir / name).exists()]
+            if missing or not (data_dir / 'SCALE').exists():
+                print(f"Generating {scale}x dataset...")
+                generate(scale, data_dir)
+            output = args.output_dir / f"{_git_commit() or 'worktree'}-{scale}x.json"
+            # A fresh process per scale keeps peak-memory figures independent
+            command = [sys.executable, str(Path(__file__).absolute()), 'measure',
+                       '--scale', str(scale), '--output', str(output)]
+            if args.no_pages:
+                command.append('--no-pages')
+            subprocess.run(command, check=True, env={**os.environ, 'NOVAMART_DATA_DIR': str(data_dir),
+                                                     'NOVAMART_METRICS_LOG': str(data_dir / 'sections.jsonl'),
+                                                     'NOVAMART_PROFILE': '1'})
+    elif args.command == 'compare':
+        sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
+    elif args.command == 'measure':
+        # Steps clear the data directory's snapshots and the metrics log, so never run against the app's own
+        bench_root, data_dir = BENCH_DATA_DIR.resolve(), Path(os.environ.get('NOVAMART_DATA_DIR', '')).resolve()
+        if 'NOVAMART_DATA_DIR' not in os.environ or data_dir == bench_root or not data_dir.is_relative_to(bench_root):
+            parser.error(f"measure needs NOVAMART_DATA_DIR set to a dataset under {BENCH_DATA_DIR}; use 'run'")
+        os.environ.setdefault('NOVAMART_METRICS_LOG', str(data_dir / 'sections.jsonl'))
+        measure(args.scale, data_dir, args.output, pages=not args.no_pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Campaign Rollup Cube - NovaMart
+Pre-aggregates campaign_performance at day x channel x region x campaign_type
+grain so the overview and campaign charts roll up a small cube instead of
+regrouping every raw row on each rerun (see queries.py for the rollups)
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_cache import concat_frames
+
+CUBE_DIMENSIONS = ['date', 'channel', 'region', 'campaign_type']
+CUBE_MEASURES = ['impressions', 'clicks', 'conversions', 'spend', 'revenue']
+
+
+# ============================================================================
+# CUBE CONSTRUCTION
+# ============================================================================
+
+def build_cube(df_campaign):
+    """
+    Aggregate raw campaign rows to the cube grain.
+    ROAS is carried as a sum and a non-null count so its row-level mean can
+    be rolled up exactly; quarter/year/month labels are derived once here.
+    """
+    dims = [col for col in CUBE_DIMENSIONS if col in df_campaign.columns]
+    measures = [col for col in CUBE_MEASURES if col in df_campaign.columns]
+
+    df = df_campaign.dropna(subset=['date']) if 'date' in dims else df_campaign
+    agg = {col: (col, 'sum') for col in measures}
+    if 'roas' in df.columns:
+        agg['roas_sum'] = ('roas', 'sum')
+        agg['roas_count'] = ('roas', 'count')
+
+    cube = df.groupby(dims, observed=True).agg(**agg).reset_index()
+    return add_period_labels(cube)
+
+
+def add_period_labels(cube):
+    """
+    Attach the year/quarter/month labels used by the campaign charts.
+    Labels are formatted once per distinct date and mapped back through the
+    date codes, and kept as categoricals, so their cost and size scale with
+    the number of days rather than rows.
+    """
+    if 'date' in cube.columns:
+        date_codes, dates = pd.factorize(cube['date'])
+        dates = pd.DatetimeIndex(dates)
+        cube['year'] = cube['date'].dt.year
+        cube['quarter'] = _label_dates(date_codes, dates.to_period('Q').astype(str))
+        cube['month'] = _label_dates(date_codes, dates.to_period('M').astype(str))
+    return cube
+
+
+def _label_dates(date_codes, date_labels):
+    """Categorical of per-distinct-date labels for rows given by their date codes (-1 = missing)"""
+    label_codes, labels = pd.factorize(date_labels, sort=True)
+    row_codes = np.where(date_codes >= 0, label_codes[date_codes], -1)
+    return pd.Categorical.from_codes(row_codes, labels)
+
+
+def append_to_cube(cube, df_tail):
+    """
+    Fold newly appended raw rows into an existing cube.
+    Appends land at the end of the timeline, so only cube rows on or after
+    the tail's first date are re-aggregated; earlier history is reused as is.
+    """
+    tail_cube = build_cube(df_tail)
+    if tail_cube.empty:
+        return cube
+    if cube.empty:
+        return tail_cube
+
+    if not cube['date'].is_monotonic_increasing:
+        cube = cube.sort_values('date', kind='stable')
+    split = cube['date'].searchsorted(tail_cube['date'].min())
+    history, overlap = cube.iloc[:split], cube.iloc[split:]
+
+    dims = [col for col in CUBE_DIMENSIONS if col in tail_cube.columns]
+    sums = [col for col in tail_cube.columns if col not in dims + ['year', 'quarter', 'month']]
+    merged = concat_frames(overlap[dims + sums], tail_cube[dims + sums])
+    merged = merged.groupby(dims, observed=True)[sums].sum().reset_index()
+    return concat_frames(history, add_period_labels(merged))
@@ -0,0 +1,142 @@
+"""
+Campaign Metric Moments - NovaMart
+Mergeable covariance accumulators over the campaign metrics, kept per
+day x region x channel partition: a row count, the means and the co-moment
+matrix about them. Accumulators combine with Chan's parallel update, so
+appended rows, CSV chunks or results from other workers fold in without a
+rescan, and the correlation of any global filter slice merges only the
+partitions it selects.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from data_cache import concat_frames
+
+CORRELATION_METRICS = ['spend', 'impressions', 'clicks', 'ctr', 'conversions', 'revenue', 'roas', 'cpc', 'cpa']
+
+METRIC_LABELS = {
+    'spend': 'Spend', 'impressions': 'Impressions', 'clicks': 'Clicks', 'ctr': 'CTR',
+    'conversions': 'Conversions', 'revenue': 'Revenue', 'roas': 'ROAS', 'cpc': 'CPC', 'cpa': 'CPA'
+}
+
+# Partition grain: the dimensions of the global sidebar filters
+MOMENT_DIMENSIONS = ['date', 'region', 'channel']
+
+# keys: one row per partition with its MOMENT_DIMENSIONS values; count (P,),
+# mean (P, k) and m2 (P, k, k), the sums of co-deviations about the mean,
+# over the rows whose metrics are all finite
+Moments = namedtuple('Moments', ['keys', 'count', 'mean', 'm2', 'metrics'])
+
+
+# ============================================================================
+# ACCUMULATORS
+# ============================================================================
+
+def merge_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """
+    Chan et al.'s pairwise update of (count, mean, m2), elementwise over any
+    leading partition axes; an empty side leaves the other unchanged
+    """
+    count = count_a + count_b
+    share = np.divide(count_b, count, out=np.zeros(np.shape(count)), where=count > 0)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * share[..., None]
+    m2 = m2_a + m2_b + delta[..., :, None] * delta[..., None, :] * (count_a * share)[..., None, None]
+    return count, mean, m2
+
+
+def group_moments(values, codes, n_groups):
+    """
+    (count, mean, m2) of the rows of `values` per group code in one batch:
+    group sums by bincount, then the co-moments of the deviations from each
+    group's mean, so large magnitudes do not cancel
+    """
+    k = values.shape[1]
+    count = np.bincount(codes, minlength=n_groups).astype(np.float64)
+    sums = np.column_stack([np.bincount(codes, weights=values[:, i], minlength=n_groups) for i in range(k)])
+    mean = sums / np.maximum(count, 1)[:, None]
+    centered = values - mean[codes]
+
+    m2 = np.empty((n_groups, k, k))
+    for i in range(k):
+        for j in range(i, k):
+            m2[:, i, j] = m2[:, j, i] = np.bincount(codes, weights=centered[:, i] * centered[:, j],
+                                                    minlength=n_groups)
+    return count, mean, m2
+
+
+def combine_moments(count, mean, m2):
+    """Merge every partition into one (count, mean, m2): the multi-way form of merge_moments"""
+    total = count.sum()
+    if total == 0:
+        return 0.0, np.zeros(mean.shape[1]), np.zeros(m2.shape[1:])
+    grand = (count[:, None] * mean).sum(axis=0) / total
+    delta = mean - grand
+    return total, grand, m2.sum(axis=0) + np.einsum('p,pi,pj->ij', count, delta, delta)
+
+
+# ============================================================================
+# CAMPAIGN PARTITIONS
+# ============================================================================
+
+def _partitions(frame, dims):
+    """(partition code per row, one row of dimension values per partition)"""
+    if not dims:
+        return np.zeros(len(frame), dtype=np.int64), pd.DataFrame(index=pd.RangeIndex(1 if len(frame) else 0))
+    grouped = frame.groupby(dims, observed=True, sort=True, dropna=False)
+    return grouped.ngroup().to_numpy(np.int64), grouped.size().index.to_frame(index=False)
+
+
+def build_moments(df_campaign):
+    """Per-partition accumulators from raw campaign rows; rows with a missing or infinite metric are skipped"""
+    metrics = [col for col in CORRELATION_METRICS if col in df_campaign.columns]
+    dims = [col for col in MOMENT_DIMENSIONS if col in df_campaign.columns]
+    values = df_campaign[metrics].to_numpy(np.float64, na_value=np.nan)
+    valid = np.isfinite(values).all(axis=1)
+
+    codes, keys = _partitions(df_campaign.loc[valid, dims], dims)
+    count, mean, m2 = group_moments(values[valid], codes, len(keys))
+    return Moments(keys, count, mean, m2, metrics)
+
+
+def fold_moments(moments, df_tail):
+    """
+    Fold newly appended raw rows into existing accumulators. Only the tail is
+    scanned; its partitions are merged into the matching ones by Chan's update.
+    """
+    tail = build_moments(df_tail)
+    if not len(tail.keys):
+        return moments
+    if not len(moments.keys):
+        return tail
+
+    dims = list(moments.keys.columns)
+    codes, keys = _partitions(concat_frames(moments.keys, tail.keys[dims]), dims)
+    n_old, k = len(moments.keys), len(moments.metrics)
+    count, mean, m2 = np.zeros(len(keys)), np.zeros((len(keys), k)), np.zeros((len(keys), k, k))
+    old, new = codes[:n_old], codes[n_old:]
+    count[old], mean[old], m2[old] = moments.count, moments.mean, moments.m2
+    count[new], mean[new], m2[new] = merge_moments(count[new], mean[new], m2[new], tail.count, tail.mean, tail.m2)
+    return Moments(keys, count, mean, m2, moments.metrics)
+
+
+def correlation_frame(moments, rows=None):
+    """
+    Pearson correlation matrix of the campaign metrics over the partitions
+    at `rows` (all when None), labelled for display. Metrics without
+    variance in the slice correlate as NaN.
+    """
+    count, mean, m2 = moments.count, moments.mean, moments.m2
+    if rows is not None:
+        count, mean, m2 = count[rows], mean[rows], m2[rows]
+    _, _, m2 = combine_moments(count, mean, m2)
+
+    scale = np.sqrt(np.diag(m2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = m2 / np.outer(scale, scale)
+    corr[(scale == 0)[:, None] | (scale == 0)[None, :]] = np.nan
+    labels = [METRIC_LABELS.get(metric, metric) for metric in moments.metrics]
+    return pd.DataFrame(corr, index=labels, columns=labels)
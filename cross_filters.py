@@ -0,0 +1,180 @@
+"""
+Cross Filters - NovaMart
+Global sidebar filters (date range, region, channel, segment) answered from
+row indexes built once per table version: a packed bitmap per distinct value
+of each label column and a sorted index for date ranges, so combining filters
+is a bitwise AND instead of a comparison over every row
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from data_sources import Range
+
+# Which column of each table a global filter dimension applies to. Campaign
+# channels and customer acquisition channels use different labels, so the
+# channel filter only applies to campaigns and the funnel events that share
+# their labels; product sales are recorded per quarter, so the date range
+# selects the quarters it overlaps. Funnel events are filtered through their
+# per-day partial counts (see funnel.funnel_partials), by entry date.
+FILTER_COLUMNS = {
+    'campaign_performance': {'date': 'date', 'region': 'region', 'channel': 'channel'},
+    'funnel_events': {'date': 'date', 'region': 'region', 'channel': 'channel'},
+    'customer_data': {'region': 'region', 'segment': 'customer_segment'},
+    'product_sales': {'date': 'quarter', 'region': 'region'},
+    'geographic': {'region': 'region'}
+}
+
+# Columns indexed per table: (label columns with value bitmaps, columns with a
+# sorted range index). Campaign queries read the rollup cube, so that is what
+# gets indexed; page-level filters (year, region) use the same bitmaps. The
+# campaign metric accumulators are indexed by their partition keys.
+INDEX_COLUMNS = {
+    'campaign_performance': (['region', 'channel', 'campaign_type', 'year'], ['date']),
+    'campaign_moments': (['region', 'channel'], ['date']),
+    'customer_data': (['region', 'customer_segment'], []),
+    'product_sales': (['region', 'category', 'quarter'], []),
+    'geographic': (['region'], [])
+}
+
+# Global filter values; None (or an empty list) means no restriction
+FilterSelection = namedtuple('FilterSelection', ['date', 'region', 'channel', 'segment'])
+
+NO_FILTERS = FilterSelection(None, None, None, None)
+
+
+def quarter_labels(start, end):
+    """'Q1 2023'-style labels of every quarter overlapping [start, end]"""
+    return [f"Q{period.quarter} {period.year}" for period in pd.period_range(start, end, freq='Q')]
+
+
+def table_filters(selection, columns=FILTER_COLUMNS):
+    """
+    Query filters for each table from a global FilterSelection:
+    {table: {column: value}}, tables without an active filter left out
+    """
+    filters = {}
+    for table, dimensions in columns.items():
+        table_filter = {}
+        for dimension, col in dimensions.items():
+            value = getattr(selection, dimension)
+            if not value:
+                continue
+            if dimension == 'date':
+                start, end = pd.Timestamp(value[0]), pd.Timestamp(value[1])
+                table_filter[col] = Range(start, end) if col == 'date' else quarter_labels(start, end)
+            else:
+                table_filter[col] = list(value)
+        if table_filter:
+            filters[table] = table_filter
+    return filters
+
+
+# ============================================================================
+# ROW INDEX
+# ============================================================================
+
+class BitmapIndex:
+    """
+    Row index over one immutable frame.
+    Each label column gets one packed bitmap (a bit per row) per distinct
+    value; each range column keeps its non-null values in sorted order with
+    the matching row ids, so a range is two binary searches. apply() ANDs the
+    bitmaps of every filter it covers and takes the surviving rows once.
+    A filter admitting every row costs nothing and leaves the frame as is.
+    """
+
+    def __init__(self, frame, labels=(), ranges=()):
+        self.frame = frame
+        self.n_rows = len(frame)
+        self.bitmaps = {}
+        self.sorted = {}
+
+        for col in labels:
+            if col not in frame.columns:
+                continue
+            codes, uniques = pd.factorize(frame[col])
+            self.bitmaps[col] = {value: np.packbits(codes == code) for code, value in enumerate(uniques)}
+
+        for col in ranges:
+            if col not in frame.columns:
+                continue
+            values = frame[col]
+            valid = values.notna().to_numpy()
+            if valid.all() and values.is_monotonic_increasing:
+                # Already in order (the cube is built date-first): ranges are row slices
+                self.sorted[col] = (pd.Index(values), None)
+            else:
+                row_ids = np.flatnonzero(valid)
+                order = row_ids[np.argsort(values.to_numpy()[valid], kind='stable')]
+                self.sorted[col] = (pd.Index(values.to_numpy()[order]), order)
+
+    @property
+    def nbytes(self):
+        """Memory held by the bitmaps and sorted indexes"""
+        size = sum(bitmap.nbytes for bitmaps in self.bitmaps.values() for bitmap in bitmaps.values())
+        for keys, order in self.sorted.values():
+            size += keys.nbytes + (order.nbytes if order is not None else 0)
+        return size
+
+    def covers(self, col, value):
+        return col in self.sorted if isinstance(value, Range) else col in self.bitmaps
+
+    def bitmap(self, col, value):
+        """Packed bitmap of rows passing one filter, or None if every row does"""
+        if isinstance(value, Range):
+            return self._range_bitmap(col, value)
+
+        bitmaps = self.bitmaps[col]
+        values = set(value) if isinstance(value, (list, tuple, set, pd.Index)) else {value}
+        if values.issuperset(bitmaps):
+            return None
+        selected = [bitmaps[v] for v in values if v in bitmaps]
+        if not selected:
+            return np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        return np.bitwise_or.reduce(selected)
+
+    def _range_bitmap(self, col, value):
+        keys, order = self.sorted[col]
+        lo = 0 if value.start is None else keys.searchsorted(value.start, side='left')
+        hi = len(keys) if value.end is None else keys.searchsorted(value.end, side='right')
+        if lo == 0 and hi == len(keys) == self.n_rows:
+            return None
+
+        rows = np.zeros(self.n_rows, dtype=bool)
+        if order is None:
+            rows[lo:hi] = True
+        else:
+            rows[order[lo:hi]] = True
+        return np.packbits(rows)
+
+    def select(self, filters):
+        """(row ids passing every covered filter or None for all rows, filters left uncovered)"""
+        bitmaps, rest = [], {}
+        for col, value in filters.items():
+            if not self.covers(col, value):
+                rest[col] = value
+                continue
+            bitmap = self.bitmap(col, value)
+            if bitmap is not None:
+                bitmaps.append(bitmap)
+
+        if not bitmaps:
+            return None, rest
+        combined = bitmaps[0] if len(bitmaps) == 1 else np.bitwise_and.reduce(bitmaps)
+        return np.flatnonzero(np.unpackbits(combined, count=self.n_rows)), rest
+
+    def apply(self, filters):
+        """(frame restricted to the rows the covered filters allow, filters left uncovered)"""
+        rows, rest = self.select(filters)
+        if rows is None:
+            return self.frame, rest
+        return self.frame.take(rows), rest
+
+
+def build_index(key, frame, columns=INDEX_COLUMNS):
+    """BitmapIndex over a table's frame with the columns configured for it"""
+    labels, ranges = columns.get(key, ([], []))
+    return BitmapIndex(frame, labels, ranges)
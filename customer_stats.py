@@ -0,0 +1,174 @@
+"""
+Customer Statistics - NovaMart
+Server-side summaries of customer_data for charts that would otherwise ship
+every customer row to the browser
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+def _group_codes(df, by):
+    """Integer code per row and the matching group labels (a single group if `by` is None)"""
+    if by is None:
+        return np.zeros(len(df), dtype=np.int64), ['All']
+    codes, labels = pd.factorize(df[by], sort=True)
+    return codes.astype(np.int64), list(labels)
+
+
+# ============================================================================
+# TRENDLINES FROM SUFFICIENT STATISTICS
+# ============================================================================
+
+def regression_stats(df, x, y, by=None):
+    """
+    Per-group sufficient statistics for a simple linear fit: n, sums of x, y,
+    x^2, xy and y^2 plus the x extent. Rows from different chunks or workers
+    can be combined by adding the sums.
+    """
+    df = df[[x, y] + ([by] if by else [])].dropna()
+    xs, ys = df[x].to_numpy(np.float64), df[y].to_numpy(np.float64)
+    codes, labels = _group_codes(df, by)
+    size = len(labels)
+
+    stats = pd.DataFrame({
+        'n': np.bincount(codes, minlength=size),
+        'sum_x': np.bincount(codes, xs, minlength=size),
+        'sum_y': np.bincount(codes, ys, minlength=size),
+        'sum_xx': np.bincount(codes, xs * xs, minlength=size),
+        'sum_xy': np.bincount(codes, xs * ys, minlength=size),
+        'sum_yy': np.bincount(codes, ys * ys, minlength=size)
+    }, index=pd.Index(labels, name=by or 'group'))
+    if len(xs):
+        stats['x_min'] = pd.Series(xs).groupby(codes).min().reindex(range(size)).to_numpy()
+        stats['x_max'] = pd.Series(xs).groupby(codes).max().reindex(range(size)).to_numpy()
+    return stats
+
+
+def ols_from_stats(stats):
+    """Closed-form least-squares slope, intercept and R^2 for each row of regression_stats()"""
+    n = stats['n'].astype(np.float64)
+    cov_xy = stats['sum_xy'] - stats['sum_x'] * stats['sum_y'] / n
+    var_x = stats['sum_xx'] - stats['sum_x'] ** 2 / n
+    var_y = stats['sum_yy'] - stats['sum_y'] ** 2 / n
+
+    fit = pd.DataFrame(index=stats.index)
+    fit['slope'] = cov_xy / var_x
+    fit['intercept'] = (stats['sum_y'] - fit['slope'] * stats['sum_x']) / n
+    fit['r2'] = cov_xy ** 2 / (var_x * var_y)
+    fit['n'] = stats['n']
+    fit['x_min'] = stats.get('x_min')
+    fit['x_max'] = stats.get('x_max')
+    return fit[stats['n'] > 1]
+
+
+# ============================================================================
+# 2D DENSITY BINNING
+# ============================================================================
+
+def density_bins(df, x, y, by=None, bins=80, x_range=None, y_range=None):
+    """
+    2D histogram counts per group in one vectorized pass.
+    Returns (x_edges, y_edges, {group: counts}) where counts[i, j] is the
+    number of rows in x bin i and y bin j. Rows outside the ranges (default:
+    the data extent) are dropped, which is how a zoomed window is re-binned.
+    """
+    xs, ys = df[x].to_numpy(np.float64), df[y].to_numpy(np.float64)
+    x_range = x_range or (np.nanmin(xs), np.nanmax(xs))
+    y_range = y_range or (np.nanmin(ys), np.nanmax(ys))
+    x_edges = np.linspace(x_range[0], x_range[1], bins + 1)
+    y_edges = np.linspace(y_range[0], y_range[1], bins + 1)
+
+    codes, labels = _group_codes(df, by)
+    inside = ((xs >= x_range[0]) & (xs <= x_range[1]) & (ys >= y_range[0]) & (ys <= y_range[1]))
+    ix = np.clip(((xs[inside] - x_range[0]) / max(x_range[1] - x_range[0], 1e-12) * bins).astype(np.int64), 0, bins - 1)
+    iy = np.clip(((ys[inside] - y_range[0]) / max(y_range[1] - y_range[0], 1e-12) * bins).astype(np.int64), 0, bins - 1)
+
+    flat = (codes[inside] * bins + ix) * bins + iy
+    counts = np.bincount(flat, minlength=len(labels) * bins * bins).reshape(len(labels), bins, bins)
+    return x_edges, y_edges, dict(zip(labels, counts))
+
+
+def sample_window(df, x, y, x_range, y_range, n, seed=0):
+    """Up to n random rows inside an x/y window, for hover points on a zoomed view"""
+    inside = df[df[x].between(*x_range) & df[y].between(*y_range)]
+    if len(inside) <= n:
+        return inside
+    return inside.sample(n, random_state=seed)
+
+
+# ============================================================================
+# BOX PLOT STATISTICS
+# ============================================================================
+
+def box_stats(df, value, by=None, max_outliers=200, seed=0):
+    """
+    Per-group box plot statistics: quartiles, Tukey whiskers (furthest data
+    within 1.5 IQR of the box) and a capped sample of the outliers beyond
+    them. The group's min and max are always part of the sample.
+    Returns (stats, outliers) frames.
+    """
+    df = df[[value] + ([by] if by else [])].dropna()
+    group_key = df[by] if by else pd.Series('All', index=df.index)
+    grouped = df[value].groupby(group_key, observed=True)
+
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    iqr = stats['q3'] - stats['q1']
+    low_limit = (stats['q1'] - 1.5 * iqr).reindex(group_key).to_numpy()
+    high_limit = (stats['q3'] + 1.5 * iqr).reindex(group_key).to_numpy()
+
+    values = df[value].to_numpy()
+    inside = (values >= low_limit) & (values <= high_limit)
+    within = pd.Series(values[inside]).groupby(group_key.to_numpy()[inside])
+    stats['lower_fence'] = within.min()
+    stats['upper_fence'] = within.max()
+    stats['n'] = grouped.size()
+
+    outliers = pd.DataFrame({'group': group_key.to_numpy()[~inside], value: values[~inside]})
+    sampled = []
+    for group, rows in outliers.groupby('group', observed=True):
+        if len(rows) > max_outliers:
+            extremes = rows.loc[[rows[value].idxmin(), rows[value].idxmax()]] if max_outliers >= 2 else rows.iloc[:0]
+            rest = rows.drop(extremes.index).sample(max_outliers - len(extremes), random_state=seed)
+            rows = pd.concat([extremes, rest])
+        sampled.append(rows)
+    outliers = pd.concat(sampled) if sampled else outliers
+    return stats, outliers.rename(columns={'group': by or 'group'})
+
+
+# ============================================================================
+# REBINNABLE HISTOGRAMS
+# ============================================================================
+
+# Counts at a fine resolution; any coarser bin width that is a multiple of
+# `resolution` is an O(bins) re-aggregation of these counts
+FineHistogram = namedtuple('FineHistogram', ['start', 'resolution', 'counts'])
+
+
+def fine_histogram(values, resolution):
+    """Counts of values on a grid of width `resolution` starting at floor(min)"""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return FineHistogram(0.0, resolution, np.zeros(0, dtype=np.int64))
+    start = np.floor(values.min() / resolution) * resolution
+    index = np.floor((values - start) / resolution + 1e-9).astype(np.int64)
+    return FineHistogram(start, resolution, np.bincount(index))
+
+
+def rebin(hist, width=None, bins=None):
+    """
+    Re-aggregate a FineHistogram to a bin width (rounded to a whole number of
+    fine bins) or to roughly `bins` bins. Returns (left edges, width, counts).
+    """
+    n_fine = len(hist.counts)
+    if bins is not None:
+        step = max(1, -(-n_fine // bins))
+    else:
+        step = max(1, int(round(width / hist.resolution)))
+    starts = np.arange(0, n_fine, step)
+    counts = np.add.reduceat(hist.counts, starts) if n_fine else hist.counts
+    return hist.start + starts * hist.resolution, step * hist.resolution, counts
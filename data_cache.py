@@ -0,0 +1,484 @@
+"""
+Columnar Snapshot Cache - NovaMart
+Parses each CSV export once with an explicit schema and persists it as an
+Arrow IPC snapshot that later loads memory-map instead of re-parsing text
+"""
+
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# CSVs live next to the app unless NOVAMART_DATA_DIR points elsewhere
+DATA_DIR = Path(os.environ.get('NOVAMART_DATA_DIR', Path(__file__).parent)).absolute()
+SNAPSHOT_DIR = DATA_DIR / '.snapshots'
+
+# Bump whenever TABLE_SCHEMAS, COMPACT_SCHEMAS or DERIVED_COLUMNS changes so existing snapshots are rebuilt
+SCHEMA_VERSION = 5
+
+# Compact mode narrows tables further (see COMPACT_SCHEMAS); NOVAMART_COMPACT=0 turns it off
+COMPACT_MODE = os.environ.get('NOVAMART_COMPACT', '1') == '1'
+
+TABLE_FILES = {
+    'campaign_performance': 'campaign_performance.csv',
+    'customer_data': 'customer_data.csv',
+    'product_sales': 'product_sales.csv',
+    'lead_scoring': 'lead_scoring_results.csv',
+    'feature_importance': 'feature_importance.csv',
+    'learning_curve': 'learning_curve.csv',
+    'geographic': 'geographic_data.csv',
+    'channel_attribution': 'channel_attribution.csv',
+    'funnel': 'funnel_data.csv',
+    'funnel_events': 'funnel_events.csv',
+    'customer_journey': 'customer_journey.csv',
+    'correlation_matrix': 'correlation_matrix.csv'
+}
+
+# Raw exports read only when present; pages fall back to an aggregate table without them
+OPTIONAL_TABLES = {'funnel_events'}
+
+# Explicit per-table schema: low-cardinality labels become categoricals and
+# date columns are parsed once here rather than on every page render
+TABLE_SCHEMAS = {
+    'campaign_performance': {
+        'categorical': ['channel', 'region', 'campaign_type'],
+        'dates': ['date']
+    },
+    'customer_data': {
+        'categorical': ['region', 'customer_segment']
+    },
+    'product_sales': {
+        'categorical': ['region']
+    },
+    'geographic': {
+        'categorical': ['region']
+    },
+    'funnel_events': {
+        'categorical': ['stage', 'channel', 'region'],
+        'dates': ['timestamp']
+    }
+}
+
+# Compact mode, on top of TABLE_SCHEMAS: repeated labels and IDs are
+# dictionary-encoded, 0/1 columns become bool flags and rates/ratios become
+# float32. Summed measures (spend, revenue, sales, profit) keep float64 so
+# large totals stay exact; every integer column is downcast to the narrowest
+# width that holds its values, and sums of them still accumulate in int64.
+COMPACT_SCHEMAS = {
+    'campaign_performance': {
+        'categorical': ['campaign_id', 'campaign_name', 'day_of_week', 'month', 'quarter'],
+        'float32': ['ctr', 'conversion_rate', 'cpc', 'cpa', 'roas']
+    },
+    'customer_data': {
+        'categorical': ['gender', 'age_group', 'income_bracket', 'city_tier', 'acquisition_channel',
+                        'nps_category'],
+        'flags': ['is_churned'],
+        'float32': ['email_open_rate', 'satisfaction_score', 'churn_probability']
+    },
+    'product_sales': {
+        'categorical': ['product_name', 'category', 'subcategory', 'quarter'],
+        'float32': ['profit_margin', 'return_rate', 'avg_rating']
+    },
+    'lead_scoring': {
+        'categorical': ['company_size', 'industry', 'lead_source'],
+        'flags': ['actual_converted', 'predicted_class']
+    },
+    'funnel_events': {
+        'categorical': ['user_id']
+    }
+}
+
+
+def _returned_units(df):
+    """Units returned per row: units_sold x return_rate%"""
+    return df['units_sold'] * df['return_rate'].astype('float64') / 100
+
+
+# Columns computed once at parse time from others in the same row, so every
+# backend can sum them: {table: {column: (input columns, function of the frame)}}.
+# Returned units let return rates roll up weighted by units.
+DERIVED_COLUMNS = {
+    'product_sales': {'returned_units': (['units_sold', 'return_rate'], _returned_units)}
+}
+
+# Feeds that only ever grow at the end; an append is folded in by parsing
+# just the new tail instead of the whole file
+APPEND_ONLY_TABLES = {'campaign_performance'}
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+# ============================================================================
+# SOURCE FINGERPRINTING
+# ============================================================================
+
+def file_hash(path, size=None):
+    """Content hash of a source file's first `size` bytes (all of it by default), read in fixed-size chunks"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open_prefix(path, size) as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_append(source, offset, fingerprint):
+    """
+    True if the file grew past `offset` without changing what came before:
+    the first `offset` bytes still end a line and still hash to `fingerprint`
+    (the file_hash of those bytes when they were loaded)
+    """
+    if not fingerprint or offset <= 0 or source.stat().st_size <= offset:
+        return False
+    with open(source, 'rb') as fh:
+        fh.seek(offset - 1)
+        if fh.read(1) != b'\n':
+            return False
+    return file_hash(source, offset) == fingerprint
+
+
+class _PrefixReader(io.RawIOBase):
+    """Raw binary reader that stops after the first `limit` bytes of a file"""
+
+    def __init__(self, path, limit):
+        self._fh = open(path, 'rb')
+        self._remaining = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._fh.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._fh.close()
+        super().close()
+
+
+def open_prefix(path, size=None):
+    """
+    Buffered binary file over the first `size` bytes of `path` (the whole
+    file when None). Bytes appended while it is being read are not seen, so a
+    parse covers exactly the bytes its offset says it does.
+    """
+    if size is None:
+        return open(path, 'rb')
+    return io.BufferedReader(_PrefixReader(path, size), HASH_CHUNK_SIZE)
+
+
+def source_path(key):
+    return DATA_DIR / TABLE_FILES[key]
+
+
+def present_tables(*keys):
+    """The given tables whose source file exists"""
+    return tuple(key for key in keys if source_path(key).exists())
+
+
+def _snapshot_paths(key):
+    return SNAPSHOT_DIR / f"{key}.arrow", SNAPSHOT_DIR / f"{key}.json"
+
+
+def _read_manifest(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(path, manifest):
+    tmp_path = path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w') as fh:
+        json.dump(manifest, fh)
+    os.replace(tmp_path, path)
+
+
+def table_version(key):
+    """
+    Cheap identifier of a table's current source data, used to key derived
+    caches. Prefers the snapshot's content hash; falls back to mtime and size.
+    """
+    source = source_path(key)
+    if not source.exists():
+        return None
+    stat = source.stat()
+    manifest = _read_manifest(_snapshot_paths(key)[1])
+    if manifest and manifest['mtime_ns'] == stat.st_mtime_ns and manifest['size'] == stat.st_size:
+        return manifest['hash']
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def _schema_matches(manifest):
+    """Whether a snapshot was written with the current schema and compact mode"""
+    return (manifest is not None and manifest.get('schema_version') == SCHEMA_VERSION
+            and manifest.get('compact', False) == COMPACT_MODE)
+
+
+def _snapshot_is_current(source, data_path, manifest_path):
+    """
+    Check a snapshot against its source CSV.
+    A matching mtime and size is trusted outright; otherwise the content hash
+    decides, so a touched-but-unchanged file does not force a rebuild.
+    """
+    manifest = _read_manifest(manifest_path)
+    if not _schema_matches(manifest):
+        return False
+    if not data_path.exists():
+        return False
+
+    stat = source.stat()
+    if manifest['mtime_ns'] == stat.st_mtime_ns and manifest['size'] == stat.st_size:
+        return True
+    if manifest['size'] != stat.st_size or manifest['hash'] != file_hash(source):
+        return False
+
+    manifest['mtime_ns'] = stat.st_mtime_ns
+    _write_manifest(manifest_path, manifest)
+    return True
+
+
+# ============================================================================
+# PARSING AND SNAPSHOTS
+# ============================================================================
+
+def _schema_dtypes(key, compact=COMPACT_MODE):
+    schema = TABLE_SCHEMAS.get(key, {})
+    dtypes = {col: 'category' for col in schema.get('categorical', [])}
+    if compact:
+        compact_schema = COMPACT_SCHEMAS.get(key, {})
+        dtypes.update({col: 'category' for col in compact_schema.get('categorical', [])})
+        dtypes.update({col: 'float32' for col in compact_schema.get('float32', [])})
+    return dtypes or None
+
+
+def _apply_schema(key, df, compact=COMPACT_MODE):
+    for col in TABLE_SCHEMAS.get(key, {}).get('dates', []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    for col, (inputs, derive) in DERIVED_COLUMNS.get(key, {}).items():
+        if set(inputs) <= set(df.columns):
+            df[col] = derive(df)
+    if compact:
+        df = compact_frame(key, df)
+    return df
+
+
+def compact_frame(key, df):
+    """Turn 0/1 flag columns into bools and downcast integer columns in place"""
+    for col in COMPACT_SCHEMAS.get(key, {}).get('flags', []):
+        if col in df.columns and df[col].isin([0, 1]).all():
+            df[col] = df[col].astype(bool)
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+def parse_csv(key, source=None, nrows=None, compact=COMPACT_MODE, size=None):
+    """
+    Parse a CSV export (path or buffer) applying the table's explicit schema.
+    With `size`, only the first `size` bytes of the path are parsed.
+    """
+    source = source if source is not None else source_path(key)
+    if size is not None:
+        with open_prefix(source, size) as fh:
+            return parse_csv(key, fh, nrows, compact)
+    df = pd.read_csv(source, dtype=_schema_dtypes(key, compact), nrows=nrows)
+    return _apply_schema(key, df, compact)
+
+
+def iter_csv_chunks(key, source, chunk_rows, size=None):
+    """
+    Parse a CSV export in bounded chunks, each with the table's schema
+    applied; with `size`, only the first `size` bytes of the path
+    """
+    if size is not None:
+        with open_prefix(source, size) as fh:
+            yield from iter_csv_chunks(key, fh, chunk_rows)
+        return
+    with pd.read_csv(source, dtype=_schema_dtypes(key), chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield _apply_schema(key, chunk)
+
+
+def memory_report(keys):
+    """
+    Deep in-memory size of each table parsed with the plain schema and in
+    compact mode. Parses the CSVs afresh, so it is a diagnostic, not a hot path.
+    """
+    rows = []
+    for key in keys:
+        if not source_path(key).exists():
+            continue
+        plain = parse_csv(key, compact=False)
+        compact = parse_csv(key, compact=True)
+        plain_bytes = plain.memory_usage(deep=True).sum()
+        compact_bytes = compact.memory_usage(deep=True).sum()
+        rows.append({
+            'table': key,
+            'rows': len(plain),
+            'plain_mb': plain_bytes / 1e6,
+            'compact_mb': compact_bytes / 1e6,
+            'bytes_per_row_plain': plain_bytes / max(len(plain), 1),
+            'bytes_per_row_compact': compact_bytes / max(len(compact), 1),
+            'saving_pct': 100 * (1 - compact_bytes / plain_bytes) if plain_bytes else 0.0
+        })
+    return pd.DataFrame(rows)
+
+
+def estimate_row_bytes(key, source, sample_rows=1000):
+    """
+    Estimate (bytes per CSV line, in-memory bytes per parsed row) from a
+    sample at the head of the file.
+    """
+    with open(source, 'rb') as fh:
+        lines = [fh.readline() for _ in range(sample_rows + 1)]
+    lines = [line for line in lines if line]
+    if len(lines) < 2:
+        return 1.0, 1.0
+
+    sample = parse_csv(key, io.BytesIO(b''.join(lines)))
+    line_bytes = sum(len(line) for line in lines[1:]) / (len(lines) - 1)
+    row_bytes = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    return line_bytes, row_bytes
+
+
+def estimate_frame_bytes(key, source):
+    """Rough in-memory size of the fully parsed table, without parsing it"""
+    line_bytes, row_bytes = estimate_row_bytes(key, source)
+    return source.stat().st_size / line_bytes * row_bytes
+
+
+def read_appended_rows(key, source, offset):
+    """
+    Parse only the complete lines written after byte `offset`.
+    Returns the new rows and the offset just past the last complete line, so
+    a line still being written is picked up on the next call.
+    """
+    with open(source, 'rb') as fh:
+        header = fh.readline()
+        fh.seek(offset)
+        tail = fh.read()
+
+    end = tail.rfind(b'\n') + 1
+    if end == 0:
+        return parse_csv(key, io.BytesIO(header)), offset
+    return parse_csv(key, io.BytesIO(header + tail[:end])), offset + end
+
+
+def concat_frames(head, tail):
+    """
+    Append `tail` rows to `head`, extending categorical columns with any new
+    categories so they stay categorical instead of decaying to object.
+    """
+    tail = tail.reindex(columns=head.columns)
+    for col in head.columns:
+        if isinstance(head[col].dtype, pd.CategoricalDtype):
+            new_values = pd.Index(tail[col].dropna().unique()).difference(head[col].cat.categories)
+            if len(new_values):
+                # Keep categories sorted so group order doesn't depend on arrival order
+                categories = head[col].cat.categories.union(new_values)
+                head = head.assign(**{col: head[col].cat.set_categories(categories)})
+            tail = tail.assign(**{col: tail[col].astype(head[col].dtype)})
+    return pd.concat([head, tail], ignore_index=True)
+
+
+def write_snapshot(key, df, source, offset=None):
+    """
+    Persist a parsed table as an uncompressed Arrow IPC file plus manifest.
+    `offset` is the number of source bytes the frame covers (the whole file
+    by default); the manifest hashes exactly those bytes, which is what a
+    later append is checked against.
+    """
+    data_path, manifest_path = _snapshot_paths(key)
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+
+    stat = source.stat()
+    offset = stat.st_size if offset is None else offset
+    manifest = {
+        'source': source.name,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': offset,
+        'hash': file_hash(source, offset),
+        'rows': len(df),
+        'schema_version': SCHEMA_VERSION,
+        'compact': COMPACT_MODE
+    }
+
+    # Uncompressed so reads can memory-map the buffers without decoding
+    tmp_path = data_path.with_suffix('.arrow.tmp')
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, data_path)
+    _write_manifest(manifest_path, manifest)
+
+
+def read_snapshot(key):
+    """
+    Load a table from its memory-mapped Arrow snapshot. Numeric columns
+    stay read-only zero-copy views of the mapped file, so their pages live
+    in the OS page cache and are shared by every reader of the snapshot.
+    """
+    data_path, _ = _snapshot_paths(key)
+    table = feather.read_table(data_path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def load_table_with_offset(key):
+    """
+    Load one table, preferring its columnar snapshot, and report how many
+    source bytes it covers. The CSV is only parsed when no snapshot exists or
+    the source has changed; for append-only tables a grown file is handled by
+    parsing just the new tail onto the snapshot. Raises FileNotFoundError when
+    the source CSV is missing.
+    """
+    source = source_path(key)
+    if not source.exists():
+        raise FileNotFoundError(source)
+
+    data_path, manifest_path = _snapshot_paths(key)
+    if _snapshot_is_current(source, data_path, manifest_path):
+        try:
+            return read_snapshot(key), _read_manifest(manifest_path)['size']
+        except (OSError, pa.ArrowInvalid):
+            pass
+
+    df, offset = None, None
+    manifest = _read_manifest(manifest_path)
+    if (key in APPEND_ONLY_TABLES and _schema_matches(manifest)
+            and is_append(source, manifest['size'], manifest['hash'])):
+        try:
+            df_tail, offset = read_appended_rows(key, source, manifest['size'])
+            df = concat_frames(read_snapshot(key), df_tail)
+        except (OSError, pa.ArrowInvalid):
+            df = None
+
+    if df is None:
+        # Parse exactly the bytes the offset covers, so rows appended meanwhile are left for the next append
+        offset = source.stat().st_size
+        df = parse_csv(key, source, size=offset)
+
+    try:
+        write_snapshot(key, df, source, offset)
+    except OSError:
+        # Read-only deployments still work, they just parse on every cold start
+        return df, offset
+    # Serve the freshly written snapshot so the parsed copy can be released
+    try:
+        return read_snapshot(key), offset
+    except (OSError, pa.ArrowInvalid):
+        return df, offset
+
+
+def load_table(key):
+    """Load one table, preferring its columnar snapshot"""
+    return load_table_with_offset(key)[0]
@@ -0,0 +1,161 @@
+"""
+Background Data Refresh - NovaMart
+Watches the source files on a schedule and reloads changed tables off the
+request path. Each refresh cycle loads the new data and warms its derived
+aggregates first, then publishes one immutable, versioned snapshot in a
+single reference swap. Sessions pin the snapshot they started on, so a
+refresh never changes data under a page mid-analysis and no request waits
+for a reload.
+"""
+
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from types import MappingProxyType
+
+import pandas as pd
+
+from data_cache import APPEND_ONLY_TABLES, load_table, source_path, table_version
+from incremental_ingest import AppendOnlyTable
+
+# Seconds between checks of the source files (NOVAMART_REFRESH_SECONDS); 0
+# turns background refresh off and tables stay as first loaded
+REFRESH_SECONDS = float(os.environ.get('NOVAMART_REFRESH_SECONDS', '30'))
+
+REFRESH_THREAD_NAME = 'novamart-data-refresh'
+
+# Refresh cycles kept for the Data Load Report
+REFRESH_HISTORY = 50
+
+# One table as loaded: `version` keys its derived caches (None when the file
+# is missing), `state` is the IngestState of an append-only table and
+# `signature` the (mtime_ns, size) of the file it was read from
+TableEntry = namedtuple('TableEntry', ['frame', 'version', 'state', 'signature'])
+
+# Immutable view of every table loaded so far; `version` counts the refresh
+# cycles that changed data and `tables` is a read-only {name: TableEntry}
+DataSnapshot = namedtuple('DataSnapshot', ['version', 'tables', 'published_at'])
+
+
+def _signature(source):
+    try:
+        stat = source.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def with_table(snapshot, key, entry):
+    """Copy of `snapshot` that also holds `entry`, keeping its version"""
+    return snapshot._replace(tables=MappingProxyType({**snapshot.tables, key: entry}))
+
+
+class DataRefresher:
+    """
+    Process-wide owner of the loaded tables.
+    entry() loads a table on its first use in the process; after that only
+    the refresher thread reloads it. `aggregates` are the (build, fold) pairs
+    of the append-only tables, as for AppendOnlyTable. `warmers` maps a table
+    to callables run on each new TableEntry before it is published, so the
+    derived caches keyed by its version are built off the request path.
+    """
+
+    def __init__(self, aggregates=None, interval=REFRESH_SECONDS):
+        aggregates = aggregates or {}
+        self.stores = {key: AppendOnlyTable(key, aggregates.get(key)) for key in APPEND_ONLY_TABLES}
+        self.interval = interval
+        self.warmers = {}
+        self.snapshot = DataSnapshot(1, MappingProxyType({}), pd.Timestamp.now())
+        self.history = deque(maxlen=REFRESH_HISTORY)
+        self._load_locks = {}
+        self._publish_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def entry(self, key):
+        """The latest published entry of a table, loading it if no session has used it yet"""
+        entry = self.snapshot.tables.get(key)
+        if entry is not None:
+            return entry
+        with self._load_locks.setdefault(key, threading.Lock()):
+            entry = self.snapshot.tables.get(key)
+            if entry is None:
+                entry = self._load(key)
+                self._publish({key: entry}, new_version=False)
+        return entry
+
+    def _load(self, key):
+        source = source_path(key)
+        signature = _signature(source)
+        try:
+            if key in self.stores:
+                store = self.stores[key]
+                store.refresh()
+                frame, state = store.frame, store.state
+            else:
+                frame, state = load_table(key), None
+        except FileNotFoundError:
+            return TableEntry(pd.DataFrame(), None, None, None)
+        if _signature(source) != signature:
+            # Written to while loading: load again on the next cycle
+            signature = None
+        return TableEntry(frame, table_version(key), state, signature)
+
+    def _publish(self, entries, new_version):
+        with self._publish_lock:
+            current = self.snapshot
+            self.snapshot = DataSnapshot(current.version + int(new_version),
+                                         MappingProxyType({**current.tables, **entries}), pd.Timestamp.now())
+
+    def refresh(self):
+        """
+        One refresh cycle: reload every loaded table whose file changed, run
+        its warmers, then publish them together as the next snapshot.
+        Returns the names of the tables reloaded.
+        """
+        with self._refresh_lock:
+            start = time.perf_counter()
+            changed = {key: self._load(key) for key, entry in self.snapshot.tables.items()
+                       if _signature(source_path(key)) != entry.signature}
+            for key, entry in changed.items():
+                if entry.version is not None:
+                    for warm in self.warmers.get(key, ()):
+                        warm(entry)
+            if changed:
+                self._publish(changed, new_version=True)
+                self.history.append({
+                    'snapshot': self.snapshot.version,
+                    'tables': ', '.join(changed),
+                    'refresh_ms': (time.perf_counter() - start) * 1000,
+                    'published_at': self.snapshot.published_at,
+                    'error': None
+                })
+            return list(changed)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as exc:
+                # A half-written file or failed warmer leaves the current snapshot in place until the next cycle
+                self.history.append({'snapshot': self.snapshot.version, 'tables': None, 'refresh_ms': None,
+                                     'published_at': pd.Timestamp.now(), 'error': repr(exc)})
+
+    def start(self):
+        """Start the refresher thread, unless refresh is off or it is already running"""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=REFRESH_THREAD_NAME, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def refresh_report(self):
+        """Refresh cycles that published a snapshot or failed, latest first"""
+        if not self.history:
+            return pd.DataFrame(columns=['snapshot', 'tables', 'refresh_ms', 'published_at', 'error'])
+        return pd.DataFrame(list(self.history)[::-1])
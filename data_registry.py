@@ -0,0 +1,84 @@
+"""
+Lazy Data Registry - NovaMart
+Loads datasets on first access so each page only pays for the tables it reads
+"""
+
+import time
+from collections.abc import Mapping
+
+import pandas as pd
+
+# Loaded frames are shared by every session and must be treated as read-only.
+# Pages that add or overwrite columns work on copy(deep=False), which under
+# copy-on-write (always on from pandas 3) copies only the columns they touch.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Process-wide record of the first load of every table, keyed by table name.
+# Imported modules survive Streamlit reruns, so this spans all sessions.
+LOAD_REPORT = {}
+
+
+def page_tables(*keys):
+    """Decorator declaring which tables a page function reads"""
+    def decorator(func):
+        func.required_tables = keys
+        return func
+    return decorator
+
+
+def _record_load(key, df, seconds):
+    LOAD_REPORT[key] = {
+        'table': key,
+        'rows': len(df),
+        'columns': len(df.columns),
+        'memory_mb': df.memory_usage(deep=True).sum() / 1e6,
+        'load_ms': seconds * 1000,
+        'loaded_at': pd.Timestamp.now()
+    }
+
+
+def load_report():
+    """First-load timings of every table loaded so far, slowest first"""
+    if not LOAD_REPORT:
+        return pd.DataFrame(columns=['table', 'rows', 'columns', 'memory_mb', 'load_ms', 'loaded_at'])
+    return pd.DataFrame(LOAD_REPORT.values()).sort_values('load_ms', ascending=False).reset_index(drop=True)
+
+
+class LazyTables(Mapping):
+    """
+    Read-only mapping of table name to DataFrame that calls `loader` on first
+    access. Only the first load of a table in this process is timed into
+    LOAD_REPORT; later accesses are served from the loader's own cache.
+    """
+
+    def __init__(self, loader, keys):
+        self._loader = loader
+        self._keys = tuple(keys)
+        self._frames = {}
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        if key not in self._frames:
+            start = time.perf_counter()
+            df = self._loader(key)
+            if key not in LOAD_REPORT:
+                _record_load(key, df, time.perf_counter() - start)
+            self._frames[key] = df
+        return self._frames[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def loaded(self):
+        """Names of the tables materialized in this run"""
+        return list(self._frames)
+
+    def prefetch(self, keys):
+        """Load the given tables up front, e.g. a page's declared tables"""
+        for key in keys:
+            self[key]
@@ -0,0 +1,405 @@
+"""
+Data Sources - NovaMart
+A small query description executed either in pandas or inside an embedded SQL
+engine (SQLite, or DuckDB when installed), so filters and aggregations can be
+pushed down and only aggregated results cross into Python
+"""
+
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+from campaign_cube import add_period_labels
+from data_cache import SNAPSHOT_DIR, TABLE_SCHEMAS, iter_csv_chunks, source_path, table_version
+
+# Which backend answers page queries: 'pandas', 'sqlite' or 'duckdb'
+BACKEND = os.environ.get('NOVAMART_BACKEND', 'pandas').lower()
+
+SQL_CHUNK_ROWS = 200_000
+
+# Tables loaded into the SQL engine, with the columns indexed for pushdown
+SQL_TABLES = {
+    'campaign_performance': ['date', 'channel', 'region', 'year'],
+    'product_sales': ['category', 'region', 'quarter']
+}
+
+SQL_AGGREGATES = {'sum': 'SUM', 'mean': 'AVG', 'count': 'COUNT', 'min': 'MIN', 'max': 'MAX'}
+
+
+class Query(namedtuple('Query', ['table', 'measures', 'by', 'filters', 'columns',
+                                 'order_by', 'descending', 'limit'])):
+    """
+    Backend-independent description of one page query.
+    measures: {output name: (column, aggregate)} with aggregates from SQL_AGGREGATES
+    by:       grouping columns; with no measures, the distinct combinations
+    filters:  {column: value}, a list/tuple/set value meaning membership and a
+              Range an inclusive interval
+    columns:  plain columns to select when there are neither measures nor `by`
+    order_by: output column to sort on; groups are ordered by `by` otherwise
+    """
+
+    def __new__(cls, table, measures=None, by=None, filters=None, columns=None,
+                order_by=None, descending=False, limit=None):
+        return super().__new__(cls, table, measures or {}, list(by or []), filters or {},
+                               list(columns or []), order_by, descending, limit)
+
+
+class Range(namedtuple('Range', ['start', 'end'])):
+    """Inclusive [start, end] filter value; either end may be None for an open bound"""
+
+    def contains(self, value):
+        return (self.start is None or value >= self.start) and (self.end is None or value <= self.end)
+
+
+def _is_multi(value):
+    return isinstance(value, (list, tuple, set, pd.Index)) and not isinstance(value, Range)
+
+
+def _intersect(outer, inner):
+    """One filter value meaning both `outer` and `inner`"""
+    if isinstance(outer, Range) and isinstance(inner, Range):
+        starts = [v for v in (outer.start, inner.start) if v is not None]
+        ends = [v for v in (outer.end, inner.end) if v is not None]
+        return Range(max(starts) if starts else None, min(ends) if ends else None)
+    if isinstance(inner, Range):
+        outer, inner = inner, outer
+    values = list(inner) if _is_multi(inner) else [inner]
+    if isinstance(outer, Range):
+        return [v for v in values if outer.contains(v)]
+    allowed = set(outer) if _is_multi(outer) else {outer}
+    return [v for v in values if v in allowed]
+
+
+def merge_filters(outer, inner):
+    """Filters that apply both sets; a column filtered by both keeps only the values both allow"""
+    merged = dict(outer)
+    for col, value in inner.items():
+        merged[col] = _intersect(merged[col], value) if col in merged else value
+    return merged
+
+
+def _mask(series, value):
+    """Boolean row mask for one filter value"""
+    if isinstance(value, Range):
+        mask = series.notna()
+        if value.start is not None:
+            mask &= series >= value.start
+        if value.end is not None:
+            mask &= series <= value.end
+        return mask
+    return series.isin(list(value)) if _is_multi(value) else series == value
+
+
+# ============================================================================
+# PANDAS BACKEND
+# ============================================================================
+
+def _aggregate(values, frame_columns, col, agg):
+    """
+    Apply one aggregate to a frame or groupby. Pre-aggregated frames such as
+    the campaign cube carry `<col>_sum`/`<col>_count` pairs, from which an
+    exact mean is rebuilt.
+    """
+    if agg == 'mean' and f'{col}_sum' in frame_columns:
+        return values[f'{col}_sum'].sum() / values[f'{col}_count'].sum()
+    if agg == 'count' and f'{col}_count' in frame_columns:
+        return values[f'{col}_count'].sum()
+    return getattr(values[col], agg)()
+
+
+def run_frame_query(df, query, index=None):
+    """
+    Execute a Query against an in-memory frame. With a row index over `df`
+    (see cross_filters.BitmapIndex) the filters it covers are answered by
+    intersecting its bitmaps; the rest fall back to column masks.
+    """
+    filters = query.filters
+    if index is not None:
+        df, filters = index.apply(filters)
+    for col, value in filters.items():
+        df = df[_mask(df[col], value)]
+
+    if query.measures:
+        values = df.groupby(query.by, observed=True) if query.by else df
+        result = {name: _aggregate(values, df.columns, col, agg)
+                  for name, (col, agg) in query.measures.items()}
+        result = pd.DataFrame(result).reset_index() if query.by else pd.DataFrame([result])
+    elif query.by:
+        result = df[query.by].drop_duplicates().sort_values(query.by)
+    else:
+        result = df[query.columns]
+
+    if query.order_by:
+        if query.limit and not query.by:
+            pick = result.nlargest if query.descending else result.nsmallest
+            return pick(query.limit, query.order_by).reset_index(drop=True)
+        result = result.sort_values(query.order_by, ascending=not query.descending)
+    if query.limit:
+        result = result.head(query.limit)
+    return result.reset_index(drop=True)
+
+
+class PandasSource:
+    """
+    Answers queries from in-memory frames returned by `frames[table]()`.
+    `indexes[table]()`, where given, returns a row index carrying its own
+    frame, which then answers that table's queries.
+    """
+
+    name = 'pandas'
+
+    def __init__(self, frames, indexes=None):
+        self.frames = frames
+        self.indexes = indexes or {}
+
+    def serves(self, table):
+        """Whether page code can skip loading `table` itself"""
+        return False
+
+    def columns(self, table):
+        return list(self.frames[table]().columns)
+
+    def has_rows(self, table):
+        return not self.frames[table]().empty
+
+    def query(self, query):
+        if query.table in self.indexes:
+            index = self.indexes[query.table]()
+            if index is not None:
+                return run_frame_query(index.frame, query, index)
+        return run_frame_query(self.frames[query.table](), query)
+
+
+class FilteredSource:
+    """
+    Any source with standing filters, e.g. the global sidebar filters, merged
+    into every query on the tables they name: {table: {column: value}}
+    """
+
+    def __init__(self, source, filters):
+        self.source = source
+        self.filters = filters
+
+    @property
+    def name(self):
+        return self.source.name
+
+    def serves(self, table):
+        return self.source.serves(table)
+
+    def columns(self, table):
+        return self.source.columns(table)
+
+    def has_rows(self, table):
+        return self.source.has_rows(table)
+
+    def query(self, query):
+        standing = self.filters.get(query.table)
+        if standing:
+            query = query._replace(filters=merge_filters(standing, query.filters))
+        return self.source.query(query)
+
+
+# ============================================================================
+# SQL BACKENDS
+# ============================================================================
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _param(value):
+    """Convert numpy/pandas scalars into types the DB drivers can bind"""
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat(sep=' ')
+    return value.item() if hasattr(value, 'item') else value
+
+
+def to_sql(query):
+    """Render a Query as parameterized SQL"""
+    params = []
+    if query.measures:
+        select = [_quote(col) for col in query.by] + [
+            f"{SQL_AGGREGATES[agg]}({_quote(col)}) AS {_quote(name)}"
+            for name, (col, agg) in query.measures.items()]
+        sql = f"SELECT {', '.join(select)}"
+    elif query.by:
+        sql = f"SELECT DISTINCT {', '.join(_quote(col) for col in query.by)}"
+    else:
+        sql = f"SELECT {', '.join(_quote(col) for col in query.columns)}"
+    sql += f" FROM {_quote(query.table)}"
+
+    conditions = []
+    for col, value in query.filters.items():
+        if isinstance(value, Range):
+            if value.start is not None:
+                conditions.append(f"{_quote(col)} >= ?")
+                params.append(_param(value.start))
+            if value.end is not None:
+                conditions.append(f"{_quote(col)} <= ?")
+                params.append(_param(value.end))
+        elif _is_multi(value):
+            value = list(value)
+            if not value:
+                conditions.append('1 = 0')
+                continue
+            conditions.append(f"{_quote(col)} IN ({', '.join('?' * len(value))})")
+            params.extend(_param(v) for v in value)
+        else:
+            conditions.append(f"{_quote(col)} = ?")
+            params.append(_param(value))
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+
+    if query.measures and query.by:
+        sql += f" GROUP BY {', '.join(_quote(col) for col in query.by)}"
+    if query.order_by:
+        sql += f" ORDER BY {_quote(query.order_by)} {'DESC' if query.descending else 'ASC'}"
+    elif query.by:
+        sql += f" ORDER BY {', '.join(_quote(col) for col in query.by)}"
+    if query.limit:
+        sql += f" LIMIT {int(query.limit)}"
+    return sql, params
+
+
+def _prepare_chunk(table, chunk):
+    """Give SQL rows the same derived period labels the campaign cube uses"""
+    if table == 'campaign_performance':
+        chunk = add_period_labels(chunk)
+    for col in chunk.columns:
+        if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+            chunk[col] = chunk[col].astype(str)
+    return chunk
+
+
+class SQLSource:
+    """
+    Embedded SQL engine on a local database file under SNAPSHOT_DIR.
+    Tables are (re)loaded from the CSVs in bounded chunks whenever their
+    data version changes, then indexed on the columns in SQL_TABLES.
+    """
+
+    name = None
+    filename = None
+
+    def __init__(self, path=None):
+        self.path = path or SNAPSHOT_DIR / self.filename
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def connect(self):
+        raise NotImplementedError
+
+    def _write_chunk(self, conn, table, chunk, first):
+        raise NotImplementedError
+
+    def serves(self, table):
+        return table in SQL_TABLES
+
+    def ensure(self, table):
+        """Reload `table` into the engine if its source CSV has changed"""
+        version = table_version(table)
+        if version is None:
+            raise FileNotFoundError(source_path(table))
+        if self._versions.get(table) == version:
+            return
+
+        with self._lock:
+            SNAPSHOT_DIR.mkdir(exist_ok=True)
+            conn = self.connect()
+            try:
+                conn.execute("CREATE TABLE IF NOT EXISTS _versions (name TEXT PRIMARY KEY, version TEXT)")
+                row = conn.execute("SELECT version FROM _versions WHERE name = ?", [table]).fetchone()
+                if row is None or row[0] != version:
+                    self._load(conn, table)
+                    conn.execute("DELETE FROM _versions WHERE name = ?", [table])
+                    conn.execute("INSERT INTO _versions VALUES (?, ?)", [table, version])
+                conn.commit()
+            finally:
+                conn.close()
+            self._versions[table] = version
+
+    def _load(self, conn, table):
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+        for i, chunk in enumerate(iter_csv_chunks(table, source_path(table), SQL_CHUNK_ROWS)):
+            self._write_chunk(conn, table, _prepare_chunk(table, chunk), first=(i == 0))
+        for col in SQL_TABLES.get(table, []):
+            conn.execute(f"CREATE INDEX {_quote(f'idx_{table}_{col}')} ON {_quote(table)} ({_quote(col)})")
+
+    def _fetch(self, sql, params):
+        conn = self.connect()
+        try:
+            cursor = conn.execute(sql, params)
+            names = [desc[0] for desc in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=names)
+        finally:
+            conn.close()
+
+    def columns(self, table):
+        self.ensure(table)
+        return list(self._fetch(f"SELECT * FROM {_quote(table)} LIMIT 0", []).columns)
+
+    def has_rows(self, table):
+        try:
+            self.ensure(table)
+        except FileNotFoundError:
+            return False
+        return not self._fetch(f"SELECT 1 FROM {_quote(table)} LIMIT 1", []).empty
+
+    def query(self, query):
+        self.ensure(query.table)
+        result = self._fetch(*to_sql(query))
+        dates = TABLE_SCHEMAS.get(query.table, {}).get('dates', [])
+        for name, (col, agg) in query.measures.items():
+            result[name] = pd.to_datetime(result[name]) if col in dates and agg != 'count' else pd.to_numeric(result[name])
+        for col in dates:
+            if col in result.columns:
+                result[col] = pd.to_datetime(result[col])
+        return result
+
+
+class SQLiteSource(SQLSource):
+    name = 'sqlite'
+    filename = 'novamart.sqlite'
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _write_chunk(self, conn, table, chunk, first):
+        chunk.to_sql(table, conn, if_exists='replace' if first else 'append', index=False)
+
+
+class DuckDBSource(SQLSource):
+    name = 'duckdb'
+    filename = 'novamart.duckdb'
+
+    def connect(self):
+        import duckdb
+        return duckdb.connect(str(self.path))
+
+    def _write_chunk(self, conn, table, chunk, first):
+        conn.register('_chunk', chunk)
+        if first:
+            conn.execute(f"CREATE TABLE {_quote(table)} AS SELECT * FROM _chunk")
+        else:
+            conn.execute(f"INSERT INTO {_quote(table)} SELECT * FROM _chunk")
+        conn.unregister('_chunk')
+
+
+def make_source(frames, backend=BACKEND, indexes=None):
+    """
+    Data source for the configured backend; DuckDB falls back to SQLite if
+    not installed. `frames` and `indexes` are only used by the pandas backend.
+    """
+    if backend == 'duckdb':
+        try:
+            import duckdb  # noqa: F401
+            return DuckDBSource()
+        except ImportError:
+            backend = 'sqlite'
+    if backend == 'sqlite':
+        return SQLiteSource()
+    return PandasSource(frames, indexes)
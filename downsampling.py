@@ -0,0 +1,95 @@
+"""
+Time-Series Downsampling - NovaMart
+Server-side decimation (Largest-Triangle-Three-Buckets or min/max bucketing)
+so line and area charts ship roughly one point per horizontal pixel
+"""
+
+import numpy as np
+import pandas as pd
+
+# Plot area width the decimation targets; wide-layout charts are ~1000-1200px
+CHART_WIDTH_PX = 1100
+
+
+def _as_float(values):
+    """Numeric view of an x/y column; datetimes become epoch nanoseconds"""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps.
+    Bucket edges and next-bucket centroids are computed in one vectorized
+    pass; only the per-bucket argmax, which depends on the previous pick,
+    is sequential.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets over the interior points; first and last are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # The "next bucket" of the final interior bucket is the last point itself
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, n_buckets):
+    """Indices of the minimum and maximum of each of n_buckets equal-count buckets"""
+    n = len(y)
+    if 2 * n_buckets >= n or n_buckets < 1:
+        return np.arange(n)
+
+    size = -(-n // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    picks = np.concatenate([offsets + np.nanargmin(padded, axis=1),
+                            offsets + np.nanargmax(padded, axis=1), [0, n - 1]])
+    return np.unique(picks[picks < n])
+
+
+def decimate(df, x, y, n_out=CHART_WIDTH_PX, by=None, x_range=None, method='lttb'):
+    """
+    Reduce a frame to about n_out points per series before plotting.
+    `by` splits it into one series per group (e.g. per channel), `x_range`
+    first restricts it to a (start, end) window so a zoomed view is
+    re-decimated at full resolution. Rows must be sorted by `x` within each
+    series.
+    """
+    if x_range is not None:
+        start, end = x_range
+        if np.issubdtype(df[x].dtype, np.datetime64):
+            start, end = pd.Timestamp(start), pd.Timestamp(end)
+        df = df[(df[x] >= start) & (df[x] <= end)]
+
+    groups = df.groupby(by, observed=True, sort=False).indices.values() if by else [np.arange(len(df))]
+    keep = []
+    for rows in groups:
+        if method == 'minmax':
+            picked = minmax_indices(_as_float(df[y].to_numpy()[rows]), max(n_out // 2, 1))
+        else:
+            picked = lttb_indices(_as_float(df[x].to_numpy()[rows]), _as_float(df[y].to_numpy()[rows]), n_out)
+        keep.append(rows[picked])
+
+    if not keep:
+        return df
+    return df.iloc[np.sort(np.concatenate(keep))]
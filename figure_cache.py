@@ -0,0 +1,78 @@
+"""
+Figure Cache - NovaMart
+Process-wide LRU cache of serialized Plotly figure specs, keyed by data
+version, page, section and widget values, so a rerun with inputs seen before
+skips both the aggregation and the figure construction
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+FIGURE_CACHE_BYTES = int(os.environ.get('NOVAMART_FIGURE_CACHE_MB', '256')) * 2**20
+
+
+class FigureCache:
+    """
+    Serialized figure specs in least-recently-used order. Entries are
+    evicted from the cold end until the total spec size fits `max_bytes`;
+    a single spec larger than the budget is returned but never stored.
+    Specs are JSON strings, so cached figures are immutable and can be
+    handed to any session.
+    """
+
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        """Hashable key from data versions and widget values (lists, dates, ranges, ...)"""
+        return repr(parts)
+
+    def get(self, key):
+        """The cached spec as a figure dict, or None"""
+        with self._lock:
+            spec = self._entries.get(key)
+            if spec is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(spec)
+
+    def put(self, key, fig):
+        """Serialize and store a figure; returns the stored spec as a figure dict"""
+        spec = fig.to_json()
+        size = len(spec)
+        if size <= self.max_bytes:
+            with self._lock:
+                if key in self._entries:
+                    self.size -= len(self._entries.pop(key))
+                self._entries[key] = spec
+                self.size += size
+                while self.size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return json.loads(spec)
+
+    def get_or_build(self, key, build):
+        """(spec, hit): the cached spec, or build() serialized and stored on a miss"""
+        spec = self.get(key)
+        if spec is not None:
+            return spec, True
+        return self.put(key, build()), False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {'entries': len(self._entries), 'size_mb': self.size / 2**20,
+                'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,148 @@
+"""
+Funnel Engine - NovaMart
+Stage counts built from raw event logs (user_id, timestamp, stage). Events are
+sorted once by user and time and split into sessions at inactivity gaps; each
+session that enters the funnel starts an attempt whose later stages are matched
+in order. Attempts are rolled up into per-day partial counts by breakdown and
+time-to-stage bucket, so changing the conversion window, breakdown or date
+range re-sums that small table instead of rescanning the events.
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from data_sources import Query, Range, run_frame_query
+
+# Stage order of the funnel (NOVAMART_FUNNEL_STAGES, comma-separated); events
+# with any other stage are ignored
+FUNNEL_STAGES = os.environ.get(
+    'NOVAMART_FUNNEL_STAGES', 'Awareness,Interest,Consideration,Intent,Evaluation,Purchase').split(',')
+
+# A user's events further apart than this start a new session
+SESSION_GAP = pd.Timedelta(minutes=int(os.environ.get('NOVAMART_SESSION_GAP_MINUTES', '30')))
+
+# Conversion windows offered, measured from the attempt's entry event; None
+# means no limit. Time to each stage is bucketed on these edges.
+CONVERSION_WINDOWS = {
+    '1 hour': pd.Timedelta(hours=1),
+    '1 day': pd.Timedelta(days=1),
+    '7 days': pd.Timedelta(days=7),
+    '30 days': pd.Timedelta(days=30),
+    'No limit': None
+}
+
+BREAKDOWN_COLUMNS = ['channel', 'region']
+
+# One row per (date, breakdown values, stage, bucket) with the attempts that
+# reached the stage within that bucket; stages are positions in `stages` and
+# bucket b counts attempts reaching the stage within window_edges[b] but not
+# an earlier edge (b == len(window_edges): beyond every finite window)
+FunnelPartials = namedtuple('FunnelPartials', ['counts', 'stages', 'window_edges', 'breakdowns'])
+
+
+def sessionize(users, times, gap=SESSION_GAP):
+    """
+    Session number of each event, for events sorted by user then time: a
+    session breaks where the user changes or the gap since the user's
+    previous event exceeds `gap`
+    """
+    if not len(users):
+        return np.zeros(0, dtype=np.int64)
+    breaks = np.ones(len(users), dtype=bool)
+    breaks[1:] = (users[1:] != users[:-1]) | (np.diff(times) > gap.value)
+    return np.cumsum(breaks) - 1
+
+
+def funnel_attempts(events, stages=FUNNEL_STAGES, gap=SESSION_GAP, breakdowns=BREAKDOWN_COLUMNS):
+    """
+    One row per funnel attempt: its entry time, the breakdown values of its
+    entry event and, per stage, the seconds from entry until the stage was
+    first reached after the previous one (NaN if never). An attempt starts
+    at the first entry-stage event of a session and runs until the user's
+    next attempt, so later sessions can still complete it.
+    """
+    stage_codes = pd.Categorical(events['stage'], categories=stages).codes.astype(np.int64)
+    keep = np.flatnonzero(stage_codes >= 0)
+    users = pd.factorize(events['user_id'])[0][keep]
+    times = pd.to_datetime(events['timestamp']).to_numpy('datetime64[ns]').view(np.int64)[keep]
+    order = np.lexsort((times, users))
+    users, times, stage_codes, rows = users[order], times[order], stage_codes[keep][order], keep[order]
+
+    session = sessionize(users, times, gap)
+    entry_positions = np.flatnonzero(stage_codes == 0)
+    _, first = np.unique(session[entry_positions], return_index=True)
+    starts = entry_positions[first]
+
+    # Attempt of every event: the latest attempt started at or before it by the same user
+    is_start = np.zeros(len(users), dtype=bool)
+    is_start[starts] = True
+    attempt = np.cumsum(is_start) - 1
+    if len(starts):
+        attempt[(attempt < 0) | (users[starts[np.maximum(attempt, 0)]] != users)] = -1
+
+    reached = np.full((len(starts), len(stages)), np.nan)
+    reached[:, 0] = times[starts]
+    for k in range(1, len(stages)):
+        candidates = np.flatnonzero((stage_codes == k) & (attempt >= 0))
+        owner = attempt[candidates]
+        in_order = times[candidates] >= reached[owner, k - 1]
+        candidates, owner = candidates[in_order], owner[in_order]
+        # Events are time-ordered within an attempt, so the first one per attempt is the earliest
+        owners, first = np.unique(owner, return_index=True)
+        reached[owners, k] = times[candidates[first]]
+
+    result = pd.DataFrame({'date': pd.DatetimeIndex(times[starts].astype('datetime64[ns]')).normalize()})
+    for col in breakdowns:
+        if col in events.columns:
+            result[col] = events[col].array.take(rows[starts])
+    elapsed = (reached - reached[:, [0]]) / 1e9
+    for k, stage in enumerate(stages):
+        result[stage] = elapsed[:, k]
+    return result
+
+
+def funnel_partials(events, stages=FUNNEL_STAGES, windows=CONVERSION_WINDOWS, gap=SESSION_GAP,
+                    breakdowns=BREAKDOWN_COLUMNS):
+    """Sessionize an event log and roll its attempts up into FunnelPartials"""
+    attempts = funnel_attempts(events, stages, gap, breakdowns)
+    present = [col for col in breakdowns if col in attempts.columns]
+    edges = np.sort([window.total_seconds() for window in windows.values() if window is not None])
+
+    parts = []
+    for k, stage in enumerate(stages):
+        elapsed = attempts[stage].to_numpy()
+        hit = ~np.isnan(elapsed)
+        part = attempts.loc[hit, ['date'] + present]
+        part['stage'] = k
+        part['bucket'] = np.searchsorted(edges, elapsed[hit], side='left')
+        parts.append(part)
+    rows = pd.concat(parts, ignore_index=True)
+    counts = rows.groupby(['date'] + present + ['stage', 'bucket'], observed=True).size()
+    return FunnelPartials(counts.rename('attempts').reset_index(), list(stages), edges, present)
+
+
+def funnel_counts(partials, window=None, breakdown=None, filters=None):
+    """
+    Attempts reaching each stage within `window` (a Timedelta, or None for no
+    limit), optionally per breakdown column, from the partial counts alone.
+    `filters` are Query filters on date or the breakdown columns.
+    Returns stage, visitors (and the breakdown column), in stage order.
+    """
+    filters = dict(filters or {})
+    if window is not None:
+        # Windows are bucket edges; a window between edges rounds down to the last edge within it
+        last_bucket = np.searchsorted(partials.window_edges, window.total_seconds(), side='right') - 1
+        filters['bucket'] = Range(None, last_bucket)
+    by = ([breakdown] if breakdown else []) + ['stage']
+    counts = run_frame_query(partials.counts, Query('funnel_events', measures={'visitors': ('attempts', 'sum')},
+                                                    by=by, filters=filters))
+
+    # Every stage is listed, with zero visitors where no attempt reached it
+    stages = pd.RangeIndex(len(partials.stages), name='stage')
+    full = pd.MultiIndex.from_product([counts[breakdown].unique(), stages], names=by) if breakdown else stages
+    counts = counts.set_index(by)['visitors'].reindex(full, fill_value=0).reset_index()
+    counts['stage'] = pd.Categorical.from_codes(counts['stage'], categories=partials.stages, ordered=True)
+    return counts[by + ['visitors']]
@@ -0,0 +1,373 @@
+"""
+State Geometry - NovaMart
+State boundaries for the geographic maps, read from a local GeoJSON file and
+pre-simplified at several tolerances. Rings are split into arcs where states
+meet, so each shared border is simplified once and neighbours stay gap-free
+at every level. Each level is kept as quantized, delta-encoded int32
+coordinates plus ring/polygon/feature offsets and cached on disk next to the
+table snapshots; a map draws the coarsest level whose error stays under a
+pixel at the view it opens on.
+"""
+
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from data_cache import DATA_DIR, SNAPSHOT_DIR, file_hash
+
+# State boundaries (Polygon/MultiPolygon features), e.g. a datameet or GADM
+# export of India's states; NOVAMART_BOUNDARY_FILE points elsewhere
+BOUNDARY_FILE = Path(os.environ.get('NOVAMART_BOUNDARY_FILE', DATA_DIR / 'india_states.geojson'))
+
+GEOMETRY_CACHE = SNAPSHOT_DIR / 'state_geometry.npz'
+
+# Bump when the encoding changes so cached geometry is rebuilt
+GEOMETRY_VERSION = 1
+
+# Simplification tolerances in degrees, finest first; 0 keeps every vertex
+SIMPLIFY_TOLERANCES = (0.0, 0.005, 0.02, 0.08)
+
+# Coordinates are stored in units of 1 / QUANTIZE_SCALE degrees (about a metre)
+QUANTIZE_SCALE = 100_000
+
+# Map width a level is chosen for, and the simplification error allowed on it in pixels
+MAP_WIDTH_PX = 800
+PIXEL_TOLERANCE = 1.0
+
+# Share of the states' extent left around them when the map is framed
+VIEW_MARGIN = 0.05
+
+# Feature property holding the state name in common India boundary files
+NAME_PROPERTIES = ('ST_NM', 'st_nm', 'NAME_1', 'name', 'state', 'STATE')
+
+# Boundary-file spellings of states, mapped to the names in geographic_data.csv
+STATE_ALIASES = {
+    'NCT of Delhi': 'Delhi',
+    'Delhi (NCT)': 'Delhi',
+    'National Capital Territory of Delhi': 'Delhi',
+    'Orissa': 'Odisha',
+    'Telengana': 'Telangana',
+    'Uttaranchal': 'Uttarakhand',
+    'Pondicherry': 'Puducherry',
+    'Jammu & Kashmir': 'Jammu and Kashmir',
+    'Andaman & Nicobar Island': 'Andaman and Nicobar Islands',
+    'Andaman & Nicobar Islands': 'Andaman and Nicobar Islands'
+}
+
+# One simplification level. coords is one stream of int32 deltas whose running
+# sum gives the quantized points of every ring (unclosed); ring_offsets
+# (rings + 1) index coords, polygon_offsets (polygons + 1) index rings, outer
+# ring first, and feature_offsets (features + 1) index polygons
+ShapeLevel = namedtuple('ShapeLevel', ['tolerance', 'coords', 'ring_offsets', 'polygon_offsets', 'feature_offsets'])
+
+# names: state name per feature; origin: (lon, lat) of quantized zero; bounds:
+# (features, 4) lon_min, lat_min, lon_max, lat_max; levels: finest first
+StateGeometry = namedtuple('StateGeometry', ['names', 'origin', 'bounds', 'levels'])
+
+
+def boundary_version(path=BOUNDARY_FILE):
+    """Cheap identifier of the boundary file, None when there is none"""
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def read_boundaries(path):
+    """{state name: [polygon, ...]} with each polygon a list of (n, 2) lon/lat rings, outer ring first"""
+    with open(path, encoding='utf-8') as fh:
+        collection = json.load(fh)
+    features = collection['features'] if collection.get('type') == 'FeatureCollection' else [collection]
+
+    states = {}
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            continue
+        properties = feature.get('properties') or {}
+        name = next((properties[key] for key in NAME_PROPERTIES if properties.get(key)), feature.get('id'))
+        name = str(name).strip()
+        # A state split over several features is merged into one
+        states.setdefault(STATE_ALIASES.get(name, name), []).extend(
+            [np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon] for polygon in polygons if polygon)
+    return states
+
+
+# ============================================================================
+# SHARED ARCS
+# ============================================================================
+
+def _point_keys(points):
+    """One int64 per quantized point"""
+    return (points[:, 0] << 32) | points[:, 1]
+
+
+def _clean_ring(ring):
+    """Quantized ring without its closing point or repeated vertices"""
+    keep = np.ones(len(ring), dtype=bool)
+    keep[1:] = (ring[1:] != ring[:-1]).any(axis=1)
+    ring = ring[keep]
+    if len(ring) > 1 and (ring[0] == ring[-1]).all():
+        ring = ring[:-1]
+    return ring
+
+
+def _junctions(rings):
+    """
+    Keys of the points where borders meet: points whose pair of neighbours
+    differs between the rings passing through them
+    """
+    points = np.concatenate(rings)
+    previous = np.concatenate([np.roll(ring, 1, axis=0) for ring in rings])
+    following = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+    keys, before, after = _point_keys(points), _point_keys(previous), _point_keys(following)
+    neighbourhoods = np.unique(np.stack([keys, np.minimum(before, after), np.maximum(before, after)], axis=1), axis=0)
+    point_keys, counts = np.unique(neighbourhoods[:, 0], return_counts=True)
+    return point_keys[counts > 1]
+
+
+def _split_arcs(rings, junctions):
+    """
+    Unique arcs of all rings and, per ring, its (arc, reversed) sequence. Arcs
+    run between junctions and include both end points; a border two states
+    share becomes one arc, walked forwards by one and backwards by the other.
+    """
+    arcs, index, ring_arcs = [], {}, []
+    for ring in rings:
+        keys = _point_keys(ring)
+        cuts = np.flatnonzero(np.isin(keys, junctions))
+        if not len(cuts):
+            # A ring meeting no other starts at its smallest point, so a shared copy splits alike
+            cuts = np.array([np.argmin(keys)])
+        ring = np.roll(ring, -cuts[0], axis=0)
+        closed = np.vstack([ring, ring[:1]])
+        ends = list(cuts - cuts[0]) + [len(ring)]
+
+        parts = []
+        for start, stop in zip(ends[:-1], ends[1:]):
+            arc = closed[start:stop + 1]
+            forward, backward = arc.tobytes(), np.ascontiguousarray(arc[::-1]).tobytes()
+            if forward in index:
+                parts.append((index[forward], False))
+            elif backward in index:
+                parts.append((index[backward], True))
+            else:
+                index[forward] = len(arcs)
+                parts.append((len(arcs), False))
+                arcs.append(arc)
+        ring_arcs.append(parts)
+    return arcs, ring_arcs
+
+
+def simplify_arc(arc, tolerance):
+    """Douglas-Peucker simplification of a polyline, keeping both end points"""
+    if tolerance <= 0 or len(arc) < 3:
+        return arc
+    points = arc.astype(np.float64)
+    keep = np.zeros(len(arc), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(arc) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        chord = points[last] - points[first]
+        offsets = points[first + 1:last] - points[first]
+        length = np.hypot(chord[0], chord[1])
+        if length == 0:
+            # A closed arc: distance from its start
+            distance = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distance = np.abs(chord[0] * offsets[:, 1] - chord[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.extend([(first, split), (split, last)])
+    return arc[keep]
+
+
+def _ring_area(ring):
+    x, y = ring[:, 0].astype(np.float64), ring[:, 1].astype(np.float64)
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+# ============================================================================
+# ENCODED LEVELS
+# ============================================================================
+
+def _encode_level(tolerance, arcs, ring_arcs, rings, polygons, features, keep_always):
+    """
+    Simplify every arc once at `tolerance` and reassemble the rings. A ring
+    that collapses is dropped (with its holes, for an outer ring), except each
+    state's largest outer ring, which keeps its full detail.
+    """
+    simplified = [simplify_arc(arc, tolerance * QUANTIZE_SCALE) for arc in arcs]
+    level_rings = []
+    for r, parts in enumerate(ring_arcs):
+        ring = np.concatenate([(simplified[a][::-1] if reverse else simplified[a])[:-1] for a, reverse in parts])
+        if len(ring) < 3 or _ring_area(ring) == 0:
+            ring = rings[r] if r in keep_always else None
+        level_rings.append(ring)
+
+    points, ring_offsets, polygon_offsets, feature_offsets = [], [0], [0], [0]
+    for feature_polygons in features:
+        for polygon in feature_polygons:
+            kept = [level_rings[r] for r in polygons[polygon]]
+            if kept[0] is None:
+                continue
+            for ring in (ring for ring in kept if ring is not None):
+                points.append(ring)
+                ring_offsets.append(ring_offsets[-1] + len(ring))
+            polygon_offsets.append(len(ring_offsets) - 1)
+        feature_offsets.append(len(polygon_offsets) - 1)
+
+    points = np.concatenate(points) if points else np.zeros((0, 2), dtype=np.int64)
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).astype(np.int32)
+    return ShapeLevel(tolerance, deltas, np.asarray(ring_offsets, dtype=np.int64),
+                      np.asarray(polygon_offsets, dtype=np.int64), np.asarray(feature_offsets, dtype=np.int64))
+
+
+def build_geometry(path=BOUNDARY_FILE, tolerances=SIMPLIFY_TOLERANCES):
+    """Read a boundary file and encode it at every tolerance"""
+    states = read_boundaries(path)
+    names = list(states)
+    all_points = np.concatenate([ring for polygons in states.values() for polygon in polygons for ring in polygon])
+    origin = np.floor(all_points.min(axis=0))
+
+    # Flatten to rings, remembering which polygon and state each belongs to
+    rings, polygons, features, keep_always, bounds = [], [], [], set(), []
+    for name in names:
+        feature_polygons, largest = [], (-1.0, None)
+        for polygon in states[name]:
+            ring_ids = []
+            for ring in polygon:
+                ring = _clean_ring(np.round((ring - origin) * QUANTIZE_SCALE).astype(np.int64))
+                if len(ring) >= 3:
+                    ring_ids.append(len(rings))
+                    rings.append(ring)
+                elif not ring_ids:
+                    break
+            if ring_ids:
+                area = _ring_area(rings[ring_ids[0]])
+                largest = max(largest, (area, ring_ids[0]), key=lambda item: item[0])
+                feature_polygons.append(len(polygons))
+                polygons.append(ring_ids)
+        if largest[1] is not None:
+            keep_always.add(largest[1])
+        features.append(feature_polygons)
+        state_points = np.concatenate([ring for polygon in states[name] for ring in polygon])
+        bounds.append(np.concatenate([state_points.min(axis=0), state_points.max(axis=0)]))
+
+    arcs, ring_arcs = _split_arcs(rings, _junctions(rings)) if rings else ([], [])
+    levels = [_encode_level(tolerance, arcs, ring_arcs, rings, polygons, features, keep_always)
+              for tolerance in sorted(tolerances)]
+    return StateGeometry(names, origin, np.asarray(bounds).reshape(-1, 4), levels)
+
+
+def _cache_key(path, tolerances):
+    return f"{GEOMETRY_VERSION}:{file_hash(path)}:{','.join(str(t) for t in sorted(tolerances))}"
+
+
+def _save_geometry(geometry, key, cache_path):
+    arrays = {'key': np.array(key), 'names': np.array(geometry.names, dtype=str),
+              'origin': geometry.origin, 'bounds': geometry.bounds}
+    for i, level in enumerate(geometry.levels):
+        arrays[f'tolerance_{i}'] = np.array(level.tolerance)
+        arrays[f'coords_{i}'] = level.coords
+        arrays[f'rings_{i}'] = level.ring_offsets
+        arrays[f'polygons_{i}'] = level.polygon_offsets
+        arrays[f'features_{i}'] = level.feature_offsets
+    cache_path.parent.mkdir(exist_ok=True)
+    tmp_path = cache_path.with_suffix('.npz.tmp')
+    with open(tmp_path, 'wb') as fh:
+        np.savez_compressed(fh, **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+def _read_geometry(key, cache_path):
+    """Cached geometry if it was encoded from the same file and tolerances, else None"""
+    try:
+        with np.load(cache_path, allow_pickle=False) as cached:
+            if str(cached['key']) != key:
+                return None
+            n_levels = sum(name.startswith('coords_') for name in cached.files)
+            levels = [ShapeLevel(float(cached[f'tolerance_{i}']), cached[f'coords_{i}'], cached[f'rings_{i}'],
+                                 cached[f'polygons_{i}'], cached[f'features_{i}']) for i in range(n_levels)]
+            return StateGeometry(cached['names'].tolist(), cached['origin'], cached['bounds'], levels)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def load_geometry(path=BOUNDARY_FILE, tolerances=SIMPLIFY_TOLERANCES, cache_path=GEOMETRY_CACHE):
+    """
+    StateGeometry of a boundary file, from its encoded cache when current;
+    None when there is no boundary file
+    """
+    if not path.exists():
+        return None
+    key = _cache_key(path, tolerances)
+    geometry = _read_geometry(key, cache_path)
+    if geometry is None:
+        geometry = build_geometry(path, tolerances)
+        _save_geometry(geometry, key, cache_path)
+    return geometry
+
+
+# ============================================================================
+# MAP VIEWS
+# ============================================================================
+
+def view_bounds(geometry, states=None, margin=VIEW_MARGIN):
+    """
+    (lon_min, lat_min, lon_max, lat_max) around the given states, or every
+    state, padded by `margin` of the span on each side. The map is framed on
+    these bounds, so the level picked for them is the one its view needs.
+    """
+    rows = np.isin(geometry.names, list(states)) if states is not None else np.ones(len(geometry.names), dtype=bool)
+    if not rows.any():
+        rows[:] = True
+    bounds = geometry.bounds[rows]
+    low, high = bounds[:, :2].min(axis=0), bounds[:, 2:].max(axis=0)
+    pad = (high - low) * margin
+    return np.concatenate([low - pad, high + pad])
+
+
+def zoom_for_bounds(bounds, width_px=MAP_WIDTH_PX):
+    """Web-map zoom level at which `bounds` spans `width_px` pixels"""
+    span = max(bounds[2] - bounds[0], bounds[3] - bounds[1], 1e-6)
+    return float(np.log2(width_px * 360 / (256 * span)))
+
+
+def level_for_zoom(geometry, zoom):
+    """Index of the coarsest level whose tolerance stays within PIXEL_TOLERANCE pixels at `zoom`"""
+    pixel_degrees = 360 / (256 * 2 ** zoom)
+    fitting = [i for i, level in enumerate(geometry.levels) if level.tolerance <= pixel_degrees * PIXEL_TOLERANCE]
+    return max(fitting, key=lambda i: geometry.levels[i].tolerance) if fitting else 0
+
+
+def level_geojson(geometry, level):
+    """One level decoded to a GeoJSON FeatureCollection whose feature ids are the state names"""
+    shape = geometry.levels[level]
+    points = np.cumsum(shape.coords, axis=0, dtype=np.int64) / QUANTIZE_SCALE + geometry.origin
+    points = points.round(5)
+
+    features = []
+    for f, name in enumerate(geometry.names):
+        polygons = []
+        for p in range(shape.feature_offsets[f], shape.feature_offsets[f + 1]):
+            rings = []
+            for r in range(shape.polygon_offsets[p], shape.polygon_offsets[p + 1]):
+                ring = points[shape.ring_offsets[r]:shape.ring_offsets[r + 1]]
+                rings.append(np.vstack([ring, ring[:1]]).tolist())
+            polygons.append(rings)
+        features.append({'type': 'Feature', 'id': name, 'properties': {'name': name},
+                         'geometry': {'type': 'MultiPolygon', 'coordinates': polygons}})
+    return {'type': 'FeatureCollection', 'features': features}
@@ -0,0 +1,125 @@
+"""
+Incremental Append Ingestion - NovaMart
+Keeps an append-only table and its derived aggregates in memory and folds in
+only the rows appended to the CSV since the last refresh. Tables too large
+for the memory budget are streamed: aggregates are built chunk by chunk and
+the raw rows are never held in memory.
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+from data_cache import (concat_frames, estimate_frame_bytes, estimate_row_bytes, file_hash, is_append,
+                        iter_csv_chunks, load_table_with_offset, read_appended_rows, source_path)
+
+# Memory budget for one table, overridable per deployment
+MEMORY_BUDGET_BYTES = int(os.environ.get('NOVAMART_MEMORY_BUDGET_MB', '1024')) * 2**20
+
+# Share of the budget given to a single parsed chunk; the rest covers parser
+# buffers, groupby temporaries and the aggregates themselves
+CHUNK_BUDGET_SHARE = 0.25
+MIN_CHUNK_ROWS = 1000
+
+# Immutable view of the table at one point; swapped atomically on refresh so
+# readers never see a frame from one version with aggregates from another.
+# In streaming mode `frame` is a zero-row frame carrying only the schema.
+IngestState = namedtuple('IngestState',
+                         ['frame', 'derived', 'offset', 'fingerprint', 'mtime_ns', 'version', 'streamed'])
+
+
+class AppendOnlyTable:
+    """
+    In-memory append-only table.
+    `aggregates` maps a name to a (build, fold) pair: build(frame) computes
+    the aggregate from scratch and fold(aggregate, new_rows) updates it with
+    more rows. refresh() folds appends and only rebuilds everything when the
+    file changed in any other way. A rebuild whose parsed size would exceed
+    `memory_budget` bytes streams the file through build/fold instead.
+    """
+
+    def __init__(self, key, aggregates=None, memory_budget=MEMORY_BUDGET_BYTES):
+        self.key = key
+        self.aggregates = aggregates or {}
+        self.memory_budget = memory_budget
+        self.state = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Bring the table up to date with its CSV; returns 'unchanged', 'appended' or 'rebuilt'"""
+        source = source_path(self.key)
+        with self._lock:
+            state = self.state
+            stat = source.stat()
+            if state is not None and stat.st_mtime_ns == state.mtime_ns and stat.st_size == state.offset:
+                return 'unchanged'
+
+            if state is not None and is_append(source, state.offset, state.fingerprint):
+                new_rows, offset = read_appended_rows(self.key, source, state.offset)
+                if new_rows.empty:
+                    return 'unchanged'
+                frame = state.frame if state.streamed else concat_frames(state.frame, new_rows)
+                derived = self._fold(state.derived, new_rows)
+                streamed = state.streamed
+                status = 'appended'
+            elif self.memory_budget and estimate_frame_bytes(self.key, source) > self.memory_budget:
+                frame, derived, offset = self._rebuild_streaming(source, stat.st_size)
+                streamed = True
+                status = 'rebuilt'
+            else:
+                frame, offset = load_table_with_offset(self.key)
+                derived = self._build(frame)
+                streamed = False
+                status = 'rebuilt'
+
+            self.state = IngestState(
+                frame=frame,
+                derived=derived,
+                offset=offset,
+                fingerprint=file_hash(source, offset),
+                mtime_ns=stat.st_mtime_ns,
+                version=(state.version + 1) if state is not None else 1,
+                streamed=streamed
+            )
+            return status
+
+    def _build(self, frame):
+        return {name: build(frame) for name, (build, _) in self.aggregates.items()}
+
+    def _fold(self, derived, new_rows):
+        return {name: fold(derived[name], new_rows) for name, (_, fold) in self.aggregates.items()}
+
+    def chunk_rows(self, source):
+        """Rows per chunk so one parsed chunk stays within its share of the budget"""
+        _, row_bytes = estimate_row_bytes(self.key, source)
+        return max(MIN_CHUNK_ROWS, int(self.memory_budget * CHUNK_BUDGET_SHARE / row_bytes))
+
+    def _rebuild_streaming(self, source, size):
+        """
+        Build every aggregate chunk by chunk without materializing the table,
+        from exactly the first `size` bytes so rows appended meanwhile are
+        folded in by the next refresh rather than counted twice
+        """
+        schema, derived = None, None
+        for chunk in iter_csv_chunks(self.key, source, self.chunk_rows(source), size=size):
+            if derived is None:
+                schema, derived = chunk.head(0), self._build(chunk)
+            else:
+                derived = self._fold(derived, chunk)
+
+        if derived is None:
+            frame, size = load_table_with_offset(self.key)
+            return frame, self._build(frame), size
+        return schema, derived, size
+
+    @property
+    def frame(self):
+        return self.state.frame
+
+    @property
+    def derived(self):
+        return self.state.derived
+
+    @property
+    def streamed(self):
+        return self.state.streamed
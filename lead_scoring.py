@@ -0,0 +1,248 @@
+"""
+Lead Scoring Evaluation - NovaMart
+Threshold metrics for the lead scoring model from a single sort of the
+predicted probabilities: cumulative true/false positive counts at every
+distinct score make the confusion matrix, precision/recall, lift and gain at
+any threshold a binary search, and give the ROC and precision-recall curves.
+Bootstrap confidence intervals resample in vectorized batches once per data
+version, keeping each resample's counts at every threshold of a grid, so a
+threshold change only reads percentiles off the stored counts.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_LEVEL = 0.95
+
+# Resamples are drawn in fixed-size jobs, each from its own child of the
+# seed, so intervals depend only on the seed and not on how jobs are spread
+# over worker processes (NOVAMART_BOOTSTRAP_WORKERS; 0 or 1 runs in-process)
+BOOTSTRAP_JOB_SIZE = 100
+BOOTSTRAP_WORKERS = int(os.environ.get('NOVAMART_BOOTSTRAP_WORKERS', '0'))
+
+# Cap on resamples x rows per index matrix, which bounds a batch's memory
+BOOTSTRAP_BATCH_ELEMENTS = 1 << 22
+
+BOOTSTRAP_METRICS = ['auc', 'accuracy', 'precision', 'recall', 'f1']
+
+# Spacing of the thresholds bootstrap counts are kept at; the ML page's
+# threshold slider moves in the same steps
+THRESHOLD_STEP = 0.01
+
+# Per-resample counts at each of `thresholds`: tp/fp are (resamples x
+# thresholds) positives/negatives scored at or above the threshold, and
+# positives/negatives/auc one value per resample of `rows` rows
+BootstrapResamples = namedtuple('BootstrapResamples',
+                                ['thresholds', 'tp', 'fp', 'positives', 'negatives', 'auc', 'rows'])
+
+# Distinct scores in descending order; tp[i] and fp[i] count the positives and
+# negatives scored at or above thresholds[i], i.e. predicted positive there
+ScoreCurve = namedtuple('ScoreCurve', ['thresholds', 'tp', 'fp', 'positives', 'negatives'])
+
+
+def score_curve(actual, scores):
+    """Build a ScoreCurve from 0/1 outcomes and model scores; rows with a missing score are dropped"""
+    scores = np.asarray(scores, dtype=np.float64)
+    actual = np.asarray(actual)
+    valid = ~np.isnan(scores)
+    scores, actual = scores[valid], actual[valid].astype(bool)
+
+    order = np.argsort(-scores, kind='stable')
+    scores, actual = scores[order], actual[order]
+    tp = np.cumsum(actual, dtype=np.int64)
+    fp = np.arange(1, len(scores) + 1, dtype=np.int64) - tp
+
+    # Ties share one threshold, so keep the last row of each run of equal scores
+    last = np.append(np.flatnonzero(scores[1:] != scores[:-1]), len(scores) - 1) if len(scores) else []
+    positives = int(tp[-1]) if len(tp) else 0
+    return ScoreCurve(scores[last], tp[last], fp[last], positives, len(scores) - positives)
+
+
+def counts_at(curve, threshold):
+    """(tn, fp, fn, tp) when every score >= threshold is predicted positive"""
+    k = np.searchsorted(-curve.thresholds, -threshold, side='right')
+    tp = int(curve.tp[k - 1]) if k else 0
+    fp = int(curve.fp[k - 1]) if k else 0
+    return curve.negatives - fp, fp, curve.positives - tp, tp
+
+
+def _ratio(num, den):
+    return num / den if den else 0.0
+
+
+def metrics_at(curve, threshold):
+    """
+    Confusion counts and classification metrics at one threshold.
+    gain is the share of all converters among the flagged leads (= recall),
+    lift how many times the base conversion rate the flagged leads convert at
+    """
+    tn, fp, fn, tp = counts_at(curve, threshold)
+    total = tn + fp + fn + tp
+    precision = _ratio(tp, tp + fp)
+    recall = _ratio(tp, tp + fn)
+    return {
+        'tn': tn, 'fp': fp, 'fn': fn, 'tp': tp,
+        'accuracy': _ratio(tp + tn, total),
+        'precision': precision,
+        'recall': recall,
+        'f1': _ratio(2 * precision * recall, precision + recall),
+        'flagged': _ratio(tp + fp, total),
+        'gain': recall,
+        'lift': _ratio(precision, _ratio(curve.positives, total))
+    }
+
+
+def roc_points(curve):
+    """False/true positive rates at every threshold, starting at (0, 0), with their thresholds"""
+    return pd.DataFrame({
+        'fpr': np.append(0.0, curve.fp / max(curve.negatives, 1)),
+        'tpr': np.append(0.0, curve.tp / max(curve.positives, 1)),
+        'threshold': np.append(np.inf, curve.thresholds)
+    })
+
+
+def pr_points(curve):
+    """Recall/precision at every threshold, starting at (0, 1), with their thresholds"""
+    return pd.DataFrame({
+        'recall': np.append(0.0, curve.tp / max(curve.positives, 1)),
+        'precision': np.append(1.0, curve.tp / np.maximum(curve.tp + curve.fp, 1)),
+        'threshold': np.append(np.inf, curve.thresholds)
+    })
+
+
+def roc_auc(curve):
+    """Area under the ROC curve by the trapezoid rule over every distinct threshold"""
+    roc = roc_points(curve)
+    fpr, tpr = roc['fpr'].to_numpy(), roc['tpr'].to_numpy()
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+
+def average_precision(curve):
+    """Precision averaged over recall steps (the step-wise area under the PR curve)"""
+    pr = pr_points(curve)
+    return float(np.sum(np.diff(pr['recall'].to_numpy()) * pr['precision'].to_numpy()[1:]))
+
+
+# ============================================================================
+# BOOTSTRAP CONFIDENCE INTERVALS
+# ============================================================================
+
+def _sorted_scores(actual, scores):
+    """Outcomes in ascending score order, the start of each run of tied scores and its score"""
+    scores = np.asarray(scores, dtype=np.float64)
+    actual = np.asarray(actual)
+    valid = ~np.isnan(scores)
+    scores, actual = scores[valid], actual[valid].astype(np.int64)
+    order = np.argsort(scores, kind='stable')
+    scores, actual = scores[order], actual[order]
+    starts = np.append(0, np.flatnonzero(scores[1:] != scores[:-1]) + 1) if len(scores) else np.zeros(0, np.int64)
+    return actual, starts, scores[starts]
+
+
+def _safe_divide(num, den):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den > 0, num / np.where(den > 0, den, 1), np.nan)
+
+
+def threshold_grid(step=THRESHOLD_STEP):
+    """Thresholds from 0 to 1 in `step` increments, rounded so they equal the slider's values"""
+    return np.round(np.arange(0, 1 + step / 2, step), 10)
+
+
+def _resample_counts(actual, starts, group_scores, thresholds, n_resamples, seed):
+    """
+    Counts for n_resamples bootstrap resamples, in batches: a (batch x n)
+    matrix of row indexes becomes per-row resample counts, summed per tie
+    group. Cumulative sums over the groups give the confusion counts at every
+    threshold, and AUC (Mann-Whitney, ties counted half) follows with no
+    per-resample sort.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(actual)
+    cuts = np.searchsorted(group_scores, thresholds, side='left')
+    batch = max(1, min(n_resamples, BOOTSTRAP_BATCH_ELEMENTS // max(n, 1)))
+    parts = {name: [] for name in ('tp', 'fp', 'positives', 'negatives', 'auc')}
+
+    for first in range(0, n_resamples, batch):
+        size = min(batch, n_resamples - first)
+        rows = rng.integers(0, n, size=(size, n)) + (np.arange(size) * n)[:, None]
+        counts = np.bincount(rows.ravel(), minlength=size * n).reshape(size, n)
+        pos = np.add.reduceat(counts * actual, starts, axis=1)
+        neg = np.add.reduceat(counts, starts, axis=1) - pos
+        positives, negatives = pos.sum(axis=1), neg.sum(axis=1)
+
+        # Counts scored below each tie group, with a leading zero column
+        pos_below = np.concatenate([np.zeros((size, 1), np.int64), np.cumsum(pos, axis=1)], axis=1)
+        neg_below = np.concatenate([np.zeros((size, 1), np.int64), np.cumsum(neg, axis=1)], axis=1)
+        parts['auc'].append(_safe_divide((pos * (neg_below[:, :-1] + 0.5 * neg)).sum(axis=1),
+                                         positives * negatives))
+        parts['tp'].append((positives[:, None] - pos_below[:, cuts]).astype(np.int32))
+        parts['fp'].append((negatives[:, None] - neg_below[:, cuts]).astype(np.int32))
+        parts['positives'].append(positives)
+        parts['negatives'].append(negatives)
+
+    return {name: np.concatenate(values) for name, values in parts.items()}
+
+
+def bootstrap_resamples(actual, scores, thresholds=None, n_resamples=BOOTSTRAP_RESAMPLES, seed=0,
+                        workers=BOOTSTRAP_WORKERS):
+    """
+    Draw the bootstrap resamples once and keep their counts at every one of
+    `thresholds` (threshold_grid() by default). The data is sorted once;
+    resamples run in seeded jobs, fanned out over `workers` processes when
+    more than one is given.
+    """
+    thresholds = threshold_grid() if thresholds is None else np.asarray(thresholds, dtype=np.float64)
+    actual, starts, group_scores = _sorted_scores(actual, scores)
+    n_jobs = -(-n_resamples // BOOTSTRAP_JOB_SIZE)
+    sizes = [min(BOOTSTRAP_JOB_SIZE, n_resamples - i * BOOTSTRAP_JOB_SIZE) for i in range(n_jobs)]
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+    jobs = [(actual, starts, group_scores, thresholds, size, job_seed) for size, job_seed in zip(sizes, seeds)]
+
+    if workers and workers > 1 and n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, n_jobs)) as pool:
+            parts = list(pool.map(_resample_counts, *zip(*jobs)))
+    else:
+        parts = [_resample_counts(*job) for job in jobs]
+
+    merged = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    return BootstrapResamples(thresholds, rows=len(actual), **merged)
+
+
+def resample_intervals(resamples, threshold, level=BOOTSTRAP_LEVEL):
+    """
+    Percentile intervals for AUC and the classification metrics at the
+    stored threshold nearest `threshold`, as a frame indexed by metric with
+    low/high bounds
+    """
+    j = int(np.abs(resamples.thresholds - threshold).argmin()) if len(resamples.thresholds) else 0
+    tp, fp = resamples.tp[:, j].astype(np.int64), resamples.fp[:, j].astype(np.int64)
+    precision = _safe_divide(tp, tp + fp)
+    recall = _safe_divide(tp, resamples.positives)
+    values = {
+        'auc': resamples.auc,
+        'accuracy': (tp + resamples.negatives - fp) / max(resamples.rows, 1),
+        'precision': precision,
+        'recall': recall,
+        'f1': _safe_divide(2 * precision * recall, precision + recall)
+    }
+
+    tail = (1 - level) / 2 * 100
+    rows = {}
+    for metric in BOOTSTRAP_METRICS:
+        metric_values = values[metric][~np.isnan(values[metric])]
+        low, high = np.percentile(metric_values, [tail, 100 - tail]) if len(metric_values) else (np.nan, np.nan)
+        rows[metric] = {'low': low, 'high': high}
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def bootstrap_intervals(actual, scores, threshold, n_resamples=BOOTSTRAP_RESAMPLES, level=BOOTSTRAP_LEVEL,
+                        seed=0, workers=BOOTSTRAP_WORKERS):
+    """Percentile bootstrap intervals at a single threshold (see bootstrap_resamples)"""
+    resamples = bootstrap_resamples(actual, scores, [threshold], n_resamples, seed, workers)
+    return resample_intervals(resamples, threshold, level)
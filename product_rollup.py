@@ -0,0 +1,247 @@
+"""
+Product Rollup - NovaMart
+Category -> subcategory -> product hierarchy over product_sales, aggregated
+once per table version into one dense array per level: node x region x
+quarter x measure. Quarters hold running totals, so any run of quarters is
+one subtraction, and an extra region slot holds the all-region totals, so the
+unfiltered view sums nothing. The category and subcategory levels are a few
+dozen nodes whatever the SKU count; top-k products is one argpartition over
+the leaf totals.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+ROLLUP_LEVELS = ['category', 'subcategory', 'product_name']
+ROLLUP_MEASURES = ['sales', 'units_sold', 'profit']
+
+# Units returned (units_sold x return_rate%, derived at parse time in data_cache)
+# are summed so return rates roll up weighted by units
+RETURNED_UNITS = 'returned_units'
+
+ROLLUP_DIMENSIONS = ['region', 'quarter']
+
+# Columns a product table needs for a rollup
+REQUIRED_COLUMNS = ROLLUP_LEVELS + ROLLUP_DIMENSIONS + ['sales']
+
+# nodes[k]: the ROLLUP_LEVELS[:k + 1] labels of each level-k node, in sorted order
+# parents[k]: position in level k - 1 of each level-k node's parent (None for k = 0)
+# sums[k]: (nodes, regions + 1, quarters + 1, measures) running totals over the
+#     quarters in calendar order, starting from zero; the last region slot is
+#     the sum over all regions
+ProductRollup = namedtuple('ProductRollup', ['nodes', 'parents', 'sums', 'regions', 'quarters', 'measures'])
+
+
+def _quarter_key(label):
+    """Sort key of a 'Q1 2023' label: year first, then quarter"""
+    quarter, _, year = str(label).partition(' ')
+    return year, quarter
+
+
+def _level_starts(keys, columns):
+    """Positions in the sorted leaf keys where the values of `columns` change"""
+    changed = keys[columns].ne(keys[columns].shift()).any(axis=1).to_numpy(copy=True)
+    changed[:1] = True
+    return np.flatnonzero(changed)
+
+
+def build_rollup(df):
+    """
+    Aggregate product rows into a ProductRollup: raw rows, or the per
+    product x region x quarter sums of queries.product_cells. Rows missing a
+    hierarchy, region or quarter label are left out.
+    """
+    measures = [col for col in ROLLUP_MEASURES + [RETURNED_UNITS] if col in df.columns]
+    values = df[measures].to_numpy(np.float64, na_value=0.0)
+
+    complete = df[ROLLUP_LEVELS + ROLLUP_DIMENSIONS].notna().all(axis=1).to_numpy()
+    df, values = df[complete], values[complete]
+
+    grouped = df.groupby(ROLLUP_LEVELS, observed=True, sort=True)
+    leaf = grouped.ngroup().to_numpy(np.int64)
+    leaf_keys = grouped.size().index.to_frame(index=False)
+    region, regions = pd.factorize(df['region'], sort=True)
+    quarters = sorted(pd.unique(df['quarter']), key=_quarter_key)
+    quarter = pd.Index(quarters).get_indexer(df['quarter'])
+
+    n_leaves, n_regions, n_quarters, n_measures = len(leaf_keys), len(regions), len(quarters), len(measures)
+    cell = (leaf * n_regions + region) * n_quarters + quarter
+    size = n_leaves * n_regions * n_quarters
+    cells = np.stack([np.bincount(cell, weights=values[:, m], minlength=size) for m in range(n_measures)], axis=-1)
+    cells = cells.reshape(n_leaves, n_regions, n_quarters, n_measures)
+
+    leaf_sums = np.zeros((n_leaves, n_regions + 1, n_quarters + 1, n_measures))
+    leaf_sums[:, :n_regions, 1:] = cells.cumsum(axis=2)
+    leaf_sums[:, n_regions] = leaf_sums[:, :n_regions].sum(axis=1)
+
+    # Leaves are sorted by the full hierarchy, so every node's leaves are contiguous
+    nodes, parents, sums, previous = [], [], [], None
+    for k in range(len(ROLLUP_LEVELS)):
+        starts = _level_starts(leaf_keys, ROLLUP_LEVELS[:k + 1]) if n_leaves else np.zeros(0, dtype=np.int64)
+        nodes.append(leaf_keys.iloc[starts, :k + 1].reset_index(drop=True))
+        parents.append(None if previous is None else np.searchsorted(previous, starts, side='right') - 1)
+        sums.append(np.add.reduceat(leaf_sums, starts, axis=0) if n_leaves else leaf_sums)
+        previous = starts
+    return ProductRollup(nodes, parents, sums, pd.Index(regions), pd.Index(quarters), measures)
+
+
+# ============================================================================
+# LOOKUPS
+# ============================================================================
+
+def _quarter_runs(rollup, quarters):
+    """[start, stop) runs of consecutive quarter positions selected by a list of labels (all when None)"""
+    if not quarters:
+        return [(0, len(rollup.quarters))]
+    positions = np.unique(rollup.quarters.get_indexer(list(quarters)))
+    positions = positions[positions >= 0]
+    breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+    return [(run[0], run[-1] + 1) for run in np.split(positions, breaks) if len(run)]
+
+
+def _region_slots(rollup, regions):
+    if not regions:
+        return [len(rollup.regions)]
+    slots = rollup.regions.get_indexer(list(regions))
+    return slots[slots >= 0]
+
+
+def level_totals(rollup, level, filters=None):
+    """
+    (nodes, measures) totals of one hierarchy level under Query-style
+    filters on region and quarter (lists of labels); other filters are ignored
+    """
+    filters = filters or {}
+    sums = rollup.sums[level]
+    slots = _region_slots(rollup, filters.get('region'))
+    totals = np.zeros((sums.shape[0], sums.shape[3]))
+    for start, stop in _quarter_runs(rollup, filters.get('quarter')):
+        totals += (sums[:, slots, stop] - sums[:, slots, start]).sum(axis=1)
+    return totals
+
+
+def ancestors(rollup, level, ancestor_level):
+    """Position in `ancestor_level` of every node of `level`"""
+    positions = np.arange(len(rollup.nodes[level]))
+    for k in range(level, ancestor_level, -1):
+        positions = rollup.parents[k][positions]
+    return positions
+
+
+def rollup_frame(rollup, level, totals, rows=None):
+    """Labels and measures of the level's nodes at `rows` (all when None), with the unit-weighted return rate"""
+    rows = np.arange(len(totals)) if rows is None else rows
+    frame = rollup.nodes[level].iloc[rows].reset_index(drop=True)
+    for m, measure in enumerate(rollup.measures):
+        if measure != RETURNED_UNITS:
+            frame[measure] = totals[rows, m]
+    if RETURNED_UNITS in rollup.measures:
+        units = totals[rows, rollup.measures.index('units_sold')]
+        returned = totals[rows, rollup.measures.index(RETURNED_UNITS)]
+        frame['return_rate'] = np.divide(returned * 100, units, out=np.full(len(rows), np.nan), where=units > 0)
+    return frame
+
+
+def node_measures(rollup):
+    """Measures rollup_frame reports: the summed ones plus return_rate when returns are known"""
+    summed = [measure for measure in rollup.measures if measure != RETURNED_UNITS]
+    return summed + (['return_rate'] if RETURNED_UNITS in rollup.measures else [])
+
+
+def _scores(rollup, totals, measure):
+    if measure == 'return_rate':
+        units = totals[:, rollup.measures.index('units_sold')]
+        returned = totals[:, rollup.measures.index(RETURNED_UNITS)]
+        return np.divide(returned * 100, units, out=np.full(len(totals), -np.inf), where=units > 0)
+    return totals[:, rollup.measures.index(measure)]
+
+
+def top_k(rollup, k, measure='sales', level=len(ROLLUP_LEVELS) - 1, filters=None, categories=None):
+    """
+    The k nodes of a level with the highest `measure` (a rollup measure or
+    'return_rate'), best first, optionally only under the given categories.
+    Selection is an argpartition, so only the k winners are sorted.
+    """
+    totals = level_totals(rollup, level, filters)
+    scores = _scores(rollup, totals, measure)
+    candidates = np.arange(len(totals))
+    if categories:
+        wanted = rollup.nodes[0]['category'].isin(list(categories)).to_numpy()
+        candidates = candidates[wanted[ancestors(rollup, level, 0)]]
+    if k < len(candidates):
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    rows = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return rollup_frame(rollup, level, totals, rows)
+
+
+def _node_ids(frame, columns):
+    """'/'-joined labels of `columns` per row: the id of a node in a hierarchy figure"""
+    if not columns:
+        return pd.Series('', index=frame.index)
+    ids = frame[columns[0]].astype(str)
+    for col in columns[1:]:
+        ids = ids + '/' + frame[col].astype(str)
+    return ids
+
+
+def node_labels(frame, columns=ROLLUP_LEVELS):
+    """
+    Axis label per row: the last of `columns`, qualified by its parent (then
+    its whole path) where that name repeats in the frame, so nodes sharing a
+    name, like 'Footwear' under two subcategories, never merge into one bar
+    """
+    names = frame[columns[-1]].astype(str)
+    labels = names
+    for depth in range(len(columns) - 2, -1, -1):
+        repeated = labels.duplicated(keep=False)
+        if not repeated.any():
+            break
+        labels = labels.where(~repeated, names + ' (' + _node_ids(frame, columns[depth:-1]) + ')')
+    return labels
+
+
+def hierarchy_frame(rollup, measure='sales', filters=None, max_products=100):
+    """
+    Nodes for a treemap or sunburst sized by a non-negative `measure`: every
+    category and subcategory, the `max_products` largest products, and per
+    subcategory one 'Other' node holding the rest, so the figure stays the
+    same size however many SKUs there are. Columns: id, parent, label plus
+    the measures and return_rate of each node; parents sum their children.
+    """
+    leaf_level = len(ROLLUP_LEVELS) - 1
+    m = rollup.measures.index(measure)
+    totals = [level_totals(rollup, level, filters) for level in range(len(ROLLUP_LEVELS))]
+    leaf_scores = totals[leaf_level][:, m]
+    shown = np.flatnonzero(leaf_scores > 0)
+    if max_products < len(shown):
+        shown = shown[np.argpartition(-leaf_scores[shown], max_products - 1)[:max_products]]
+
+    parts = []
+    for level in range(len(ROLLUP_LEVELS)):
+        rows = shown if level == leaf_level else np.flatnonzero(totals[level][:, m] > 0)
+        part = rollup_frame(rollup, level, totals[level], rows)
+        part['id'] = _node_ids(part, ROLLUP_LEVELS[:level + 1])
+        part['parent'] = _node_ids(part, ROLLUP_LEVELS[:level])
+        part['label'] = part[ROLLUP_LEVELS[level]].astype(str)
+        parts.append(part)
+
+    # What the hidden products add up to, per subcategory
+    subcategory_of = rollup.parents[leaf_level]
+    n_subcategories = len(rollup.nodes[leaf_level - 1])
+    hidden = totals[leaf_level - 1] - np.stack([
+        np.bincount(subcategory_of[shown], weights=totals[leaf_level][shown, i], minlength=n_subcategories)
+        for i in range(len(rollup.measures))], axis=-1)
+    counts = np.bincount(subcategory_of, weights=leaf_scores > 0, minlength=n_subcategories) - \
+        np.bincount(subcategory_of[shown], minlength=n_subcategories)
+    rest = np.flatnonzero((counts > 0) & (hidden[:, m] > 0))
+    if len(rest):
+        other = rollup_frame(rollup, leaf_level - 1, hidden, rest)
+        other['parent'] = _node_ids(other, ROLLUP_LEVELS[:leaf_level])
+        other['id'] = other['parent'] + '/~other'
+        other['label'] = [f"Other ({int(n)} products)" for n in counts[rest]]
+        parts.append(other)
+
+    columns = ['id', 'parent', 'label'] + [col for col in parts[0].columns if col in ROLLUP_MEASURES + ['return_rate']]
+    return pd.concat(parts, ignore_index=True)[columns]
@@ -0,0 +1,171 @@
+"""
+Section Profiling - NovaMart
+Times every chart section of a page run, broken into phases (data, figure,
+serialize, render), with rows processed, figure JSON size and memory delta.
+Each run is appended to a local JSON-lines log for p50/p95 across sessions.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+METRICS_LOG = Path(os.environ.get('NOVAMART_METRICS_LOG',
+                                  Path(__file__).parent / '.metrics' / 'sections.jsonl')).absolute()
+
+# Once the log grows past this it is rotated to `<name>.1`, keeping one old generation
+METRICS_LOG_MAX_BYTES = 20 * 2**20
+
+# Detailed profiling also serializes each figure once more to measure its JSON size
+PROFILE_ENABLED = os.environ.get('NOVAMART_PROFILE', '0') == '1'
+
+_log_lock = threading.Lock()
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Section:
+    """
+    Measurements for one page section. Time is attributed to the current
+    phase until the next phase() call; chart() adds serialize and render,
+    and anything drawn after the chart counts as render too.
+    The memory delta is the change in process RSS, so with several sessions
+    rendering at once it includes their allocations too.
+    """
+
+    def __init__(self, page, name, detailed):
+        self.page = page
+        self.name = name
+        self.detailed = detailed
+        self.phases = {}
+        self.row_count = None
+        self.figure_bytes = None
+        self.cache_hit = None
+        self.error = None
+        self._phase = 'data'
+        self._mark = time.perf_counter()
+        self._start = self._mark
+        self._rss_start = current_rss_bytes()
+
+    def phase(self, name):
+        """Close the current phase and start timing `name`"""
+        now = time.perf_counter()
+        self.phases[self._phase] = self.phases.get(self._phase, 0.0) + now - self._mark
+        self._phase, self._mark = name, now
+
+    def rows(self, n):
+        """Record how many rows the section processed"""
+        self.row_count = (self.row_count or 0) + int(n)
+
+    def chart(self, fig, container=None, **kwargs):
+        """
+        st.plotly_chart with the serialize (detailed mode only) and render
+        phases timed; `fig` may be a Figure or a figure dict
+        """
+        import streamlit as st
+        if self.detailed:
+            self.phase('serialize')
+            spec = json.dumps(fig) if isinstance(fig, dict) else fig.to_json()
+            self.figure_bytes = (self.figure_bytes or 0) + len(spec)
+        self.phase('render')
+        (container or st).plotly_chart(fig, use_container_width=True, **kwargs)
+
+    def finish(self):
+        self.phase('done')
+        rss_end = current_rss_bytes()
+        total = self._mark - self._start
+        record = {
+            'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'page': self.page,
+            'section': self.name,
+            'total_ms': round(total * 1000, 3),
+            'rows': self.row_count,
+            'figure_kb': round(self.figure_bytes / 1024, 1) if self.figure_bytes is not None else None,
+            'cached': self.cache_hit,
+            'memory_delta_mb': (round((rss_end - self._rss_start) / 2**20, 2)
+                                if rss_end is not None and self._rss_start is not None else None),
+            'error': self.error
+        }
+        for name, seconds in self.phases.items():
+            if seconds > 0 or name in ('data', 'figure', 'serialize', 'render'):
+                record[f'{name}_ms'] = round(seconds * 1000, 3)
+        return record
+
+
+class RunProfile:
+    """Sections measured during one script run of one page"""
+
+    def __init__(self, page, detailed=PROFILE_ENABLED, log_path=METRICS_LOG):
+        self.page = page
+        self.detailed = detailed
+        self.log_path = Path(log_path)
+        self.records = []
+        self._flushed = 0
+
+    @contextmanager
+    def section(self, name):
+        section = Section(self.page, name, self.detailed)
+        try:
+            yield section
+        except Exception as e:
+            section.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.records.append(section.finish())
+
+    def frame(self):
+        """This run's sections, in the order they ran"""
+        return pd.DataFrame(self.records)
+
+    def flush(self):
+        """Append sections not yet logged to the metrics log; logging failures never break the page"""
+        pending = self.records[self._flushed:]
+        if not pending:
+            return
+        self._flushed = len(self.records)
+        lines = ''.join(json.dumps(record) + '\n' for record in pending)
+        try:
+            with _log_lock:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                if self.log_path.exists() and self.log_path.stat().st_size > METRICS_LOG_MAX_BYTES:
+                    self.log_path.replace(self.log_path.with_name(self.log_path.name + '.1'))
+                with open(self.log_path, 'a') as fh:
+                    fh.write(lines)
+        except OSError:
+            pass
+
+
+def read_metrics(log_path=METRICS_LOG):
+    """All logged section records, oldest first"""
+    log_path = Path(log_path)
+    if not log_path.exists():
+        return pd.DataFrame()
+    with open(log_path) as fh:
+        records = [json.loads(line) for line in fh if line.strip()]
+    return pd.DataFrame(records)
+
+
+def section_percentiles(metrics, page=None):
+    """p50/p95 total time and run count per page section from read_metrics() output"""
+    if metrics.empty:
+        return pd.DataFrame(columns=['page', 'section', 'runs', 'p50_ms', 'p95_ms'])
+    if page is not None:
+        metrics = metrics[metrics['page'] == page]
+    grouped = metrics.groupby(['page', 'section'], sort=False)['total_ms']
+    summary = pd.DataFrame({
+        'runs': grouped.size(),
+        'p50_ms': grouped.quantile(0.5),
+        'p95_ms': grouped.quantile(0.95)
+    }).reset_index()
+    return summary.sort_values('p95_ms', ascending=False).reset_index(drop=True)
@@ -0,0 +1,109 @@
+"""
+Page Queries - NovaMart
+Every aggregate the campaign and product pages draw, expressed once as a
+Query and executed by whichever data source is configured
+"""
+
+import pandas as pd
+
+from data_sources import Query
+from product_rollup import RETURNED_UNITS, ROLLUP_DIMENSIONS, ROLLUP_LEVELS, ROLLUP_MEASURES
+
+CAMPAIGN = 'campaign_performance'
+PRODUCTS = 'product_sales'
+
+TREND_RULES = {
+    'Weekly': 'W',
+    'Monthly': 'MS'
+}
+
+KPI_MEASURES = {
+    'revenue': ('revenue', 'sum'),
+    'conversions': ('conversions', 'sum'),
+    'spend': ('spend', 'sum'),
+    'roas': ('roas', 'mean')
+}
+
+CHANNEL_MEASURES = {
+    'Revenue': ('revenue', 'sum'),
+    'Conversions': ('conversions', 'sum'),
+    'ROAS': ('roas', 'mean')
+}
+
+
+# ============================================================================
+# CAMPAIGN QUERIES
+# ============================================================================
+
+def kpi_totals(source):
+    """Headline totals for the Executive Overview KPI cards"""
+    totals = source.query(Query(CAMPAIGN, measures=KPI_MEASURES)).iloc[0]
+    return totals.fillna(0).to_dict()
+
+
+def revenue_trend(source, aggregation):
+    """Revenue per day, week or month as a date/revenue frame"""
+    daily = source.query(Query(CAMPAIGN, measures={'revenue': ('revenue', 'sum')}, by=['date']))
+    if aggregation in TREND_RULES:
+        daily = daily.set_index('date')['revenue'].resample(TREND_RULES[aggregation]).sum().reset_index()
+    return daily
+
+
+def channel_metric(source, metric):
+    """Per-channel revenue, conversions or mean ROAS as an ascending Series"""
+    result = source.query(Query(CAMPAIGN, measures={'value': CHANNEL_MEASURES[metric]},
+                                by=['channel'], order_by='value'))
+    return result.set_index('channel')['value']
+
+
+def distinct_values(source, table, column):
+    """Sorted distinct values of one column, for selectbox/multiselect options"""
+    return source.query(Query(table, by=[column]))[column].tolist()
+
+
+def has_matches(source, table):
+    """Whether any row of the table passes the source's filters"""
+    first = source.columns(table)[0]
+    return not source.query(Query(table, by=[first], limit=1)).empty
+
+
+def date_extent(source):
+    """First and last campaign date, for date-range widgets"""
+    extent = source.query(Query(CAMPAIGN, measures={'start': ('date', 'min'), 'end': ('date', 'max')})).iloc[0]
+    return pd.to_datetime(extent['start']), pd.to_datetime(extent['end'])
+
+
+def regional_quarterly(source, year):
+    """Revenue by quarter and region for one year"""
+    return source.query(Query(CAMPAIGN, measures={'revenue': ('revenue', 'sum')},
+                              by=['quarter', 'region'], filters={'year': year}))
+
+
+def campaign_type_spend(source):
+    """Monthly spend per campaign type"""
+    return source.query(Query(CAMPAIGN, measures={'spend': ('spend', 'sum')},
+                              by=['month', 'campaign_type']))
+
+
+def cumulative_conversions(source, regions=None):
+    """Running conversion totals per channel, optionally limited to regions"""
+    filters = {'region': regions} if regions is not None else {}
+    cumulative_data = source.query(Query(CAMPAIGN, measures={'conversions': ('conversions', 'sum')},
+                                         by=['date', 'channel'], filters=filters))
+    cumulative_data['cumulative_conversions'] = cumulative_data.groupby(
+        'channel', observed=True)['conversions'].cumsum()
+    return cumulative_data
+
+
+# ============================================================================
+# PRODUCT QUERIES
+# ============================================================================
+
+def product_cells(source, columns):
+    """
+    Product measures summed per category/subcategory/product x region x
+    quarter, the cells a ProductRollup is built from; the grouping runs in
+    the source, so a SQL backend returns only the cells
+    """
+    measures = {col: (col, 'sum') for col in ROLLUP_MEASURES + [RETURNED_UNITS] if col in columns}
+    return source.query(Query(PRODUCTS, measures=measures, by=ROLLUP_LEVELS + ROLLUP_DIMENSIONS))
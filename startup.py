@@ -0,0 +1,95 @@
+"""
+Startup Profile - NovaMart
+Defers modules that only some pages use until their first use and records
+what every timed import cost, so a cold worker only pays for the page it
+renders. Cold import costs of a script's imports can also be profiled in a
+fresh interpreter with -X importtime.
+"""
+
+import ast
+import importlib
+import os
+import subprocess
+import sys
+import time
+import types
+
+import pandas as pd
+
+# NOVAMART_DEFER_IMPORTS=0 imports deferred modules up front, e.g. to compare profiles
+DEFER_IMPORTS = os.environ.get('NOVAMART_DEFER_IMPORTS', '1') == '1'
+
+# Process-wide record of every timed import, keyed by module name. Imported
+# modules survive Streamlit reruns, so this spans all sessions.
+IMPORT_REPORT = {}
+
+
+def timed_import(name, phase='startup'):
+    """Import a module, timing it into IMPORT_REPORT if this process has not imported it yet"""
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_REPORT[name] = {
+        'module': name,
+        'phase': phase,
+        'import_ms': (time.perf_counter() - start) * 1000,
+        'imported_at': pd.Timestamp.now()
+    }
+    return module
+
+
+class DeferredModule(types.ModuleType):
+    """Stand-in for a module that imports it on the first attribute access"""
+
+    def __getattr__(self, attr):
+        return getattr(timed_import(self.__name__, phase='deferred'), attr)
+
+
+def deferred(name):
+    """The module if it is already imported (or deferral is off), else a DeferredModule for it"""
+    if name in sys.modules or not DEFER_IMPORTS:
+        return timed_import(name)
+    return DeferredModule(name)
+
+
+def import_report():
+    """Timed imports of this process so far, slowest first"""
+    if not IMPORT_REPORT:
+        return pd.DataFrame(columns=['module', 'phase', 'import_ms', 'imported_at'])
+    return pd.DataFrame(IMPORT_REPORT.values()).sort_values('import_ms', ascending=False).reset_index(drop=True)
+
+
+# ============================================================================
+# COLD IMPORT PROFILE
+# ============================================================================
+
+def script_imports(path):
+    """Modules a script imports at top level, in order"""
+    tree = ast.parse(open(path, encoding='utf-8').read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def import_profile(modules, cwd=None):
+    """
+    Cold import cost of each module when a fresh interpreter imports them in
+    order under -X importtime: the milliseconds each one added on top of the
+    modules before it (0 when an earlier module had already imported it)
+    """
+    code = '\n'.join(f"import {name}" for name in modules)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd,
+                            capture_output=True, text=True, check=True)
+    added = {}
+    for line in result.stderr.splitlines():
+        fields = line[len('import time:'):].split('|') if line.startswith('import time:') else []
+        # Nested imports are indented past the single space of a top-level one
+        if len(fields) == 3 and fields[0].strip().isdigit() and not fields[2].startswith('  '):
+            added[fields[2].strip()] = int(fields[1]) / 1000
+    profile = pd.DataFrame({'module': modules, 'import_ms': [added.get(name, 0.0) for name in modules]})
+    return profile.sort_values('import_ms', ascending=False).reset_index(drop=True)